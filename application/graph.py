@@ -1,15 +1,28 @@
 # application/graph.py
+from typing import Optional
 from langgraph.graph import StateGraph, END, START
 from application.state import AnalystState
 from application.nodes import AgentNodes
-from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+from application.sql_repair import SQLRepairer
+from domain.ports.data_port import DataProviderPort
+from infrastructure.persistence.semantic_cache import SemanticSQLCache
 
-def build_analyst_graph(db_adapter: DuckDBAdapter):
+def build_analyst_graph(
+    db_adapter: DataProviderPort,
+    sql_cache: Optional[SemanticSQLCache] = None,
+    parallel_outputs: bool = True,
+    sql_repairer: Optional[SQLRepairer] = None,
+):
     """
     Construye y compila el grafo de LangGraph.
+    Con `sql_cache`, las preguntas ya resueltas sobre el mismo esquema reutilizan su SQL.
+    Con `parallel_outputs`, análisis y gráfico corren a la vez tras la ejecución: solo
+    dependen del resultado y la pregunta. `False` conserva el flujo en serie (benchmarks).
+    Los errores de sintaxis y de ejecución pasan primero por `repair_sql` (sin LLM);
+    `sql_repairer` permite compartir sus contadores (por defecto, uno propio).
     """
     # 1. Inicializar lógica de nodos
-    nodes = AgentNodes(db_adapter)
+    nodes = AgentNodes(db_adapter, sql_cache, sql_repairer)
     
     # 2. Definir el Grafo
     workflow = StateGraph(AnalystState)
@@ -18,6 +31,7 @@ def build_analyst_graph(db_adapter: DuckDBAdapter):
     workflow.add_node("generate_sql", nodes.generate_sql)
     workflow.add_node("validate_sql", nodes.validate_sql)
     workflow.add_node("execute_query", nodes.execute_query)
+    workflow.add_node("repair_sql", nodes.repair_sql)
     workflow.add_node("analyze_results", nodes.analyze_results)
     
     # --- Se agrega el nodo de visualización ---
@@ -27,10 +41,20 @@ def build_analyst_graph(db_adapter: DuckDBAdapter):
     workflow.add_edge(START, "generate_sql")
     workflow.add_edge("generate_sql", "validate_sql")
     
+    # Reparación local: una vez por SQL generado y nunca para timeouts (la query es válida, solo cara)
+    def can_repair(state: AnalystState, error_types) -> bool:
+        return (
+            nodes.sql_repairer is not None
+            and state.get("sql_repaired") is None
+            and state.get("error_type") in error_types
+        )
+
     # 5. Lógica Condicional: Validación
     def check_validation(state: AnalystState):
         if state["is_safe"]:
             return "execute"
+        if can_repair(state, ("syntax",)):
+            return "repair"
         if state.get("retry_count", 0) > 3:
             return "abort"
         return "retry"
@@ -40,6 +64,7 @@ def build_analyst_graph(db_adapter: DuckDBAdapter):
         check_validation,
         {
             "execute": "execute_query",
+            "repair": "repair_sql",
             "retry": "generate_sql",
             "abort": END
         }
@@ -48,7 +73,10 @@ def build_analyst_graph(db_adapter: DuckDBAdapter):
     # 6. Lógica Condicional: Ejecución
     def check_execution(state: AnalystState):
         if not state.get("error"):
-            return "analyze"
+            # Fan-out: ambos nodos corren en el mismo paso del grafo
+            return ["analyze", "viz"] if parallel_outputs else "analyze"
+        if can_repair(state, ("execution",)):
+            return "repair"
         if state.get("retry_count", 0) > 3:
             return "abort"
         return "retry"
@@ -58,13 +86,38 @@ def build_analyst_graph(db_adapter: DuckDBAdapter):
         check_execution,
         {
             "analyze": "analyze_results",
+            "viz": "generate_viz",
+            "repair": "repair_sql",
+            "retry": "generate_sql",
+            "abort": END
+        }
+    )
+
+    # 6b. Lógica Condicional: Reparación local (el SQL reparado se vuelve a validar y ejecutar)
+    def check_repair(state: AnalystState):
+        if not state.get("error"):
+            return "validate"
+        if state.get("retry_count", 0) > 3:
+            return "abort"
+        return "retry"
+
+    workflow.add_conditional_edges(
+        "repair_sql",
+        check_repair,
+        {
+            "validate": "validate_sql",
             "retry": "generate_sql",
             "abort": END
         }
     )
     
     # 7. Finalización
-    workflow.add_edge("analyze_results", "generate_viz")
+    # En paralelo, el grafo termina cuando ambas ramas acaban (join en END). Escriben
+    # claves distintas del estado (messages con su reducer, viz_config), sin conflicto.
+    if parallel_outputs:
+        workflow.add_edge("analyze_results", END)
+    else:
+        workflow.add_edge("analyze_results", "generate_viz")
     workflow.add_edge("generate_viz", END)
     
     return workflow.compile()
\ No newline at end of file
@@ -1,23 +1,127 @@
+import asyncio
 import json
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import sqlglot
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langgraph.config import get_stream_writer
 
 from application.state import AnalystState
+from application.schema_pruning import schema_context
+from application.sql_repair import SQL_LOCAL_REPAIR, SQLRepairer
+from application.viz_rules import VIZ_RULES_MIN_CONFIDENCE, infer_chart
 from application.prompts import (
     SQL_GENERATION_SYSTEM, 
+    SQL_TIMEOUT_RETRY,
     ANALYSIS_SYSTEM, 
     VIZ_SYSTEM, 
     SUGGESTION_SYSTEM
 )
 from infrastructure.llm.hybrid_factory import HybridLLMFactory
 from infrastructure.security.sql_sanitizer import SQLSanitizer
-from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+from infrastructure.persistence.duckdb_adapter import QueryTimeoutError
+from infrastructure.persistence.semantic_cache import SemanticSQLCache
+from domain.ports.data_port import DataProviderPort
+from domain.value_objects.query_result import QueryResult
 from domain.value_objects.sql_query import SQLQuery
 
+# --- LIMPIEZA DE ALUCINACIONES SQL ---
+# Regex: Elimina cualquier cosa que empiece con SELECT/WITH/... y termine en ;
+_LEADING_SQL = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE).*?;', re.IGNORECASE | re.DOTALL)
+_SQL_KEYWORDS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# Elimina bloques markdown de sql
+_LEADING_SQL_BLOCK = re.compile(r'^```sql.*?```', re.IGNORECASE | re.DOTALL)
+
+
+def clean_analysis(content: str) -> str:
+    """Quita el SQL que el LLM a veces antepone al análisis"""
+    clean_content = _LEADING_SQL.sub('', content).strip()
+    return _LEADING_SQL_BLOCK.sub('', clean_content).strip()
+
+
+class AnalysisStreamCleaner:
+    """
+    Versión incremental de `clean_analysis` para el streaming del análisis.
+    Las regex solo actúan al inicio del texto: se retiene el comienzo hasta poder
+    decidir si es SQL (o un bloque ```sql) y, a partir de ahí, los tokens pasan
+    directos. Solo se retiene además el espacio final, que `strip()` descartaría.
+    El texto emitido es siempre idéntico a `clean_analysis` sobre la respuesta completa.
+    """
+
+    def __init__(self):
+        self.text = ""  # Texto limpio emitido hasta ahora
+        self._head = ""  # Comienzo aún sin decidir
+        self._pending = ""  # Espacio final retenido
+        self._decided = False
+
+    def feed(self, chunk: str) -> str:
+        """Agrega un token y retorna el texto nuevo que ya puede mostrarse"""
+        if not self._decided:
+            self._head += chunk
+            resolved = self._resolve_head(self._head)
+            if resolved is None:
+                return ""
+            self._decided = True
+            self._head = ""
+            chunk = resolved
+        return self._emit(self._pending + chunk)
+
+    def finish(self) -> str:
+        """Cierra el stream: decide el comienzo pendiente con la respuesta completa"""
+        if self._decided:
+            return ""
+        self._decided = True
+        self.text = clean_analysis(self._head)
+        return self.text
+
+    def _emit(self, text: str) -> str:
+        if not self.text:
+            text = text.lstrip()
+        body = text.rstrip()
+        self._pending = text[len(body):]
+        self.text += body
+        return body
+
+    @staticmethod
+    def _resolve_head(head: str):
+        """Texto visible tras limpiar el comienzo o None si aún no se puede decidir"""
+        stripped = head.lstrip()
+        match = re.match(r'(SELECT|WITH|INSERT|UPDATE|DELETE)', stripped, re.IGNORECASE)
+        if match:
+            end = stripped.find(';')
+            if end < 0:
+                return None
+            stripped = stripped[end + 1:].lstrip()
+        elif len(stripped) < 6 and any(k.startswith(stripped.upper()) for k in _SQL_KEYWORDS):
+            return None
+        if len(stripped) < 6:
+            return None if '```sql'.startswith(stripped.lower()) else stripped
+        if stripped[:6].lower() == '```sql':
+            end = stripped.find('```', 6)
+            if end < 0:
+                return None
+            return stripped[end + 3:].lstrip()
+        return stripped
+
+
+def _stream_writer():
+    """Writer del stream "custom" de LangGraph; no-op si el nodo se llama fuera del grafo"""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda _: None
+
+
 class AgentNodes:
-    def __init__(self, db_adapter: DuckDBAdapter):
+    def __init__(
+        self,
+        db_adapter: DataProviderPort,
+        sql_cache: Optional[SemanticSQLCache] = None,
+        sql_repairer: Optional[SQLRepairer] = None,
+    ):
         self.db = db_adapter
+        self.sql_cache = sql_cache
+        self.sql_repairer = sql_repairer or (SQLRepairer() if SQL_LOCAL_REPAIR else None)
         # Se inicializa de fábrica sin modelo específico, se pide bajo demanda
         
     async def generate_sql(self, state: AnalystState) -> Dict[str, Any]:
@@ -25,26 +129,48 @@ class AgentNodes:
         Nodo 1: Generar SQL con Memoria Conversacional.
         """
         print("--- 🤖 GENERATING SQL ---")
+        # 0. Pregunta ya resuelta (o parecida) sobre este esquema: sin llamada al LLM
+        cached = await self._cached_sql(state)
+        if cached is not None:
+            return {
+                "sql_query": cached.sql,
+                "error": None,
+                "error_type": None,
+                "sql_cache_hit": cached.id,
+                "sql_repaired": None,
+                "retry_count": state.get("retry_count", 0) + 1
+            }
+
         llm = HybridLLMFactory.get_model(temperature=0)
         
         # 1. Recuperar contexto de memoria
         last_sql = state.get("last_successful_sql")
         last_sql_context = last_sql if last_sql else "Ninguna (Nueva conversación)"
         
-        # 2. Preparar Prompt
+        # 2. Preparar Prompt (en tablas anchas, solo las columnas relevantes para la pregunta)
+        schema_info = state.get("schema_info", "")
+        if state.get("dataset_schema") is not None:
+            schema_info = schema_context(state["dataset_schema"], state["messages"][-1].content or "", last_sql)
         try:
             prompt = SQL_GENERATION_SYSTEM.format(
-                schema=state.get("schema_info", ""),
+                schema=schema_info,
                 last_sql=last_sql_context
             )
         except KeyError:
             # Fallback seguro
-            prompt = f"Genera SQL para: {state.get('schema_info', '')}"
+            prompt = f"Genera SQL para: {schema_info}"
 
         # 3. Contexto del usuario o error previo
         user_msg = state["messages"][-1]
         
-        if state.get("error"):
+        if state.get("error_type") == "timeout":
+            # La query era correcta pero demasiado cara: se pide una alternativa barata
+            user_msg = HumanMessage(content=SQL_TIMEOUT_RETRY.format(
+                timeout_s=f"{self.db.query_timeout_s:g}",
+                failed_query=state.get("sql_query", "query desconocida"),
+                question=state["messages"][-1].content,
+            ))
+        elif state.get("error"):
             failed_query = state.get("sql_query", "query desconocida")
             content = (
                 f"La query anterior falló.\n"
@@ -75,6 +201,9 @@ class AgentNodes:
             return {
                 "sql_query": clean_sql, 
                 "error": None, 
+                "error_type": None,
+                "sql_cache_hit": None,
+                "sql_repaired": None,
                 "retry_count": state.get("retry_count", 0) + 1
             }
             
@@ -82,22 +211,57 @@ class AgentNodes:
             return {
                 "sql_query": "SELECT 1", 
                 "error": f"LLM Error: {str(e)}", 
+                "error_type": None,
+                "sql_cache_hit": None,
+                "sql_repaired": None,
                 "retry_count": state.get("retry_count", 0) + 1
             }
 
+    async def _cached_sql(self, state: AnalystState):
+        """SQL de la caché semántica para la pregunta actual, ya validado; None si no aplica"""
+        fingerprint = state.get("schema_fingerprint")
+        # Solo en el primer intento: un reintento por error o timeout necesita al LLM
+        if self.sql_cache is None or not fingerprint or state.get("error") or not state.get("messages"):
+            return None
+        try:
+            cached = await asyncio.to_thread(
+                self.sql_cache.lookup,
+                state["messages"][-1].content or "",
+                fingerprint,
+                state.get("last_successful_sql"),
+            )
+        except Exception as e:
+            print(f"⚠️ Caché semántica no disponible: {e}")
+            return None
+        if cached is None:
+            return None
+        if not SQLSanitizer.validate_query(SQLQuery(cached.sql)).is_safe:
+            await asyncio.to_thread(self.sql_cache.forget, cached.id)
+            return None
+        print(f"🧠 SQL reutilizado de la caché semántica (similitud {cached.similarity:.2f}): {cached.question}")
+        return cached
+
     def validate_sql(self, state: AnalystState) -> Dict[str, Any]:
         """Nodo 2: Validación de Seguridad"""
         print("--- 🛡️ VALIDATING SQL ---")
         try:
             sql_query = state.get("sql_query")
             if not sql_query:
-                return {"is_safe": False, "error": "SQL query está vacío"}
+                return {"is_safe": False, "error": "SQL query está vacío", "error_type": "validation"}
             
             query_obj = SQLQuery(sql_query)
             validated = SQLSanitizer.validate_query(query_obj)
-            return {"is_safe": validated.is_safe, "error": validated.validation_error}
+            error_type = None
+            if not validated.is_safe:
+                # Sintaxis rota: candidata a reparación local. Política (DELETE, varias sentencias...): al LLM
+                try:
+                    SQLSanitizer.parse(sql_query)
+                    error_type = "validation"
+                except sqlglot.errors.SqlglotError:
+                    error_type = "syntax"
+            return {"is_safe": validated.is_safe, "error": validated.validation_error, "error_type": error_type}
         except Exception as e:
-            return {"is_safe": False, "error": str(e)}
+            return {"is_safe": False, "error": str(e), "error_type": "validation"}
 
     async def execute_query(self, state: AnalystState) -> Dict[str, Any]:
         """
@@ -108,23 +272,79 @@ class AgentNodes:
         try:
             sql_query = state.get("sql_query")
             if not sql_query:
-                return {"execution_result": [], "error": "SQL query está vacío"}
+                return {"execution_result": QueryResult.empty(), "error": "SQL query está vacío", "error_type": "validation"}
             
             query_obj = SQLQuery(sql_query).mark_as_safe()
-            results = await self.db.execute_query(query_obj)
+            if state.get("approximate"):
+                results = await self.db.execute_query(query_obj, approximate=True)
+            else:
+                results = await self.db.execute_query(query_obj)
             
+            if state.get("sql_repaired") and self.sql_repairer is not None:
+                self.sql_repairer.record_saved()
+            await self._remember_sql(state, sql_query)
             return {
-                "execution_result": results if results is not None else [], 
+                "execution_result": results if results is not None else QueryResult.empty(), 
                 "error": None,
+                "error_type": None,
                 "last_successful_sql": sql_query  #ACTUALIZACIÓN DE MEMORIA
             }
+        except QueryTimeoutError as e:
+            await self._forget_cached_sql(state)
+            return {"execution_result": QueryResult.empty(), "error": f"DB Timeout: {e}", "error_type": "timeout"}
+        except Exception as e:
+            await self._forget_cached_sql(state)
+            return {"execution_result": QueryResult.empty(), "error": f"DB Error: {str(e)}", "error_type": "execution"}
+
+    def repair_sql(self, state: AnalystState) -> Dict[str, Any]:
+        """
+        Nodo 3b: Reparación local del SQL que falló (columnas mal escritas, comillas,
+        funciones de otro dialecto), sin LLM. Si no hay reparación segura, el
+        reintento sigue a generate_sql como antes.
+        """
+        print("--- 🩹 REPAIRING SQL ---")
+        schema = state.get("dataset_schema")
+        if self.sql_repairer is None or schema is None:
+            return {"sql_repaired": ""}
+        repair = self.sql_repairer.repair(state.get("sql_query") or "", state.get("error") or "", schema)
+        if repair is None:
+            return {"sql_repaired": ""}
+        print(f"🩹 SQL reparado sin LLM: {repair.summary}")
+        return {
+            "sql_query": repair.sql,
+            "error": None,
+            "error_type": None,
+            "sql_cache_hit": None,
+            "sql_repaired": repair.summary,
+        }
+
+    async def _remember_sql(self, state: AnalystState, sql_query: str) -> None:
+        """Guarda en la caché semántica el SQL generado por el LLM que se ejecutó sin error"""
+        if self.sql_cache is None or state.get("sql_cache_hit") or not state.get("schema_fingerprint"):
+            return
+        try:
+            await asyncio.to_thread(
+                self.sql_cache.store,
+                state["messages"][-1].content or "",
+                sql_query,
+                state["schema_fingerprint"],
+                state.get("last_successful_sql"),
+            )
         except Exception as e:
-            return {"execution_result": [], "error": f"DB Error: {str(e)}"}
+            print(f"⚠️ No se pudo guardar en la caché semántica: {e}")
+
+    async def _forget_cached_sql(self, state: AnalystState) -> None:
+        """Un SQL reutilizado que falla deja de servirse: el reintento lo genera el LLM"""
+        if self.sql_cache is not None and state.get("sql_cache_hit"):
+            try:
+                await asyncio.to_thread(self.sql_cache.forget, state["sql_cache_hit"])
+            except Exception as e:
+                print(f"⚠️ No se pudo invalidar la caché semántica: {e}")
 
     async def analyze_results(self, state: AnalystState) -> Dict[str, Any]:
         """Nodo 4: Análisis de Texto (Con limpieza de SQL)"""
         print("--- 🧠 ANALYZING RESULTS ---")
-        data = state.get("execution_result", [])
+        data = state.get("execution_result")
         
         if not data:
             return {"messages": [AIMessage(content="Sin resultados.")]}
@@ -135,20 +355,29 @@ class AgentNodes:
                 question = state["messages"][-1].content or ""
             
             llm = HybridLLMFactory.get_model(temperature=0.2)
+            sample = str(data.to_records(15)) # Limite de contexto
+            if data.truncated:
+                # El LLM debe saber que no ve el resultado completo
+                sample += f"\nNOTA: {data.partial_note()} No extrapoles totales a partir de estas filas."
+            if data.approximate:
+                # Las cifras son estimaciones: el texto no debe presentarlas como exactas
+                sample += f"\nNOTA: {data.approx_note()} Presenta las cifras como aproximadas."
             prompt = ANALYSIS_SYSTEM.format(
                 question=question, 
-                data=str(data[:15]) # Limite de contexto
+                data=sample
             )
-            response = await llm.ainvoke([HumanMessage(content=prompt)])
+            # Streaming token a token: la UI recibe el texto ya limpio como eventos "custom"
+            write = _stream_writer()
+            cleaner = AnalysisStreamCleaner()
+            async for chunk in llm.astream([HumanMessage(content=prompt)]):
+                delta = cleaner.feed(chunk.content if isinstance(chunk.content, str) else "")
+                if delta:
+                    write({"analysis_delta": delta})
+            delta = cleaner.finish()
+            if delta:
+                write({"analysis_delta": delta})
             
-            # --- LIMPIEZA DE ALUCINACIONES SQL ---
-            content = response.content or ""
-            # Regex: Elimina cualquier cosa que empiece con SELECT/WITH y termine en ;
-            clean_content = re.sub(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE).*?;', '', content, flags=re.IGNORECASE | re.DOTALL).strip()
-            # Elimina bloques markdown de sql
-            clean_content = re.sub(r'^```sql.*?```', '', clean_content, flags=re.IGNORECASE | re.DOTALL).strip()
-            
-            return {"messages": [AIMessage(content=clean_content)]}
+            return {"messages": [AIMessage(content=cleaner.text)]}
             
         except Exception as e:
             return {"messages": [AIMessage(content=f"Error analizando: {str(e)}")]}
@@ -156,29 +385,34 @@ class AgentNodes:
     async def generate_viz_config(self, state: AnalystState) -> Dict[str, Any]:
         """Nodo 5: Configuración de Gráfico (Con lógica KPI)"""
         print("--- 🎨 GENERATING VIZ ---")
-        data = state.get("execution_result", [])
+        data = state.get("execution_result")
         
         # 1. Validaciones tempranas
         if not data:
              return {"viz_config": {"chart_type": "none"}}
 
         # REGLA SENIOR: Si es 1 sola fila, son KPIs. NO GRAFICAR.
-        if isinstance(data, list) and len(data) == 1:
+        if len(data) == 1:
              print("ℹ️ Datos de una sola fila detectados. Omitiendo gráfico (KPIs).")
              return {"viz_config": {"chart_type": "none"}}
 
-        if isinstance(data, list) and len(data) > 0:
-             if 'NO_DATA' in str(data[0].values()):
-                 return {"viz_config": {"chart_type": "none"}}
+        if 'NO_DATA' in str(data.to_records(1)[0].values()):
+             return {"viz_config": {"chart_type": "none"}}
+
+        question = ""
+        if state.get("messages") and len(state.get("messages", [])) > 0:
+            question = state["messages"][-1].content or ""
+
+        # 2. Reglas deterministas (tipos, cardinalidad, columnas temporales): sin LLM si son claras
+        inference = infer_chart(data, question)
+        if inference.confidence >= VIZ_RULES_MIN_CONFIDENCE:
+            print(f"📐 Gráfico por reglas: {inference.config['chart_type']} ({inference.reason}, confianza {inference.confidence:.2f})")
+            return {"viz_config": inference.config}
 
         try:
             llm_viz = HybridLLMFactory.get_model(temperature=0)
             
-            question = ""
-            if state.get("messages") and len(state.get("messages", [])) > 0:
-                question = state["messages"][-1].content or ""
-            
-            prompt = VIZ_SYSTEM.format(data=str(data[:5]), question=question)
+            prompt = VIZ_SYSTEM.format(data=str(data.to_records(5)), question=question)
             
             response = await llm_viz.ainvoke([SystemMessage(content=prompt)])
             content = response.content or ""
@@ -203,30 +437,9 @@ class AgentNodes:
         except Exception as e:
             print(f"❌ Error Viz LLM: {e}")
         
-        # 3. Fallback Automático
+        # 3. Fallback Automático: la inferencia por reglas, aunque tenga confianza baja
         print("🔄 Ejecutando fallback Viz...")
-        if isinstance(data, list) and len(data) > 0:
-            sample = data[0]
-            keys = list(sample.keys())
-            
-            if len(keys) >= 2:
-                import pandas as pd
-                df_sample = pd.DataFrame(data[:5])
-                
-                # Inferencia de tipos para X (cat) e Y (num)
-                x_col = next((c for c in df_sample.columns if df_sample[c].dtype in ['object', 'string']), keys[0])
-                y_col = next((c for c in df_sample.columns if df_sample[c].dtype in ['int64', 'float64', 'int32']), keys[1] if len(keys)>1 else keys[0])
-                
-                return {
-                    "viz_config": {
-                        "chart_type": "bar",
-                        "x_column": x_col,
-                        "y_column": y_col,
-                        "title": "Análisis de Datos"
-                    }
-                }
-        
-        return {"viz_config": {"chart_type": "none"}}
+        return {"viz_config": inference.config}
 
     async def generate_suggestions(self, schema_info: str) -> Dict[str, Any]:
         """
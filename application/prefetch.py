@@ -0,0 +1,172 @@
+# application/prefetch.py
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage
+
+from domain.value_objects.query_result import QueryResult
+
+# Precalcular las preguntas sugeridas tras la ingesta (0 lo desactiva)
+SUGGESTION_PREFETCH = os.getenv("SUGGESTION_PREFETCH", "1") == "1"
+# Preguntas sugeridas que corren a la vez por sesión (cada una hace 2-3 llamadas al LLM)
+SUGGESTION_PREFETCH_CONCURRENCY = int(os.getenv("SUGGESTION_PREFETCH_CONCURRENCY", "2"))
+# Espera máxima por una sugerencia que aún corre al pulsarla; después se responde en vivo
+SUGGESTION_PREFETCH_WAIT_S = float(os.getenv("SUGGESTION_PREFETCH_WAIT_S", "5"))
+
+
+@dataclass(frozen=True, slots=True)
+class PrefetchedAnswer:
+    """Respuesta completa del grafo a una pregunta sugerida, lista para mostrarse"""
+    question: str
+    content: str
+    viz_config: Dict[str, Any]
+    data: Optional[QueryResult]
+    sql: Optional[str]
+    elapsed_s: float
+
+
+@dataclass(slots=True)
+class PrefetchStats:
+    """Contadores del precálculo de sugerencias"""
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    served: int = 0
+
+
+@dataclass(slots=True)
+class _Entry:
+    fingerprint: str
+    future: "Future[Optional[PrefetchedAnswer]]"
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop del proceso para trabajo especulativo. El loop de cada sesión de
+    Streamlit solo avanza durante una ejecución del script; este corre siempre en
+    su propio hilo (con sus propios clientes LLM, ver HybridLLMFactory).
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="prefetch", daemon=True).start()
+        return _loop
+
+
+class SuggestionPrefetcher:
+    """
+    Ejecuta en segundo plano las preguntas sugeridas de un dataset con el grafo
+    completo (SQL, datos, análisis y gráfico), para que al pulsar una sugerencia la
+    respuesta se muestre al instante. Concurrencia acotada por `max_concurrency`;
+    `start` y `cancel` descartan lo pendiente del dataset anterior.
+    """
+
+    def __init__(
+        self,
+        agent,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        max_concurrency: int = SUGGESTION_PREFETCH_CONCURRENCY,
+    ):
+        self.agent = agent
+        self.loop = loop  # Por defecto, el loop de fondo del proceso (al primer `start`)
+        self.max_concurrency = max(1, max_concurrency)
+        self.stats = PrefetchStats()
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def start(self, questions: List[str], state: Dict[str, Any]) -> None:
+        """
+        Lanza las preguntas sobre el dataset de `state` (schema_info, schema_fingerprint,
+        dataset_schema). Cancela antes lo que quedara del dataset anterior.
+        """
+        self.cancel()
+        self.loop = self.loop or background_loop()
+        # El semáforo se liga al loop de fondo en su primer uso
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        fingerprint = state.get("schema_fingerprint", "")
+        with self._lock:
+            for question in dict.fromkeys(q for q in questions if q):
+                future = asyncio.run_coroutine_threadsafe(self._run(semaphore, question, state), self.loop)
+                self._entries[question] = _Entry(fingerprint, future)
+                self.stats.started += 1
+
+    def cancel(self) -> None:
+        """Descarta las respuestas del dataset actual (p. ej. antes de cargar otro)"""
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        for entry in entries.values():
+            if entry.future.cancel():
+                self.stats.cancelled += 1
+
+    def get(
+        self, question: str, fingerprint: str, timeout: Optional[float] = SUGGESTION_PREFETCH_WAIT_S
+    ) -> Optional[PrefetchedAnswer]:
+        """
+        Respuesta precalculada de `question` sobre el dataset `fingerprint`. Si aún
+        corre, espera hasta `timeout` (ya está en curso: casi siempre es antes que
+        empezar de cero). None si no hay, falló, se canceló o no terminó a tiempo
+        (p. ej. un LLM colgado): se descarta y la pregunta va al grafo.
+        """
+        with self._lock:
+            entry = self._entries.get(question)
+        if entry is None or entry.fingerprint != fingerprint:
+            return None
+        try:
+            answer = entry.future.result(timeout)
+        except TimeoutError:
+            # La pregunta corre ahora en vivo: la ejecución de fondo solo duplicaría llamadas
+            if entry.future.cancel():
+                self.stats.cancelled += 1
+            return None
+        except Exception:  # Cancelada o error del grafo
+            return None
+        if answer is not None:
+            self.stats.served += 1
+        return answer
+
+    def is_ready(self, question: str) -> bool:
+        """La respuesta ya terminó con datos (se mostrará sin esperar)"""
+        with self._lock:
+            entry = self._entries.get(question)
+        if entry is None or not entry.future.done() or entry.future.cancelled():
+            return False
+        return entry.future.exception() is None and entry.future.result() is not None
+
+    async def _run(self, semaphore: asyncio.Semaphore, question: str, state: Dict[str, Any]) -> Optional[PrefetchedAnswer]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                final = await self.agent.ainvoke({
+                    **state,
+                    "messages": [HumanMessage(content=question)],
+                    "last_successful_sql": None,
+                    "approximate": False,
+                })
+            except Exception as e:
+                print(f"⚠️ Precálculo de sugerencia fallido ({question}): {e}")
+                self.stats.failed += 1
+                return None
+        # Sin datos (reintentos agotados o SQL inseguro) se deja que la pregunta corra en vivo
+        if final.get("error") or final.get("execution_result") is None:
+            self.stats.failed += 1
+            return None
+        self.stats.completed += 1
+        return PrefetchedAnswer(
+            question=question,
+            content=final["messages"][-1].content,
+            viz_config=final.get("viz_config") or {},
+            data=final["execution_result"],
+            sql=final.get("last_successful_sql"),
+            elapsed_s=time.perf_counter() - start,
+        )
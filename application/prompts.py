@@ -26,9 +26,25 @@ SQL Anterior: {last_sql}
    - Usa `EXTRACT(YEAR FROM fecha)` para años.
    - No inventes funciones que no existen.
 
+4. **PERFIL DE COLUMNAS:**
+   - Si el ESQUEMA incluye "Column profile", úsalo para elegir filtros con valores reales (top, range).
+   - No generes queries exploratorias (DISTINCT, MIN/MAX) para datos que el perfil ya responde.
+
 Genera SOLO el código SQL limpio.
 """
 
+SQL_TIMEOUT_RETRY = """
+La query anterior fue cancelada por exceder el tiempo límite ({timeout_s}s).
+Query cancelada: {failed_query}
+Instrucción original: {question}
+
+Genera una versión MÁS BARATA que responda lo mismo:
+- ⛔ Sin CROSS JOIN ni joins sin condición (productos cartesianos).
+- ✅ Filtra (WHERE) antes de agregar y agrega solo las columnas necesarias.
+- ✅ Evita COUNT(DISTINCT) sobre columnas casi únicas y subconsultas correlacionadas.
+- ✅ Si la pregunta lo permite, usa LIMIT.
+"""
+
 ANALYSIS_SYSTEM = """
 Eres un analista de datos experto. Tu objetivo es interpretar los datos de forma directa y profesional.
 
@@ -61,7 +77,7 @@ REGLAS ESTRICTAS:
 
 TIPOS DE GRÁFICO PERMITIDOS:
 - "bar": Comparación de categorías.
-- "line": Series de tiempo.
+- "line": Series de tiempo (con "color_column" si hay una línea por categoría).
 - "scatter": Correlación entre dos variables numéricas.
 - "pie": Distribución porcentual simple.
 - "histogram": Para ver la distribución/frecuencia de UNA sola variable numérica (ej: "distribución de edades").
@@ -73,7 +89,8 @@ FORMATO JSON:
     "chart_type": "bar" | "line" | "scatter" | "pie" | "histogram" | "box" | "none",
     "x_column": "columna_principal",
     "y_column": "columna_secundaria_o_null_si_es_histograma",
-    "title": "Título del Gráfico"
+    "title": "Título del Gráfico",
+    "color_column": "columna_categórica_para_varias_series_o_null"
 }}
 
 Genera el JSON ahora:
@@ -0,0 +1,193 @@
+# application/schema_pruning.py
+import hashlib
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+from domain.entities.dataset import DatasetSchema
+from infrastructure.security.sql_sanitizer import SQLSanitizer
+
+# Por debajo de este número de columnas el esquema completo va al prompt
+SCHEMA_PRUNE_MIN_COLUMNS = int(os.getenv("SCHEMA_PRUNE_MIN_COLUMNS", "60"))
+# Columnas relevantes que se envían en tablas anchas (más las columnas clave)
+SCHEMA_PRUNE_TOP_K = int(os.getenv("SCHEMA_PRUNE_TOP_K", "25"))
+MAX_KEY_COLUMNS = 8
+# Parámetros estándar de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+_PREFIX = 5  # Prefijos como términos extra: "satisfaccion" ~ "satisfecho", "compras" ~ "comprado"
+_INDEX_CACHE_SIZE = 32
+
+_KEY_NAME = re.compile(r"(^id$|^id_|_id$|^key$|_key$|^cod(igo)?_|_cod(igo)?$|^uuid)", re.IGNORECASE)
+_TEMPORAL_TYPES = ("DATE", "TIMESTAMP", "TIME")
+
+
+class ColumnIndex:
+    """
+    Índice BM25 en memoria sobre las columnas de un esquema. Cada columna es un
+    documento con su nombre (peso doble), su tipo y los valores frecuentes del
+    perfil de ingesta, así "ventas del Norte" encuentra la columna `zona` aunque
+    el nombre no aparezca en la pregunta. Sin red ni modelos: se construye en ms.
+    """
+
+    def __init__(self, schema: DatasetSchema):
+        self.schema = schema
+        self.columns = list(schema.columns)
+        docs = [_column_terms(col, dtype, schema) for col, dtype in schema.columns.items()]
+        self._tf = [Counter(doc) for doc in docs]
+        self._lengths = [len(doc) for doc in docs]
+        self._avg_length = sum(self._lengths) / len(docs) if docs else 0.0
+        df = Counter(term for doc in self._tf for term in doc)
+        n = len(docs)
+        self._idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def rank(self, question: str) -> List[Tuple[str, float]]:
+        """Columnas con puntuación > 0, de mayor a menor relevancia"""
+        terms = set(_terms(question))
+        scored = []
+        for i, tf in enumerate(self._tf):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[i] / (self._avg_length or 1))
+            for term in terms & tf.keys():
+                freq = tf[term]
+                score += self._idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            if score > 0:
+                scored.append((self.columns[i], score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+    def select(self, question: str, top_k: int = SCHEMA_PRUNE_TOP_K, must_include: Iterable[str] = ()) -> List[str]:
+        """Top-k relevantes + columnas clave + obligatorias, en el orden del esquema"""
+        ranked = [col for col, _ in self.rank(question)[:top_k]]
+        if not ranked:
+            # Pregunta sin términos del esquema ("resume los datos"): columnas informativas
+            ranked = self.overview(top_k)
+        chosen: Set[str] = set(ranked) | set(self.key_columns()) | {c for c in must_include if c in self.schema.columns}
+        return [col for col in self.columns if col in chosen]
+
+    def key_columns(self) -> List[str]:
+        """Identificadores y fechas: se necesitan en joins, filtros y series aunque no se nombren"""
+        keys = [
+            col for col, dtype in self.schema.columns.items()
+            if _KEY_NAME.search(col) or dtype.upper().startswith(_TEMPORAL_TYPES)
+        ]
+        return keys[:MAX_KEY_COLUMNS]
+
+    def overview(self, top_k: int = SCHEMA_PRUNE_TOP_K) -> List[str]:
+        """Primeras columnas con información (sin constantes ni vacías según el perfil)"""
+        informative = []
+        for col in self.columns:
+            profile = self.schema.profile.get(col)
+            if profile is not None and (
+                profile.approx_distinct <= 1 or profile.null_count >= self.schema.row_count
+            ):
+                continue
+            informative.append(col)
+        return informative[:top_k]
+
+
+_indexes: "OrderedDict[str, ColumnIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def column_index(schema: DatasetSchema) -> ColumnIndex:
+    """
+    Índice del esquema, construido una vez por huella y perfil (LRU pequeña).
+    La huella solo cubre la estructura: una recarga con otros datos cambia los
+    valores frecuentes, rangos y filas que indexa el perfil.
+    """
+    key = f"{schema.fingerprint()}|{_profile_key(schema)}"
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = ColumnIndex(schema)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > _INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _profile_key(schema: DatasetSchema) -> str:
+    """Hash del contenido del perfil (y del nº de filas, que usa `overview`)"""
+    described = "|".join(f"{col}:{prof.describe()}" for col, prof in sorted(schema.profile.items()))
+    return hashlib.sha1(f"{schema.row_count}|{described}".encode("utf-8")).hexdigest()[:16]
+
+
+def schema_context(
+    schema: DatasetSchema,
+    question: str = "",
+    last_sql: Optional[str] = None,
+    top_k: int = SCHEMA_PRUNE_TOP_K,
+    min_columns: int = SCHEMA_PRUNE_MIN_COLUMNS,
+) -> str:
+    """
+    Contexto de esquema para el prompt. Tablas estrechas: completo. Tablas anchas:
+    solo las columnas relevantes para la pregunta, las clave y las que usa el SQL
+    previo de la conversación (las repreguntas lo amplían).
+    """
+    if len(schema.columns) < min_columns:
+        return schema.get_context_for_llm()
+    index = column_index(schema)
+    if not question:
+        return schema.get_context_for_llm(index.select("", top_k))
+    must = _sql_columns(last_sql) | _named_columns(question, schema)
+    return schema.get_context_for_llm(index.select(question, top_k, must))
+
+
+def _column_terms(column: str, dtype: str, schema: DatasetSchema) -> List[str]:
+    terms = _terms(column) * 2 + _terms(dtype)
+    profile = schema.profile.get(column)
+    if profile is not None:
+        for value in profile.top_values:
+            terms += _terms(str(value))
+    return terms
+
+
+def _terms(text: str) -> List[str]:
+    """Tokens normalizados (sin acentos, camelCase separado, plural simple) + prefijos"""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    terms = []
+    for token in re.findall(r"[a-z]+|\d+", text):
+        if len(token) < 2:
+            continue
+        token = _stem(token)
+        terms.append(token)
+        if len(token) > _PREFIX:
+            terms.append(token[:_PREFIX] + "*")
+    return terms
+
+
+def _stem(token: str) -> str:
+    """Plural simple: ventas/venta, regiones/region, clientes/cliente comparten raíz"""
+    if len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def _sql_columns(sql: Optional[str]) -> Set[str]:
+    if not sql:
+        return set()
+    try:
+        return {col.name for col in SQLSanitizer.parse(sql).find_all(exp.Column)}
+    except sqlglot.errors.ParseError:
+        return set()
+
+
+def _named_columns(question: str, schema: DatasetSchema) -> Set[str]:
+    """Columnas citadas literalmente en la pregunta"""
+    words = set(re.findall(r"\w+", question.lower()))
+    return {col for col in schema.columns if col.lower() in words}
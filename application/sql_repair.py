@@ -0,0 +1,258 @@
+# application/sql_repair.py
+import difflib
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ErrorLevel, SqlglotError
+from sqlglot.optimizer.scope import traverse_scope
+
+from domain.entities.dataset import DatasetSchema
+
+# Reparar localmente (sin LLM) los errores mecánicos del SQL antes de regenerarlo (0 lo desactiva)
+SQL_LOCAL_REPAIR = os.getenv("SQL_LOCAL_REPAIR", "1") == "1"
+# Similitud mínima (difflib, 0-1) para corregir un identificador mal escrito
+SQL_REPAIR_MIN_SIMILARITY = float(os.getenv("SQL_REPAIR_MIN_SIMILARITY", "0.8"))
+# Dialectos de origen que se prueban al traducir funciones o sintaxis ajenas a DuckDB
+SOURCE_DIALECTS = ("mysql", "tsql", "postgres", "snowflake", "bigquery", "spark", "oracle", "sqlite")
+_TABLE_SIMILARITY = 0.6
+
+_MISSING_FUNCTION = re.compile(r'Function with name "?(\w+)"? does not exist', re.IGNORECASE)
+_PLAIN_IDENTIFIER = re.compile(r"[a-z_][a-z0-9_]*")
+_COMPARISONS = (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Like, exp.ILike)
+
+
+@dataclass(frozen=True, slots=True)
+class SQLRepair:
+    """SQL corregido localmente y las correcciones aplicadas"""
+    sql: str
+    fixes: Tuple[str, ...]
+
+    @property
+    def summary(self) -> str:
+        return "; ".join(self.fixes)
+
+
+@dataclass(slots=True)
+class RepairStats:
+    """Contadores de la reparación local de SQL"""
+    attempts: int = 0
+    repaired: int = 0  # Se produjo un SQL corregido
+    llm_calls_saved: int = 0  # El SQL corregido se ejecutó sin error: no hubo que regenerarlo
+
+    @property
+    def save_rate(self) -> float:
+        return self.llm_calls_saved / self.attempts if self.attempts else 0.0
+
+
+class SQLRepairer:
+    """
+    Corrige sin LLM los fallos mecánicos de un SQL generado, con sqlglot y el
+    esquema conocido: columnas y tablas mal escritas (o con otra capitalización o
+    acentos), comillas sin cerrar, valores sin comillas y funciones o sintaxis de
+    otros dialectos (MySQL, T-SQL, Postgres...) traducidas a DuckDB.
+    Si no hay nada que corregir con seguridad retorna None y el reintento va al LLM.
+    """
+
+    def __init__(self, min_similarity: float = SQL_REPAIR_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self.stats = RepairStats()
+        self._lock = threading.Lock()
+
+    def repair(self, sql: str, error: str, schema: DatasetSchema) -> Optional[SQLRepair]:
+        """SQL corregido para el `error` de DuckDB (o de sintaxis), o None"""
+        with self._lock:
+            self.stats.attempts += 1
+        original = sql.strip().rstrip(';')
+        fixes: List[str] = []
+        tree = _parse(original, error, fixes)
+        if tree is None:
+            return None
+        _fix_tables(tree, schema, fixes)
+        _fix_columns(tree, schema, self.min_similarity, fixes)
+        if not fixes:
+            return None
+        try:
+            repaired = tree.sql(dialect="duckdb", unsupported_level=ErrorLevel.RAISE)
+        except SqlglotError:
+            return None
+        if repaired == original:
+            return None
+        with self._lock:
+            self.stats.repaired += 1
+        return SQLRepair(repaired, tuple(dict.fromkeys(fixes)))
+
+    def record_saved(self) -> None:
+        """El SQL reparado se ejecutó bien: una llamada al LLM ahorrada"""
+        with self._lock:
+            self.stats.llm_calls_saved += 1
+
+
+def _parse(sql: str, error: str, fixes: List[str]) -> Optional[exp.Expression]:
+    """AST en DuckDB; cierra comillas o traduce desde otro dialecto si hace falta"""
+    match = _MISSING_FUNCTION.search(error or "")
+    missing = match.group(1) if match else None
+    source = sql
+    try:
+        tree = sqlglot.parse_one(sql, read="duckdb")
+    except SqlglotError:
+        tree = _close_quote(sql)
+        if tree is not None:
+            source = tree.sql(dialect="duckdb")
+            fixes.append("comilla de cierre agregada")
+    if tree is not None and missing is None:
+        return tree
+    if tree is not None and not _calls(tree, missing):
+        # sqlglot ya la reescribe al regenerar en DuckDB (p. ej. NVL -> COALESCE)
+        fixes.append(f"{missing} traducida a DuckDB")
+        return tree
+
+    # Sintaxis o función de otro dialecto: el primero que se traduzca completo a DuckDB
+    for dialect in SOURCE_DIALECTS:
+        try:
+            translated = sqlglot.parse_one(source, read=dialect).sql(dialect="duckdb", unsupported_level=ErrorLevel.RAISE)
+            candidate = sqlglot.parse_one(translated, read="duckdb")
+        except SqlglotError:
+            continue
+        if missing and _calls(candidate, missing):
+            continue
+        fixes.append(f"{missing or 'sintaxis'} traducida de {dialect} a DuckDB")
+        return candidate
+    return None
+
+
+def _calls(tree: exp.Expression, function: str) -> bool:
+    """La query generada en DuckDB sigue llamando a `function` (o no se puede generar sin perder argumentos)"""
+    try:
+        sql = tree.sql(dialect="duckdb", unsupported_level=ErrorLevel.RAISE)
+    except SqlglotError:
+        return True
+    return re.search(rf"\b{re.escape(function)}\s*\(", sql, re.IGNORECASE) is not None
+
+
+def _close_quote(sql: str) -> Optional[exp.Expression]:
+    """Cierra el último literal sin comilla final en el primer punto donde la query parsea"""
+    start = None
+    for i, char in enumerate(sql):
+        if char == "'":
+            start = i if start is None else None
+    if start is None:
+        return None
+    for boundary in re.finditer(r"[\s,);]|$", sql[start + 1:]):
+        end = start + 1 + boundary.start()
+        try:
+            return sqlglot.parse_one(f"{sql[:end]}'{sql[end:]}", read="duckdb")
+        except SqlglotError:
+            continue
+    return None
+
+
+def _fix_tables(tree: exp.Expression, schema: DatasetSchema, fixes: List[str]) -> None:
+    ctes = {cte.alias.lower() for cte in tree.find_all(exp.CTE)}
+    for table in tree.find_all(exp.Table):
+        name = table.name
+        if not name or name.lower() == schema.table_name.lower() or name.lower() in ctes:
+            continue
+        if difflib.SequenceMatcher(None, name.lower(), schema.table_name.lower()).ratio() >= _TABLE_SIMILARITY:
+            table.set("this", exp.to_identifier(schema.table_name))
+            fixes.append(f"tabla {name} → {schema.table_name}")
+
+
+def _fix_columns(tree: exp.Expression, schema: DatasetSchema, min_similarity: float, fixes: List[str]) -> None:
+    index = {_normalize(col): col for col in schema.columns}
+    known = {col.lower() for col in schema.columns}  # DuckDB resuelve identificadores sin distinguir mayúsculas
+    _fix_split_names(tree, schema, index, fixes)
+    for scope in traverse_scope(tree):
+        # Solo scopes que leen directo de la tabla: en subconsultas y CTEs las columnas son derivadas
+        sources = list(scope.sources.values())
+        if not sources or not all(
+            isinstance(s, exp.Table) and s.name.lower() == schema.table_name.lower() for s in sources
+        ):
+            continue
+        # Alias de la proyección (ORDER BY total): no son columnas de la tabla
+        aliases = {e.alias.lower() for e in scope.expression.expressions if isinstance(e, exp.Alias)}
+        for column in list(scope.columns):
+            name = column.name
+            if not name or name.lower() in known or name.lower() in aliases:
+                continue
+            if column.table and column.table not in scope.sources:
+                continue
+            fixed = _fix_column(column, schema, index, min_similarity)
+            if fixed:
+                fixes.append(fixed)
+
+
+def _fix_column(column: exp.Column, schema: DatasetSchema, index: Dict[str, str], min_similarity: float) -> Optional[str]:
+    """Corrige una columna desconocida; retorna la descripción o None"""
+    name = column.name
+    # 1. Misma columna con otra capitalización, acentos o separadores
+    real = index.get(_normalize(name))
+    # 2. Valor sin comillas comparado con una columna ("region = Norte")
+    if real is None:
+        value = _compared_value(column, schema)
+        if value is not None:
+            column.replace(exp.Literal.string(value))
+            return f"{name} → '{value}'"
+    # 3. Nombre mal escrito: la columna más parecida, si no hay empate
+    if real is None:
+        real = _closest(_normalize(name), index, min_similarity)
+    if real is None:
+        return None
+    column.set("this", exp.to_identifier(real, quoted=not _PLAIN_IDENTIFIER.fullmatch(real)))
+    return f"columna {name} → {real}"
+
+
+def _fix_split_names(tree: exp.Expression, schema: DatasetSchema, index: Dict[str, str], fixes: List[str]) -> None:
+    """`SELECT Nombre Cliente` sin comillas se lee como alias: se une si la columna existe"""
+    for alias in list(tree.find_all(exp.Alias)):
+        column = alias.this
+        if not isinstance(column, exp.Column) or column.table or column.name.lower() in {c.lower() for c in schema.columns}:
+            continue
+        real = index.get(_normalize(f"{column.name} {alias.alias}"))
+        if real is not None:
+            alias.replace(exp.column(exp.to_identifier(real, quoted=True)))
+            fixes.append(f"columna {column.name} {alias.alias} → \"{real}\"")
+
+
+def _compared_value(column: exp.Column, schema: DatasetSchema) -> Optional[str]:
+    """Valor literal si la "columna" es el lado derecho de una comparación con una columna real"""
+    parent = column.parent
+    if isinstance(parent, _COMPARISONS):
+        other = parent.left if parent.right is column else parent.right
+    elif isinstance(parent, exp.In):
+        other = parent.this
+    else:
+        return None
+    real = next((col for col in schema.columns if col.lower() == other.name.lower()), None) if isinstance(other, exp.Column) else None
+    if real is None:
+        return None
+    profile = schema.profile.get(real)
+    if profile is not None:
+        for value in profile.top_values:
+            if str(value).lower() == column.name.lower():
+                return str(value)
+    # Comillas dobles en un valor ("Norte"): en DuckDB son de identificador
+    return column.name if column.this.quoted else None
+
+
+def _closest(name: str, index: Dict[str, str], min_similarity: float) -> Optional[str]:
+    scored = sorted(
+        ((difflib.SequenceMatcher(None, name, key).ratio(), key) for key in index),
+        reverse=True,
+    )
+    if not scored or scored[0][0] < min_similarity:
+        return None
+    if len(scored) > 1 and scored[1][0] == scored[0][0]:
+        return None  # Ambiguo: mejor que decida el LLM
+    return index[scored[0][1]]
+
+
+def _normalize(name: str) -> str:
+    """Sin acentos, minúsculas y solo alfanuméricos: "Región_Venta" ~ "region venta" """
+    name = unicodedata.normalize("NFKD", name.lower())
+    return "".join(c for c in name if c.isalnum() and not unicodedata.combining(c))
@@ -1,6 +1,8 @@
 # application/state.py
 from typing import TypedDict, Annotated, List, Dict, Any, Optional
 from langgraph.graph.message import add_messages
+from domain.entities.dataset import DatasetSchema
+from domain.value_objects.query_result import QueryResult
 
 class AnalystState(TypedDict):
     """
@@ -11,18 +13,24 @@ class AnalystState(TypedDict):
     
     # Contexto de datos
     schema_info: str  # El esquema de la tabla en texto
+    schema_fingerprint: str  # Huella del esquema (clave de la caché semántica de SQL)
+    dataset_schema: Optional[DatasetSchema]  # Esquema estructurado: poda de columnas en tablas anchas
     
     # Estado interno del proceso
     sql_query: str    # La query generada
     is_safe: bool     # Resultado de validación
-    execution_result: List[Dict[str, Any]] # Datos crudos de DuckDB
+    execution_result: QueryResult # Datos de DuckDB en formato columnar (Arrow)
+    approximate: bool  # Permitir estimaciones sobre muestras en tablas grandes
     
     # Visualización
     viz_config: Dict[str, Any]  # Configuración para generar gráficos
     
     # Control de flujo y errores
     error: Optional[str]
+    error_type: Optional[str]  # Clase de error estructurada ("timeout", "execution", "syntax", "validation")
     retry_count: int  # Para evitar bucles infinitos de corrección
+    sql_cache_hit: Optional[str]  # Entrada de la caché semántica de la que salió el SQL
+    sql_repaired: Optional[str]  # Correcciones locales aplicadas al SQL ("" si se intentó sin éxito)
 
     # Memoria de largo plazo
     last_successful_sql: Optional[str]
\ No newline at end of file
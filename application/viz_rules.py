@@ -0,0 +1,152 @@
+# application/viz_rules.py
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from domain.value_objects.query_result import QueryResult
+
+# Confianza mínima de las reglas para no consultar al LLM de visualización
+VIZ_RULES_MIN_CONFIDENCE = float(os.getenv("VIZ_RULES_MIN_CONFIDENCE", "0.7"))
+# Categorías máximas para barras legibles (y para tarta)
+MAX_BAR_CATEGORIES = 30
+MAX_PIE_CATEGORIES = 8
+# Series máximas (una línea por categoría) para una serie temporal legible
+MAX_LINE_SERIES = 10
+
+# Palabra completa (separada por _, espacio o bordes), con plural opcional:
+# "fecha_venta" y "ventas_por_mes" sí; "media", "mediana" o "semestre" no
+_TEMPORAL_NAME = re.compile(
+    r"(?:^|[\W_])(fecha|date|mes|month|año|anio|year|dia|day|semana|week|trimestre|quarter|periodo|period|hora|hour|time)"
+    r"(?:e?s)?(?:[\W_]|$)",
+    re.IGNORECASE,
+)
+# Fracción mínima de periodos distintos entre el mínimo y el máximo (1..12 con huecos)
+_PERIOD_COVERAGE = 0.8
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}(-\d{2})?([ T]\d{2}:\d{2}.*)?$")
+_PIE_WORDS = re.compile(r"(porcentaj|proporci|participaci|distribución porcentual|share|%)", re.IGNORECASE)
+_BOX_WORDS = re.compile(r"(outlier|atípic|atipic|rango|dispersi|cuartil)", re.IGNORECASE)
+_SCATTER_WORDS = re.compile(r"(correlaci|relación entre|relacion entre|versus|\bvs\b)", re.IGNORECASE)
+
+
+@dataclass(frozen=True, slots=True)
+class ChartInference:
+    """Configuración de gráfico inferida por reglas, con su confianza (0-1)"""
+    config: Dict[str, Any]
+    confidence: float
+    reason: str
+
+
+@dataclass(slots=True)
+class _Columns:
+    """Columnas del resultado clasificadas por rol"""
+    temporal: List[str] = field(default_factory=list)
+    numeric: List[str] = field(default_factory=list)
+    categorical: List[str] = field(default_factory=list)
+
+
+def infer_chart(data: QueryResult, question: str = "") -> ChartInference:
+    """
+    Infiere el gráfico a partir de los tipos Arrow, la cardinalidad, las columnas
+    temporales y el número de filas del resultado. Las palabras clave de la pregunta
+    solo desempatan (tarta, caja, dispersión). Con confianza baja, el nodo consulta al LLM.
+    """
+    table = data.table
+    rows = table.num_rows
+    if rows == 0 or table.num_columns == 0:
+        return ChartInference({"chart_type": "none"}, 1.0, "sin datos")
+    cols = _classify(table)
+
+    # 1. Serie temporal: eje X temporal y al menos una medida (una línea por categoría)
+    if cols.temporal and cols.numeric:
+        x, y = cols.temporal[0], cols.numeric[0]
+        native = pa.types.is_temporal(table.schema.field(x).type)
+        confidence = (0.95 if native else 0.85) - 0.1 * (len(cols.numeric) - 1)
+        if not cols.categorical:
+            return _chart("line", x, y, f"{y} por {x}", confidence, "serie temporal")
+        color = cols.categorical[0]
+        series = pc.count_distinct(table.column(color)).as_py()
+        if len(cols.categorical) > 1 or series > MAX_LINE_SERIES:
+            # Varias dimensiones o demasiadas series: el LLM decide cómo agrupar
+            return _chart("line", x, y, f"{y} por {x}", 0.5, "serie temporal con varias dimensiones", color)
+        return _chart("line", x, y, f"{y} por {x} y {color}", confidence, "serie temporal por categoría", color)
+
+    # 2. Una sola variable numérica: distribución
+    if len(cols.numeric) == 1 and not cols.categorical and not cols.temporal:
+        x = cols.numeric[0]
+        if _BOX_WORDS.search(question):
+            return _chart("box", x, None, f"Rango de {x}", 0.9, "una numérica, rango/outliers")
+        if rows < 5:
+            return ChartInference({"chart_type": "none"}, 0.8, "una numérica con pocas filas")
+        return _chart("histogram", x, None, f"Distribución de {x}", 0.9, "una numérica")
+
+    # 3. Categoría + medida
+    if cols.categorical and cols.numeric:
+        x, y = cols.categorical[0], cols.numeric[0]
+        distinct = pc.count_distinct(table.column(x)).as_py()
+        extra = 0.1 * (len(cols.categorical) - 1 + len(cols.numeric) - 1)  # Más columnas: más ambigüedad
+        if distinct == rows:
+            # Resultado agregado: una fila por categoría
+            if _PIE_WORDS.search(question) and rows <= MAX_PIE_CATEGORIES:
+                return _chart("pie", x, y, f"{y} por {x}", 0.9 - extra, "categorías pocas, proporción")
+            if rows <= MAX_BAR_CATEGORIES:
+                return _chart("bar", x, y, f"{y} por {x}", 0.9 - extra, "categorías de baja cardinalidad")
+            return _chart("bar", x, y, f"{y} por {x}", 0.5, "demasiadas categorías")
+        if distinct <= MAX_BAR_CATEGORIES:
+            # Filas sin agregar con categorías repetidas: distribución por categoría
+            return _chart("box", x, y, f"{y} por {x}", 0.75 - extra, "filas repetidas por categoría")
+        return _chart("bar", x, y, f"{y} por {x}", 0.4, "categorías repetidas de alta cardinalidad")
+
+    # 4. Dos o más numéricas: dispersión
+    if len(cols.numeric) >= 2 and not cols.categorical:
+        x, y = cols.numeric[0], cols.numeric[1]
+        confidence = 0.9 if _SCATTER_WORDS.search(question) else 0.8 - 0.1 * (len(cols.numeric) - 2)
+        return _chart("scatter", x, y, f"{y} vs {x}", confidence, "numéricas")
+
+    # 5. Sin medidas (listados de texto, solo fechas...): el LLM decide
+    return ChartInference({"chart_type": "none"}, 0.5, "sin columnas numéricas")
+
+
+def _chart(
+    chart_type: str, x: str, y: Optional[str], title: str, confidence: float, reason: str, color: Optional[str] = None
+) -> ChartInference:
+    config = {"chart_type": chart_type, "x_column": x, "y_column": y, "title": title}
+    if color:
+        config["color_column"] = color
+    return ChartInference(config, round(confidence, 2), reason)
+
+
+def _classify(table: pa.Table) -> _Columns:
+    cols = _Columns()
+    for f in table.schema:
+        column = table.column(f.name)
+        if pa.types.is_temporal(f.type) or _looks_temporal(f.name, f.type, column):
+            cols.temporal.append(f.name)
+        elif pa.types.is_integer(f.type) or pa.types.is_floating(f.type) or pa.types.is_decimal(f.type):
+            cols.numeric.append(f.name)
+        else:
+            cols.categorical.append(f.name)
+    return cols
+
+
+def _looks_temporal(name: str, dtype: pa.DataType, column: pa.ChunkedArray) -> bool:
+    """Texto ISO ("2024-01") o enteros de año/periodo en columnas con nombre temporal"""
+    sample = [v for v in column.slice(0, 20).to_pylist() if v is not None]
+    if not sample:
+        return False
+    if pa.types.is_string(dtype) or pa.types.is_large_string(dtype):
+        return all(_ISO_DATE.match(v) for v in sample)
+    if pa.types.is_integer(dtype) and _TEMPORAL_NAME.search(name):
+        if all(1900 <= v <= 2100 for v in sample):
+            return True  # Años
+        # Periodos numerados (mes, semana, día, hora): casi consecutivos, no cantidades
+        # en 0..53 como dias_mora u horas_trabajadas
+        if not all(0 <= v <= 53 for v in sample):
+            return False
+        bounds = pc.min_max(column).as_py()
+        span = bounds["max"] - bounds["min"] + 1
+        return pc.count_distinct(column).as_py() >= _PERIOD_COVERAGE * span
+    return False
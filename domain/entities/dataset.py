@@ -1,8 +1,27 @@
 
 # domain/entities/dataset.py
+import hashlib
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+@dataclass(slots=True)
+class ColumnProfile:
+    """Perfil estadístico de una columna, calculado una sola vez al ingerir"""
+    null_count: int
+    approx_distinct: int
+    min_value: Optional[str] = None
+    max_value: Optional[str] = None
+    top_values: List[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        """Resumen compacto para el prompt"""
+        parts = [f"nulls={self.null_count}", f"distinct≈{self.approx_distinct}"]
+        if self.min_value is not None and self.max_value is not None:
+            parts.append(f"range=[{self.min_value} .. {self.max_value}]")
+        if self.top_values:
+            parts.append(f"top={self.top_values}")
+        return ", ".join(parts)
 
 @dataclass(slots=True)
 class DatasetSchema:
@@ -13,8 +32,30 @@ class DatasetSchema:
     columns: Dict[str, str]  # ej: {"ingresos": "FLOAT", "fecha": "DATE"}
     summary: str = ""
     created_at: datetime = field(default_factory=datetime.utcnow)
+    profile: Dict[str, ColumnProfile] = field(default_factory=dict)  # Perfil por columna (ingesta)
+    profile_sampled: bool = False  # True si el perfil se calculó sobre una muestra
+
+    def fingerprint(self) -> str:
+        """Huella de la estructura (tabla, columnas y tipos): estable ante recargas con otros datos"""
+        cols = "|".join(f"{col}:{dtype}" for col, dtype in sorted(self.columns.items()))
+        return hashlib.sha1(f"{self.table_name}|{cols}".encode("utf-8")).hexdigest()[:16]
 
-    def get_context_for_llm(self) -> str:
-        """Formatea el esquema para inyectarlo en el prompt del LLM"""
-        cols_str = ", ".join([f"{col} ({dtype})" for col, dtype in self.columns.items()])
-        return f"Table: {self.table_name} | Columns: {cols_str} | Rows: {self.row_count}"
\ No newline at end of file
+    def get_context_for_llm(self, columns: Optional[List[str]] = None) -> str:
+        """
+        Formatea el esquema para inyectarlo en el prompt del LLM.
+        `columns` limita el contexto a un subconjunto (tablas anchas), en el orden del esquema.
+        """
+        wanted = None if columns is None else set(columns)
+        selected = self.columns if wanted is None else {c: t for c, t in self.columns.items() if c in wanted}
+        cols_str = ", ".join([f"{col} ({dtype})" for col, dtype in selected.items()])
+        context = f"Table: {self.table_name} | Columns: {cols_str} | Rows: {self.row_count}"
+        if len(selected) < len(self.columns):
+            context += (
+                f"\nNOTA: se muestran {len(selected)} de {len(self.columns)} columnas, "
+                "las más relevantes para la pregunta. Usa solo estas."
+            )
+        if self.profile:
+            note = " (estimado sobre muestra)" if self.profile_sampled else ""
+            lines = [f"- {col}: {prof.describe()}" for col, prof in self.profile.items() if col in selected]
+            context += f"\nColumn profile{note}:\n" + "\n".join(lines)
+        return context
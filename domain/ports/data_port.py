@@ -1,16 +1,18 @@
 # domain/ports/data_port.py
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
 from domain.entities.dataset import DatasetSchema
+from domain.value_objects.query_result import QueryResult
 from domain.value_objects.sql_query import SQLQuery
 
 class DataProviderPort(ABC):
     """Interfaz que la Infraestructura (DuckDB/LanceDB) debe cumplir"""
+    # Tiempo máximo por query en segundos (0 = sin límite)
+    query_timeout_s: float = 0.0
     
     @abstractmethod
     async def get_schema(self, table_name: str) -> DatasetSchema:
         pass
 
     @abstractmethod
-    async def execute_query(self, query: SQLQuery) -> List[Dict[str, Any]]:
+    async def execute_query(self, query: SQLQuery) -> QueryResult:
         pass
\ No newline at end of file
@@ -0,0 +1,89 @@
+# domain/value_objects/query_result.py
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+
+@dataclass(frozen=True, slots=True)
+class QueryResult:
+    """
+    Value Object con el resultado columnar de una query (pyarrow.Table).
+    Los datos viajan en formato columnar por el grafo y la UI; la conversión
+    a objetos Python ocurre solo en los bordes que la necesitan (muestras para el LLM).
+    Si el fetch se cortó por límites de filas/bytes, `truncated` lo indica y
+    `source_sql` permite recuperar el resto por páginas.
+    Si es una estimación sobre una muestra, `approximate` lo indica y `margins` trae
+    el margen de error al 95% de cada columna agregada.
+    """
+    table: pa.Table
+    truncated: bool = False
+    total_rows: Optional[int] = None  # Filas reales de la query (solo si se truncó)
+    source_sql: Optional[str] = None
+    approximate: bool = False
+    sample_fraction: Optional[float] = None  # Fracción de filas de la tabla en la muestra
+    margins: Optional[pa.Table] = None  # Misma forma que las columnas agregadas: ± al 95%
+
+    @classmethod
+    def empty(cls) -> 'QueryResult':
+        return cls(pa.table({}))
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def column_names(self) -> List[str]:
+        return self.table.column_names
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __bool__(self) -> bool:
+        return self.table.num_rows > 0
+
+    def partial_note(self) -> str:
+        """Aviso legible de resultado parcial (vacío si el resultado está completo)"""
+        if not self.truncated:
+            return ""
+        total = f"{self.total_rows:,}" if self.total_rows is not None else "?"
+        return f"Resultado parcial: se muestran {self.num_rows:,} de {total} filas."
+
+    def approx_note(self) -> str:
+        """Aviso legible de resultado estimado (vacío si el resultado es exacto)"""
+        if not self.approximate:
+            return ""
+        note = f"Resultado aproximado sobre una muestra del {self.sample_fraction:.2%} de las filas"
+        relative = self.max_relative_margin()
+        if relative is not None:
+            note += f" (margen de error hasta ±{relative:.1%}, 95% de confianza)"
+        return note + "."
+
+    def max_relative_margin(self) -> Optional[float]:
+        """Mayor margen de error relativo al valor estimado entre las columnas agregadas"""
+        if not self.approximate or self.margins is None:
+            return None
+        worst = None
+        for name in self.margins.column_names:
+            for value, margin in zip(self.table.column(name).to_pylist(), self.margins.column(name).to_pylist()):
+                if value and margin is not None:
+                    ratio = abs(margin / float(value))
+                    worst = ratio if worst is None else max(worst, ratio)
+        return worst
+
+    def head(self, n: int) -> 'QueryResult':
+        """Primeras n filas (slice sin copia)"""
+        return QueryResult(self.table.slice(0, n))
+
+    def to_records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Filas como dicts con valores serializables (fechas como texto ISO)"""
+        table = self.table if limit is None else self.table.slice(0, limit)
+        return [{k: _to_plain(v) for k, v in row.items()} for row in table.to_pylist()]
+
+def _to_plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
@@ -1,45 +1,206 @@
 # infrastructure/llm/hybrid_factory.py
+import asyncio
 import os
+import threading
+import weakref
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import httpx
+from groq import AsyncGroq
+from langchain_core.language_models import BaseChatModel
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
 
+from infrastructure.llm.provider_router import ProviderRouter, RoutedChatModel
+
+GEMINI_MODEL = "gemini-2.5-flash"
+GROQ_MODEL = "llama-3.3-70b-versatile"
+# Conexiones HTTP mantenidas abiertas por proveedor (keep-alive entre preguntas)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "8"))
+LLM_KEEPALIVE_S = float(os.getenv("LLM_KEEPALIVE_S", "120"))
+# Temperaturas que usan los nodos del grafo (SQL/viz, análisis, sugerencias)
+WARM_UP_TEMPERATURES = (0, 0.2, 0.4)
+
+ModelKey = Tuple[str, str, float]  # (proveedor, modelo, temperatura)
+
+
 class HybridLLMFactory:
-    @staticmethod
-    def get_model(temperature: float = 0):
-        """
-        Retorna un modelo LLM con estrategia de Fallback:
-        Intenta Gemini 2.5 -> Si falla -> Usa Groq (Llama 3).
-        """
-        
-        # 1. Configurar el Primario (Google Gemini)
-        google_api_key = os.getenv("GOOGLE_API_KEY")
-        if google_api_key:
-            gemini = ChatGoogleGenerativeAI(
-                model="gemini-2.5-flash", 
+    """
+    Registro de clientes LLM del proceso, por proveedor, modelo y temperatura.
+    Cada nodo pide su modelo con `get_model` y recibe siempre la misma instancia,
+    con su pool de conexiones HTTP ya abierto: una pregunta no paga construcción
+    de clientes ni handshakes TLS en cada llamada.
+    Los pools asíncronos de httpx quedan ligados al event loop que los usó, así que
+    el registro se separa por event loop (y se libera cuando el loop se recolecta).
+    """
+    _lock = threading.Lock()
+    _by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[ModelKey, BaseChatModel]]" = weakref.WeakKeyDictionary()
+    _sync_models: Dict[ModelKey, BaseChatModel] = {}
+    _chains: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[float, BaseChatModel]]" = weakref.WeakKeyDictionary()
+    _sync_chains: Dict[float, BaseChatModel] = {}
+    # Transporte compartido por proveedor y event loop (un pool para todas las temperaturas)
+    _transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+    _http_client: Optional[httpx.Client] = None
+    # Salud y latencia por proveedor, compartidas por todas las cadenas del proceso
+    router = ProviderRouter()
+    # Modelo fijo para todos los nodos (benchmarks y pruebas sin red ni API keys)
+    _override: Optional[BaseChatModel] = None
+
+    @classmethod
+    def get_model(cls, temperature: float = 0):
+        """
+        Retorna un modelo LLM con enrutamiento entre Gemini 2.5 y Groq (Llama 3):
+        el proveedor sano más rápido primero, failover al otro y circuit breaker
+        para no esperar timeouts de un proveedor degradado (ver ProviderRouter).
+        La cadena se construye una sola vez por temperatura (y event loop).
+        """
+        if cls._override is not None:
+            return cls._override
+        loop = _running_loop()
+        with cls._lock:
+            chains = cls._sync_chains if loop is None else cls._chains.setdefault(loop, {})
+            chain = chains.get(temperature)
+            if chain is None:
+                chain = chains[temperature] = cls._build_chain(temperature, loop)
+            return chain
+
+    @classmethod
+    def override(cls, model: Optional[BaseChatModel]) -> None:
+        """
+        Sustituye los proveedores por `model` en todos los nodos (p. ej. un
+        ScriptedChatModel en los benchmarks), sin importar la temperatura. None lo quita.
+        """
+        with cls._lock:
+            cls._override = model
+
+    @classmethod
+    def _build_chain(cls, temperature: float, loop: Optional[asyncio.AbstractEventLoop]):
+        # 1. Primario (Google Gemini), solo si hay API key
+        gemini = cls._client("gemini", GEMINI_MODEL, temperature, loop) if os.getenv("GOOGLE_API_KEY") else None
+
+        # 2. Secundario (Groq Llama 3)
+        if not os.getenv("GROQ_API_KEY"):
+            raise ValueError("GROQ_API_KEY es obligatoria para el fallback")
+        groq = cls._client("groq", GROQ_MODEL, temperature, loop)
+
+        # 3. Crear la cadena de Resiliencia
+        if gemini:
+            # Gemini tiene preferencia mientras no se mida otra cosa; el router decide por latencia y errores
+            return RoutedChatModel(candidates=[("gemini", gemini), ("groq", groq)], router=cls.router)
+        print("⚠️ Aviso: GOOGLE_API_KEY no encontrada. Usando solo Groq.")
+        return groq
+
+    @classmethod
+    def _client(
+        cls, provider: str, model: str, temperature: float, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> BaseChatModel:
+        """Cliente del registro (se crea en el primer uso). Llamar con `_lock` tomado"""
+        registry = cls._sync_models if loop is None else cls._by_loop.setdefault(loop, {})
+        key = (provider, model, temperature)
+        client = registry.get(key)
+        if client is None:
+            transports = {} if loop is None else cls._transports.setdefault(loop, {})
+            client = registry[key] = cls.build_model(provider, model, temperature, transports.get(provider))
+            transports.setdefault(provider, client.client if provider == "gemini" else client.http_async_client)
+        return client
+
+    @classmethod
+    def build_model(cls, provider: str, model: str, temperature: float, transport: Any = None) -> BaseChatModel:
+        """
+        Construye un cliente nuevo (sin registro). Los nodos deben usar `get_model`.
+        `transport` reutiliza un pool existente: el httpx.AsyncClient de Groq o el
+        cliente de google-genai de Gemini.
+        """
+        if provider == "gemini":
+            chat = ChatGoogleGenerativeAI(
+                model=model,
                 temperature=temperature,
-                google_api_key=google_api_key,
-                max_retries=1,        
+                google_api_key=os.getenv("GOOGLE_API_KEY"),
+                max_retries=1,
                 request_timeout=10,
             )
-        else:
-            gemini = None
+            if transport is not None:
+                chat.client = transport
+            return chat
+        if provider == "groq":
+            return ChatGroq(
+                model_name=model,
+                temperature=temperature,
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                max_retries=3,
+                http_client=cls._shared_http_client(),
+                http_async_client=transport or httpx.AsyncClient(limits=_limits(), timeout=httpx.Timeout(60.0)),
+            )
+        raise ValueError(f"Proveedor LLM desconocido: {provider}")
 
-        # 2. Configurar el Secundario (Groq Llama 3)
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        if not groq_api_key:
-            raise ValueError("GROQ_API_KEY es obligatoria para el fallback")
-            
-        groq = ChatGroq(
-            model_name="llama-3.3-70b-versatile",
-            temperature=temperature,
-            groq_api_key=groq_api_key,
-            max_retries=3
+    @classmethod
+    def _shared_http_client(cls) -> httpx.Client:
+        # El cliente síncrono no depende del event loop: uno para todo el proceso
+        if cls._http_client is None:
+            cls._http_client = httpx.Client(limits=_limits(), timeout=httpx.Timeout(60.0))
+        return cls._http_client
+
+    @classmethod
+    async def warm_up(cls, temperatures: Iterable[float] = WARM_UP_TEMPERATURES) -> None:
+        """
+        Crea los clientes de los nodos en el event loop actual y abre sus conexiones
+        (una petición barata de listado por proveedor), para que la primera pregunta
+        no pague el handshake. Los errores se ignoran: el warm-up es solo una optimización.
+        """
+        try:
+            for temperature in temperatures:
+                cls.get_model(temperature)
+        except ValueError as e:
+            print(f"⚠️ Warm-up de LLM omitido: {e}")
+            return
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            clients = list(cls._by_loop.get(loop, {}).items())
+        opened = set()
+        pings = []
+        for (provider, _, _), client in clients:
+            if provider in opened:
+                continue
+            opened.add(provider)
+            pings.append(_ping(provider, client))
+        for outcome in await asyncio.gather(*pings, return_exceptions=True):
+            if isinstance(outcome, Exception):
+                print(f"⚠️ Warm-up de LLM sin conexión: {outcome}")
+
+    @classmethod
+    def reset(cls) -> None:
+        """Descarta los clientes registrados (p. ej. tras cambiar las API keys)"""
+        with cls._lock:
+            cls._by_loop.clear()
+            cls._chains.clear()
+            cls._sync_models.clear()
+            cls._sync_chains.clear()
+            cls._transports.clear()
+
+
+async def _ping(provider: str, client: BaseChatModel) -> None:
+    if provider == "groq":
+        # Mismo http_async_client que las completions: la conexión queda en su pool
+        sdk = AsyncGroq(
+            api_key=client.groq_api_key.get_secret_value(),
+            base_url=client.groq_api_base,
+            http_client=client.http_async_client,
         )
+        await sdk.models.list()
+    elif provider == "gemini":
+        await client.client.aio.models.get(model=client.model)
 
-        # 3. Crear la cadena de Resiliencia
-        if gemini:
-            # Si gemini lanza error, sigue Groq
-            return gemini.with_fallbacks([groq])
-        else:
-            print("⚠️ Aviso: GOOGLE_API_KEY no encontrada. Usando solo Groq.")
-            return groq
\ No newline at end of file
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_S,
+    )
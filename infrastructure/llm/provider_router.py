@@ -0,0 +1,364 @@
+# infrastructure/llm/provider_router.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Fallos consecutivos que abren el circuito de un proveedor
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+# Segundos con el circuito abierto antes de probar de nuevo (half-open)
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+# Petición duplicada al siguiente proveedor si el primero tarda más que su p95
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+LLM_HEDGE_MIN_S = float(os.getenv("LLM_HEDGE_MIN_S", "0.5"))
+# Espera del hedge mientras no hay latencias medidas
+LLM_HEDGE_DEFAULT_S = float(os.getenv("LLM_HEDGE_DEFAULT_S", "3"))
+# Llamadas recientes por proveedor para latencias y tasa de error
+ROUTER_WINDOW = 50
+_MIN_SAMPLES_P95 = 5
+# Cota de la tasa de éxito en el orden: como mucho multiplica la mediana por 10
+_MIN_SUCCESS_RATE = 0.1
+
+Candidate = Tuple[str, BaseChatModel]  # (proveedor, cliente)
+
+
+class ProvidersUnavailableError(RuntimeError):
+    """Todos los proveedores fallaron para la misma llamada"""
+
+
+@dataclass(slots=True)
+class ProviderHealth:
+    """Ventana de latencias y resultados recientes de un proveedor + estado del circuito"""
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+    outcomes: Deque[bool] = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None  # Momento en que se abrió el circuito
+    trial_in_flight: bool = False  # Half-open: una sola llamada de prueba a la vez
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+@dataclass(slots=True)
+class RouterStats:
+    """Métricas globales del router"""
+    calls: int = 0
+    failovers: int = 0  # Llamadas que terminaron en un proveedor distinto del elegido
+    hedges: int = 0  # Peticiones duplicadas lanzadas
+    hedge_wins: int = 0  # Hedges que respondieron antes que el original
+    short_circuits: int = 0  # Proveedores saltados por circuito abierto
+
+
+class ProviderRouter:
+    """
+    Enrutamiento por latencia entre proveedores LLM, compartido por todo el proceso.
+    Lleva latencias y tasa de error recientes por proveedor, abre un circuit breaker
+    tras `failure_threshold` fallos seguidos (nadie espera el timeout de un proveedor
+    caído) y lo prueba de nuevo tras `cooldown_s`. Ordena los proveedores sanos por
+    latencia esperada hasta una respuesta válida (mediana / tasa de éxito): uno rápido
+    que falla a menudo cuesta reintentos; los aún sin medir conservan el orden de
+    preferencia.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = LLM_BREAKER_FAILURES,
+        cooldown_s: float = LLM_BREAKER_COOLDOWN_S,
+        hedging: bool = LLM_HEDGING,
+        hedge_min_s: float = LLM_HEDGE_MIN_S,
+        hedge_default_s: float = LLM_HEDGE_DEFAULT_S,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.hedging = hedging
+        self.hedge_min_s = hedge_min_s
+        self.hedge_default_s = hedge_default_s
+        self.stats = RouterStats()
+        self._health: Dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    def order(self, candidates: Sequence[Candidate]) -> List[Candidate]:
+        """
+        Candidatos en orden de intento: sanos por latencia, luego los de circuito
+        abierto (solo se intentan si todos los demás fallan).
+        """
+        now = time.monotonic()
+        with self._lock:
+            healthy, broken = [], []
+            for rank, (name, model) in enumerate(candidates):
+                health = self._health.setdefault(name, ProviderHealth())
+                if self._available(health, now):
+                    healthy.append((_expected_latency(health), rank, name, model))
+                else:
+                    self.stats.short_circuits += 1
+                    broken.append((health.opened_at or 0.0, rank, name, model))
+            healthy.sort(key=lambda item: (item[0], item[1]))
+            broken.sort(key=lambda item: (item[0], item[1]))
+            return [(name, model) for _, _, name, model in healthy + broken]
+
+    def count(self, **increments: int) -> None:
+        """Suma a las métricas globales (las llamadas concurrentes comparten el router)"""
+        with self._lock:
+            for metric, value in increments.items():
+                setattr(self.stats, metric, getattr(self.stats, metric) + value)
+
+    def acquire(self, name: str) -> None:
+        """Marca el inicio de una llamada (reserva la prueba si el circuito está half-open)"""
+        with self._lock:
+            health = self._health.setdefault(name, ProviderHealth())
+            if health.opened_at is not None:
+                health.trial_in_flight = True
+
+    def record_success(self, name: str, latency_s: float) -> None:
+        with self._lock:
+            health = self._health.setdefault(name, ProviderHealth())
+            health.latencies.append(latency_s)
+            health.outcomes.append(True)
+            health.consecutive_failures = 0
+            health.opened_at = None
+            health.trial_in_flight = False
+
+    def record_failure(self, name: str) -> None:
+        with self._lock:
+            health = self._health.setdefault(name, ProviderHealth())
+            health.outcomes.append(False)
+            health.consecutive_failures += 1
+            health.trial_in_flight = False
+            if health.opened_at is not None or health.consecutive_failures >= self.failure_threshold:
+                if health.opened_at is None:
+                    print(f"⚠️ Circuito abierto para {name}: {health.consecutive_failures} fallos seguidos")
+                health.opened_at = time.monotonic()
+
+    def record_abandoned(self, name: str, elapsed_s: float) -> None:
+        """
+        Llamada cancelada (otra respondió antes, el consumidor cerró el stream o la
+        tarea se canceló): no cuenta como fallo, libera la prueba half-open y su
+        latencia es al menos `elapsed_s`.
+        """
+        with self._lock:
+            health = self._health.setdefault(name, ProviderHealth())
+            health.latencies.append(elapsed_s)
+            health.trial_in_flight = False
+
+    def hedge_delay(self, name: str) -> float:
+        """Espera antes del hedge: p95 reciente del proveedor (con mínimo)"""
+        with self._lock:
+            health = self._health.get(name)
+            if health is None or len(health.latencies) < _MIN_SAMPLES_P95:
+                return self.hedge_default_s
+            return max(self.hedge_min_s, health.percentile(0.95))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Estado por proveedor para diagnóstico"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "p50_s": h.percentile(0.5),
+                    "p95_s": h.percentile(0.95),
+                    "error_rate": round(h.error_rate, 3),
+                    "circuit": "closed" if h.opened_at is None else ("half-open" if self._available(h, now) else "open"),
+                }
+                for name, h in self._health.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._health.clear()
+            self.stats = RouterStats()
+
+    def _available(self, health: ProviderHealth, now: float) -> bool:
+        if health.opened_at is None:
+            return True
+        return now - health.opened_at >= self.cooldown_s and not health.trial_in_flight
+
+
+def _expected_latency(health: ProviderHealth) -> float:
+    """
+    Mediana dividida por la tasa de éxito reciente (acotada por _MIN_SUCCESS_RATE).
+    Sin latencias medidas cuenta como 0 aunque haya fallado: los fallos seguidos
+    los gestiona el circuito, y un proveedor relegado para siempre no se recuperaría.
+    """
+    median = health.percentile(0.5)
+    if median is None:
+        return 0.0
+    return median / max(1.0 - health.error_rate, _MIN_SUCCESS_RATE)
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Modelo de chat que delega en el proveedor que elige el `ProviderRouter`, con
+    failover al siguiente ante un error y, si el router lo tiene activo, un hedge:
+    si el primero supera su p95 se lanza la misma petición al siguiente y gana la
+    primera respuesta. En streaming no hay hedge (los tokens ya mostrados no se
+    pueden reemplazar); el failover solo ocurre antes del primer token y la latencia
+    registrada es la del primer token, no la de la respuesta completa.
+    """
+    candidates: List[Tuple[str, Any]]
+    router: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.router.count(calls=1)
+        errors = []
+        for attempt, (name, model) in enumerate(self.router.order(self.candidates)):
+            self.router.acquire(name)
+            start = time.monotonic()
+            try:
+                message = model.invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                self.router.record_failure(name)
+                errors.append(f"{name}: {e}")
+                continue
+            except BaseException:
+                self.router.record_abandoned(name, time.monotonic() - start)
+                raise
+            self.router.record_success(name, time.monotonic() - start)
+            if attempt:
+                self.router.count(failovers=1)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise ProvidersUnavailableError("; ".join(errors) or "sin proveedores")
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        router = self.router
+        router.count(calls=1)
+        queue = router.order(self.candidates)
+        chosen = queue[0][0] if queue else None
+        running: Dict[asyncio.Task, Tuple[str, float, bool]] = {}  # tarea -> (proveedor, inicio, es hedge)
+        errors = []
+
+        def launch(hedge: bool = False):
+            name, model = queue.pop(0)
+            router.acquire(name)
+            task = asyncio.create_task(model.ainvoke(messages, stop=stop, **kwargs))
+            running[task] = (name, time.monotonic(), hedge)
+
+        try:
+            while queue or running:
+                if not running:
+                    launch()
+                hedge_after = None
+                if router.hedging and queue and len(running) == 1:
+                    name, started, _ = next(iter(running.values()))
+                    hedge_after = max(0.0, router.hedge_delay(name) - (time.monotonic() - started))
+                done, _ = await asyncio.wait(running, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    router.count(hedges=1)
+                    launch(hedge=True)
+                    continue
+                for task in done:
+                    name, started, hedge = running.pop(task)
+                    if task.exception() is not None:
+                        router.record_failure(name)
+                        errors.append(f"{name}: {task.exception()}")
+                        continue
+                    router.record_success(name, time.monotonic() - started)
+                    if hedge:
+                        router.count(hedge_wins=1)
+                    elif name != chosen:
+                        router.count(failovers=1)
+                    return ChatResult(generations=[ChatGeneration(message=task.result())])
+        finally:
+            # El perdedor del hedge se cancela: su latencia queda como cota inferior
+            for task, (name, started, _) in running.items():
+                task.cancel()
+                router.record_abandoned(name, time.monotonic() - started)
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        raise ProvidersUnavailableError("; ".join(errors) or "sin proveedores")
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        self.router.count(calls=1)
+        errors = []
+        for attempt, (name, model) in enumerate(self.router.order(self.candidates)):
+            self.router.acquire(name)
+            start, first_token_s = time.monotonic(), None
+            try:
+                for chunk in model.stream(messages, stop=stop, **kwargs):
+                    if first_token_s is None:
+                        first_token_s = time.monotonic() - start
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as e:
+                self.router.record_failure(name)
+                if first_token_s is not None:
+                    raise
+                errors.append(f"{name}: {e}")
+                continue
+            except BaseException:
+                # Stream cerrado antes de terminar o tarea cancelada: no es un fallo del proveedor
+                self.router.record_abandoned(name, first_token_s or time.monotonic() - start)
+                raise
+            self.router.record_success(name, first_token_s or time.monotonic() - start)
+            if attempt:
+                self.router.count(failovers=1)
+            return
+        raise ProvidersUnavailableError("; ".join(errors) or "sin proveedores")
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self.router.count(calls=1)
+        errors = []
+        for attempt, (name, model) in enumerate(self.router.order(self.candidates)):
+            self.router.acquire(name)
+            start, first_token_s = time.monotonic(), None
+            try:
+                async for chunk in model.astream(messages, stop=stop, **kwargs):
+                    if first_token_s is None:
+                        first_token_s = time.monotonic() - start
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as e:
+                self.router.record_failure(name)
+                if first_token_s is not None:
+                    raise
+                errors.append(f"{name}: {e}")
+                continue
+            except BaseException:
+                # Stream cerrado antes de terminar o tarea cancelada: no es un fallo del proveedor
+                self.router.record_abandoned(name, first_token_s or time.monotonic() - start)
+                raise
+            self.router.record_success(name, first_token_s or time.monotonic() - start)
+            if attempt:
+                self.router.count(failovers=1)
+            return
+        raise ProvidersUnavailableError("; ".join(errors) or "sin proveedores")
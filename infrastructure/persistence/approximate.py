@@ -0,0 +1,142 @@
+# infrastructure/persistence/approximate.py
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import pyarrow as pa
+import sqlglot
+from sqlglot import exp
+
+from infrastructure.security.sql_sanitizer import SQLSanitizer
+
+# z de un intervalo de confianza del 95%
+Z_95 = 1.96
+
+_AGGREGATES = (exp.Count, exp.Sum, exp.Avg)
+
+
+@dataclass(frozen=True, slots=True)
+class ApproxAggregate:
+    position: int  # Índice de la columna en el resultado
+    kind: str  # "count" | "sum" | "avg"
+
+
+@dataclass(frozen=True, slots=True)
+class ApproxPlan:
+    """Query agregada elegible para estimarse sobre una muestra de su única tabla"""
+    table_name: str
+    tree: exp.Select
+    aggregates: Tuple[ApproxAggregate, ...]
+
+    def render(self, sample_table: str) -> str:
+        """SQL sobre la tabla de muestra, con columnas auxiliares para los márgenes de error"""
+        tree = self.tree.copy()
+        tree.find(exp.Table).set("this", exp.to_identifier(sample_table))
+
+        projections = tree.expressions
+        helpers: List[exp.Expression] = []
+        for agg in self.aggregates:
+            arg = _unalias(projections[agg.position]).this
+            if agg.kind == "sum":
+                value = exp.cast(arg.copy(), "DOUBLE")
+                helpers.append(exp.alias_(exp.Sum(this=exp.Mul(this=value, expression=value.copy())), f"__sq{agg.position}"))
+            elif agg.kind == "avg":
+                helpers.append(exp.alias_(exp.StddevSamp(this=arg.copy()), f"__sd{agg.position}"))
+                helpers.append(exp.alias_(exp.Count(this=arg.copy()), f"__ct{agg.position}"))
+        tree.set("expressions", [*projections, *helpers])
+        return tree.sql(dialect="duckdb")
+
+
+def plan_approximate(sql: str) -> Optional[ApproxPlan]:
+    """
+    Plan de estimación o None si la query no es elegible.
+    Elegibles: SELECT sobre una sola tabla, sin joins, subqueries, HAVING ni ventanas,
+    cuyas columnas sean agrupaciones o COUNT/SUM/AVG (sin DISTINCT) de nivel superior.
+    """
+    try:
+        tree = SQLSanitizer.parse(sql)
+    except sqlglot.errors.ParseError:
+        return None
+    if not isinstance(tree, exp.Select) or tree.args.get("joins") or tree.args.get("having"):
+        return None
+    if tree.args.get("distinct") or tree.args.get("with") or tree.args.get("sample"):
+        return None
+    if len(list(tree.find_all(exp.Select))) > 1 or tree.find(exp.Window):
+        return None
+    tables = list(tree.find_all(exp.Table))
+    if len(tables) != 1 or not isinstance(tables[0].this, exp.Identifier) or tables[0].args.get("sample"):
+        return None
+
+    aggregates: List[ApproxAggregate] = []
+    for position, projection in enumerate(tree.expressions):
+        node = _unalias(projection)
+        if isinstance(node, _AGGREGATES):
+            if isinstance(node.this, exp.Distinct):
+                return None
+            aggregates.append(ApproxAggregate(position, type(node).__name__.lower()))
+        elif isinstance(node, exp.Star) or node.find(exp.AggFunc):
+            # Agregados anidados en expresiones (o MIN/MAX, percentiles): no estimables aquí
+            return None
+    if not aggregates:
+        return None
+    return ApproxPlan(tables[0].name, tree, tuple(aggregates))
+
+
+def estimate(
+    sample: pa.Table,
+    plan: ApproxPlan,
+    population_rows: int,
+    sample_rows: int,
+) -> Tuple[pa.Table, pa.Table, float]:
+    """
+    Escala los agregados de la muestra a la población (factor N/n) y calcula márgenes
+    de error al 95% asumiendo muestreo uniforme de filas (Bernoulli).
+    `sample_rows` es el tamaño de la muestra completa, antes de aplicar el WHERE.
+    Retorna (columnas originales estimadas, márgenes por columna agregada, fracción muestreada).
+    """
+    n = sample_rows
+    visible = sample.select(list(range(len(plan.tree.expressions))))
+    scale = population_rows / n
+    # Corrección por población finita
+    fpc = math.sqrt(max(0.0, 1.0 - n / population_rows))
+
+    columns = list(visible.columns)
+    margins = {}
+    for agg in plan.aggregates:
+        name = visible.column_names[agg.position]
+        values = visible.column(agg.position).to_pylist()
+        if agg.kind == "count":
+            estimates = [round(c * scale) if c is not None else None for c in values]
+            errors = [_proportion_margin(c, n, population_rows) * fpc if c is not None else None for c in values]
+            columns[agg.position] = pa.array(estimates, type=pa.int64())
+        elif agg.kind == "sum":
+            squares = sample.column(f"__sq{agg.position}").to_pylist()
+            estimates = [float(s) * scale if s is not None else None for s in values]
+            errors = [_total_margin(s, q, n, population_rows) * fpc if s is not None else None for s, q in zip(values, squares)]
+            columns[agg.position] = pa.array(estimates, type=pa.float64())
+        else:
+            deviations = sample.column(f"__sd{agg.position}").to_pylist()
+            counts = sample.column(f"__ct{agg.position}").to_pylist()
+            errors = [
+                Z_95 * sd / math.sqrt(ct) * fpc if sd is not None and ct and ct > 1 else None
+                for sd, ct in zip(deviations, counts)
+            ]
+        margins[name] = pa.array(errors, type=pa.float64())
+    return pa.table(columns, names=visible.column_names), pa.table(margins), min(1.0, n / population_rows)
+
+
+def _unalias(node: exp.Expression) -> exp.Expression:
+    return node.this if isinstance(node, exp.Alias) else node
+
+
+def _proportion_margin(count: int, n: int, population: int) -> float:
+    p = count / n
+    return Z_95 * population * math.sqrt(p * (1 - p) / n)
+
+
+def _total_margin(total: float, squares: Optional[float], n: int, population: int) -> float:
+    """Margen del total estimado: varianza de y_i = x_i·[fila en el grupo] sobre las n filas"""
+    if squares is None or n < 2:
+        return 0.0
+    variance = max(0.0, (squares - float(total) ** 2 / n) / (n - 1))
+    return Z_95 * population * math.sqrt(variance / n)
@@ -0,0 +1,57 @@
+# infrastructure/persistence/buffer_filesystem.py
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+import pyarrow as pa
+from fsspec.spec import AbstractFileSystem
+
+
+class BufferFileSystem(AbstractFileSystem):
+    """
+    Sistema de archivos fsspec sobre buffers en memoria, registrable en DuckDB.
+    Permite leer un upload con los mismos lectores nativos que `load_file`
+    (read_csv_auto, read_json_auto): misma inferencia de tipos que desde disco,
+    sin archivos temporales y sin copiar los bytes (se leen vía pa.BufferReader).
+    """
+    protocol = "upload"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._buffers: Dict[str, memoryview] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def mounted(self, buffer: memoryview, ext: str) -> Iterator[str]:
+        """Expone `buffer` como `upload://<id><ext>` mientras dura el bloque"""
+        name = f"{uuid.uuid4().hex}{ext}"
+        with self._lock:
+            self._buffers[name] = buffer
+        try:
+            yield f"{self.protocol}://{name}"
+        finally:
+            with self._lock:
+                self._buffers.pop(name, None)
+
+    def info(self, path: str, **kwargs: Any) -> Dict[str, Any]:
+        name = self._strip_protocol(path)
+        with self._lock:
+            buffer = self._buffers.get(name)
+        if buffer is None:
+            raise FileNotFoundError(path)
+        return {"name": name, "size": buffer.nbytes, "type": "file"}
+
+    def ls(self, path: str, detail: bool = True, **kwargs: Any):
+        info = self.info(path)
+        return [info] if detail else [info["name"]]
+
+    def _open(self, path: str, mode: str = "rb", **kwargs: Any):
+        if mode != "rb":
+            raise PermissionError(f"{self.protocol}:// es de solo lectura")
+        name = self._strip_protocol(path)
+        with self._lock:
+            buffer = self._buffers.get(name)
+        if buffer is None:
+            raise FileNotFoundError(path)
+        return pa.BufferReader(pa.py_buffer(buffer))
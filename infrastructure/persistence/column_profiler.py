@@ -0,0 +1,123 @@
+# infrastructure/persistence/column_profiler.py
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+
+from domain.entities.dataset import ColumnProfile
+
+# Hasta este tamaño se perfila la tabla completa; por encima se usa muestreo por bloques
+PROFILE_FULL_SCAN_ROWS = 1_000_000
+# Presupuesto de tiempo por intento (segundos)
+PROFILE_TIME_BUDGET_S = 2.0
+TOP_K = 5
+
+_TOP_K_TYPES = ("VARCHAR", "BOOLEAN", "ENUM")
+_NESTED_MARKERS = ("STRUCT", "MAP", "LIST", "UNION", "[]")
+
+
+class ColumnProfiler:
+    """
+    Perfilador de columnas en un único escaneo de DuckDB.
+    Calcula nulos, min/max, distintos aproximados (HyperLogLog) y top-k por columna
+    con agregados aproximados en una sola query. Tablas grandes se muestrean para
+    respetar el presupuesto de tiempo, que además se impone con `interrupt()`.
+    """
+
+    def __init__(
+        self,
+        full_scan_rows: int = PROFILE_FULL_SCAN_ROWS,
+        time_budget_s: float = PROFILE_TIME_BUDGET_S,
+        top_k: int = TOP_K,
+    ):
+        self.full_scan_rows = full_scan_rows
+        self.time_budget_s = time_budget_s
+        self.top_k = top_k
+
+    def profile(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        table_name: str,
+        columns: Dict[str, str],
+        row_count: int,
+    ) -> Tuple[Dict[str, ColumnProfile], bool]:
+        """Retorna (perfiles por columna, si se calcularon sobre una muestra)"""
+        if not columns or row_count == 0:
+            return {}, False
+
+        # 1. Fracción inicial: escaneo completo o muestra de ~full_scan_rows filas
+        fraction = min(1.0, self.full_scan_rows / row_count)
+        # 2. Si el intento excede el presupuesto, se reintenta con una muestra 10x menor
+        for _ in range(2):
+            result = self._run(conn, table_name, columns, fraction)
+            if result is not None:
+                return self._parse(result, columns, fraction), fraction < 1.0
+            fraction /= 10
+        print(f"⚠️ Perfilado de {table_name} excedió el presupuesto de tiempo. Se omite.")
+        return {}, True
+
+    def _run(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        table_name: str,
+        columns: Dict[str, str],
+        fraction: float,
+    ) -> Optional[tuple]:
+        sql = self._build_query(table_name, columns, fraction)
+        cursor = conn.cursor()
+        timer = threading.Timer(self.time_budget_s, cursor.interrupt)
+        timer.start()
+        try:
+            return cursor.execute(sql).fetchone()
+        except duckdb.InterruptException:
+            return None
+        finally:
+            timer.cancel()
+            cursor.close()
+
+    def _build_query(self, table_name: str, columns: Dict[str, str], fraction: float) -> str:
+        parts: List[str] = []
+        for col, dtype in columns.items():
+            ident = '"' + col.replace('"', '""') + '"'
+            parts.append(f"COUNT(*) - COUNT({ident})")
+            if _is_nested(dtype):
+                parts.extend(["NULL", "NULL", "NULL", "NULL"])
+                continue
+            parts.append(f"approx_count_distinct({ident})")
+            parts.append(f"MIN({ident})::VARCHAR")
+            parts.append(f"MAX({ident})::VARCHAR")
+            if dtype.upper().startswith(_TOP_K_TYPES):
+                parts.append(f"approx_top_k({ident}, {self.top_k})")
+            else:
+                parts.append("NULL")
+
+        sample = ""
+        if fraction < 1.0:
+            sample = f" USING SAMPLE {fraction * 100:.4f}% (system)"
+        return f"SELECT COUNT(*), {', '.join(parts)} FROM {table_name}{sample}"
+
+    @staticmethod
+    def _parse(row: tuple, columns: Dict[str, str], fraction: float) -> Dict[str, ColumnProfile]:
+        profiles: Dict[str, ColumnProfile] = {}
+        # Factor de extrapolación de conteos cuando se perfiló una muestra
+        scanned = row[0] or 0
+        scale = 1.0 / fraction if fraction < 1.0 and scanned else 1.0
+        for i, col in enumerate(columns):
+            nulls, distinct, min_v, max_v, top = row[1 + i * 5: 6 + i * 5]
+            distinct = int(distinct or 0)
+            if scale > 1.0 and distinct >= 0.9 * scanned:
+                # Columna casi única dentro de la muestra: se extrapola al total
+                distinct = int(distinct * scale)
+            profiles[col] = ColumnProfile(
+                null_count=int(round((nulls or 0) * scale)),
+                approx_distinct=distinct,
+                min_value=min_v,
+                max_value=max_v,
+                top_values=[str(v) for v in (top or []) if v is not None],
+            )
+        return profiles
+
+
+def _is_nested(dtype: str) -> bool:
+    upper = dtype.upper()
+    return any(marker in upper for marker in _NESTED_MARKERS)
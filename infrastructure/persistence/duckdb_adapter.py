@@ -1,54 +1,703 @@
 # infrastructure/persistence/duckdb_adapter.py
+import asyncio
+import dataclasses
+import json
 import duckdb
+import openpyxl
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import os
-from typing import List, Dict, Any
+import re
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import sqlglot
+from sqlglot import exp
+from typing import List, Dict, Any, BinaryIO, Callable, Iterable, Iterator, Optional, Sequence, Tuple, TypeVar, Union
 from domain.ports.data_port import DataProviderPort
 from domain.entities.dataset import DatasetSchema
+from domain.value_objects.query_result import QueryResult
 from domain.value_objects.sql_query import SQLQuery
+from infrastructure.persistence.approximate import estimate, plan_approximate
+from infrastructure.persistence.buffer_filesystem import BufferFileSystem
+from infrastructure.persistence.column_profiler import ColumnProfiler
+from infrastructure.persistence.ingestion_cache import IngestionCache, schema_from_dict, schema_to_dict
+from infrastructure.persistence.query_cache import QueryResultCache
+from infrastructure.persistence.rollup_manager import Rollup, RollupManager, RollupSpec, source_table
+from infrastructure.security.sql_sanitizer import SQLSanitizer
+
+# Formatos soportados por load_file
+EXCEL_FORMATS = {'.xlsx', '.xls'}
+ARROW_FORMATS = {'.arrow', '.feather', '.ipc'}
+JSONL_FORMATS = {'.jsonl', '.ndjson'}
+SUPPORTED_FORMATS = {'.csv', '.parquet'} | EXCEL_FORMATS | ARROW_FORMATS | JSONL_FORMATS
+# Parquet y Arrow ya son columnares: recargarlos es tan barato como leer la caché
+CACHEABLE_FORMATS = {'.csv'} | EXCEL_FORMATS | JSONL_FORMATS
+
+# Límites de resultado por query (configurables por despliegue)
+MAX_RESULT_ROWS = int(os.getenv("DUCKDB_MAX_RESULT_ROWS", "100000"))
+MAX_RESULT_BYTES = int(os.getenv("DUCKDB_MAX_RESULT_MB", "64")) * 1024 * 1024
+RESULT_BATCH_ROWS = 16_384
+# Hilos del executor de DuckDB (queries/ingestas concurrentes)
+DB_WORKERS = int(os.getenv("DUCKDB_WORKERS", "4"))
+# Tiempo máximo por query en segundos (0 = sin límite)
+QUERY_TIMEOUT_S = float(os.getenv("DUCKDB_QUERY_TIMEOUT_S", "30"))
+# Topes de recursos de la instancia (p. ej. "4GB" y 2). Vacío = valores por defecto de DuckDB
+MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT") or None
+THREADS = int(os.getenv("DUCKDB_THREADS", "0")) or None
+# Directorio de spill a disco de DuckDB (operadores que exceden memory_limit)
+TEMP_DIRECTORY = os.getenv("DUCKDB_TEMP_DIR") or None
+# Tabla de metadatos del catálogo persistente (en un schema fuera del alcance de las sesiones)
+CATALOG_TABLE = "_meta.dataset_catalog"
+# Vistas de sistema sin calificar (listan schemas y tablas de todas las sesiones)
+SYSTEM_TABLE_PREFIXES = ("duckdb_", "pg_", "sqlite_", "pragma_", "information_schema")
+# Modo aproximado: las tablas desde este tamaño admiten consultas sobre una muestra
+APPROX_MIN_ROWS = int(os.getenv("DUCKDB_APPROX_MIN_ROWS", "5000000"))
+# Filas objetivo de la muestra uniforme que se construye por tabla grande
+APPROX_SAMPLE_ROWS = int(os.getenv("DUCKDB_APPROX_SAMPLE_ROWS", "500000"))
+# Tiempo máximo del cálculo exacto que refina un resultado aproximado (0 = sin límite)
+APPROX_REFINE_TIMEOUT_S = float(os.getenv("DUCKDB_APPROX_REFINE_TIMEOUT_S", "300"))
+
+T = TypeVar("T")
+
+# Filas por lote al ingerir Excel en streaming (acota la memoria pico)
+EXCEL_BATCH_ROWS = 10_000
+
+# Tipos DuckDB equivalentes para ensanchar columnas durante la ingesta por lotes
+_ARROW_TO_DUCKDB = {
+    pa.int64(): "BIGINT",
+    pa.float64(): "DOUBLE",
+    pa.bool_(): "BOOLEAN",
+    pa.string(): "VARCHAR",
+    pa.timestamp("us"): "TIMESTAMP",
+    pa.time64("us"): "TIME",
+}
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class StoredDataset:
+    """Dataset cargado y catalogado; en modo persistente sobrevive a los reinicios"""
+    key: str  # `namespace.tabla` (o solo la tabla)
+    namespace: Optional[str]
+    table_name: str
+    source: str  # Archivo de origen
+    loaded_at: datetime
+    schema: DatasetSchema
+
+    def label(self) -> str:
+        return f"{self.source} · {self.schema.row_count:,} filas · {self.loaded_at:%Y-%m-%d %H:%M}"
 
 class DuckDBAdapter(DataProviderPort):
-    def __init__(self, db_path: str = ":memory:"):
+    def __init__(
+        self,
+        db_path: str = ":memory:",
+        excel_batch_rows: int = EXCEL_BATCH_ROWS,
+        ingestion_cache: Optional[IngestionCache] = None,
+        profiler: Optional[ColumnProfiler] = None,
+        max_result_rows: int = MAX_RESULT_ROWS,
+        max_result_bytes: int = MAX_RESULT_BYTES,
+        result_cache: Optional[QueryResultCache] = None,
+        max_workers: int = DB_WORKERS,
+        query_timeout_s: float = QUERY_TIMEOUT_S,
+        memory_limit: Optional[str] = MEMORY_LIMIT,
+        threads: Optional[int] = THREADS,
+        temp_directory: Optional[str] = TEMP_DIRECTORY,
+        approx_min_rows: int = APPROX_MIN_ROWS,
+        approx_sample_rows: int = APPROX_SAMPLE_ROWS,
+        rollups: Optional[RollupManager] = None,
+    ):
+        # Con una ruta de archivo, datos y catálogo sobreviven a los reinicios
+        self.persistent = db_path != ":memory:"
+        if self.persistent:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
         self.conn = duckdb.connect(db_path)
+        # La barra de progreso de DuckDB ensucia stdout en consultas largas (los cursores la heredan)
+        self.conn.execute("SET enable_progress_bar = false")
+        # Uploads en memoria legibles por los lectores nativos (upload://...), igual que un archivo
+        self.uploads = BufferFileSystem(skip_instance_cache=True)
+        self.conn.register_filesystem(self.uploads)
+        # memory_limit y threads son globales en DuckDB: acotan toda la instancia, no una query
+        if memory_limit:
+            self.conn.execute("SET memory_limit = ?", [memory_limit])
+        if threads:
+            self.conn.execute(f"SET threads = {int(threads)}")
+        if temp_directory:
+            self.conn.execute("SET temp_directory = ?", [temp_directory])
+        self.query_timeout_s = query_timeout_s
+        self.excel_batch_rows = excel_batch_rows
+        self.ingestion_cache = ingestion_cache
+        self.profiler = profiler or ColumnProfiler()
+        self.max_result_rows = max_result_rows
+        self.max_result_bytes = max_result_bytes
+        self.result_cache = result_cache
+        self.approx_min_rows = approx_min_rows
+        self.approx_sample_rows = approx_sample_rows
+        self.rollups = rollups
+        self._rollup_ids = itertools.count(1)
+        # Versión por tabla: se incrementa en cada carga y forma parte de la clave de caché
+        self._table_versions: Dict[str, int] = {}
+        # Catálogo de esquemas: se llena al cargar y se invalida al reemplazar/modificar la tabla
+        self._catalog: Dict[str, DatasetSchema] = {}
+        # Datasets con archivo de origen (los que se pueden volver a abrir desde la UI)
+        self._datasets: Dict[str, StoredDataset] = {}
+        # Vistas creadas con attach_dataset, por tabla de origen (heredan sus versiones)
+        self._dependent_views: Dict[str, List[str]] = {}
+        # Muestras uniformes de las tablas grandes: tabla -> (filas de la muestra, filas de la tabla)
+        self._samples: Dict[str, Tuple[int, int]] = {}
+        self._sampling: set = set()  # Tablas con la muestra en construcción
+        # DuckDB rechaza DDL concurrente sobre la misma tabla: construir y borrar muestras se serializa
+        self._sample_lock = threading.Lock()
+        if self.persistent:
+            self._load_persisted_catalog()
+        # Executor dedicado: el trabajo de DuckDB nunca corre en el event loop
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="duckdb")
+
+    async def _run_db(self, fn: Callable[..., T], *args: Any, namespace: Optional[str] = None) -> T:
+        """
+        Ejecuta `fn(cursor, *args)` en el executor de DuckDB.
+        Cada tarea usa su propio cursor (conexión derivada de la compartida), así varias
+        queries e ingestas avanzan en paralelo sin bloquear el event loop.
+        Con `namespace`, el cursor resuelve y crea las tablas en ese schema.
+        """
+        return await asyncio.wrap_future(self._submit_db(fn, *args, namespace=namespace))
+
+    def _submit_db(self, fn: Callable[..., T], *args: Any, namespace: Optional[str] = None) -> 'Future[T]':
+        """Como `_run_db` pero sin esperar: para trabajo en segundo plano"""
+        def task() -> T:
+            cursor = self.conn.cursor()
+            try:
+                if namespace:
+                    cursor.execute(f"SET search_path = '{_validate_namespace(namespace)}'")
+                return fn(cursor, *args)
+            finally:
+                cursor.close()
+
+        return self._executor.submit(task)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+    async def create_namespace(self, namespace: str) -> None:
+        """Schema aislado (p. ej. por sesión) donde `namespace=` crea y resuelve tablas"""
+        await self._run_db(lambda cur: cur.execute(f"CREATE SCHEMA IF NOT EXISTS {_validate_namespace(namespace)}"))
+
+    async def drop_namespace(self, namespace: str) -> None:
+        """Elimina el schema con sus tablas y purga su catálogo"""
+        await self._run_db(lambda cur: cur.execute(f"DROP SCHEMA IF EXISTS {_validate_namespace(namespace)} CASCADE"))
+        prefix = f"{namespace.lower()}."
+        for key in [k for k in self._catalog if k.startswith(prefix)]:
+            self._catalog_discard(key)
+            self._samples.pop(key, None)
+            if self.rollups is not None:
+                self.rollups.invalidate(key)
+            self._table_versions[key] = self._table_versions.get(key, 0) + 1
+
+    async def drop_table(self, table_name: str, namespace: Optional[str] = None) -> None:
+        def drop(cur: duckdb.DuckDBPyConnection) -> None:
+            row = cur.execute(
+                "SELECT table_type FROM information_schema.tables WHERE table_name = ? AND table_schema = current_schema()",
+                [table_name],
+            ).fetchone()
+            if row is not None:
+                cur.execute(f"DROP {'VIEW' if row[0] == 'VIEW' else 'TABLE'} {table_name}")
+            with self._sample_lock:
+                cur.execute(f"DROP TABLE IF EXISTS {_sample_table(table_name)}")
+
+        await self._run_db(drop, namespace=namespace)
+        self.invalidate_schema(table_name, namespace)
+
+    async def export_table(self, table_name: str, path: str, namespace: Optional[str] = None) -> None:
+        """Vuelca la tabla a Parquet (para liberar memoria y restaurarla luego)"""
+        await self._run_db(
+            lambda cur: cur.execute(f"COPY {table_name} TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)"),
+            namespace=namespace,
+        )
+
+    async def attach_dataset(self, key: str, table_name: str, namespace: Optional[str] = None) -> DatasetSchema:
+        """
+        Expone un dataset catalogado como la vista `table_name` (sin copiar datos).
+        Su esquema y perfil se reutilizan tal cual: abrir un dataset no escanea la tabla.
+        """
+        stored = self._datasets.get(key)
+        if stored is None:
+            raise ValueError(f"Dataset no encontrado en el catálogo: {key}")
+        target = _table_key(table_name, namespace)
+        if target == key:
+            return stored.schema
+        source = stored.table_name
+        if stored.namespace:
+            source = f"{_quote_identifier(stored.namespace)}.{source}"
+
+        def attach(cur: duckdb.DuckDBPyConnection) -> None:
+            self._drop_if_kind_changes(cur, table_name, as_view=True)
+            cur.execute(f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM {source}")
+
+        try:
+            await self._run_db(attach, namespace=namespace)
+        finally:
+            self._bump_version(table_name, namespace)
+        for views in self._dependent_views.values():
+            if target in views:
+                views.remove(target)
+        self._dependent_views.setdefault(key, []).append(target)
+        schema = dataclasses.replace(stored.schema, id=table_name, table_name=table_name)
+        return self._catalog_put(schema, namespace)
+
+    def list_datasets(self) -> List[StoredDataset]:
+        """Datasets cargados, del más reciente al más antiguo"""
+        return sorted(self._datasets.values(), key=lambda d: d.loaded_at, reverse=True)
+
+    async def restore_table(self, path: str, schema: DatasetSchema, namespace: Optional[str] = None) -> DatasetSchema:
+        """Recrea una tabla exportada con `export_table` y recupera su esquema sin re-perfilar"""
+        await self._run_db(
+            lambda cur: cur.execute(
+                f"CREATE OR REPLACE TABLE {schema.table_name} AS SELECT * FROM read_parquet('{path}')"
+            ),
+            namespace=namespace,
+        )
+        self._bump_version(schema.table_name, namespace)
+        return self._catalog_put(schema, namespace)
+
+    def namespace_schemas(self, namespace: Optional[str] = None) -> Dict[str, DatasetSchema]:
+        """Esquemas catalogados de un namespace, por nombre de tabla"""
+        prefix = f"{namespace.lower()}." if namespace else ""
+        return {
+            key[len(prefix):]: schema
+            for key, schema in list(self._catalog.items())
+            if key.startswith(prefix) and (namespace or "." not in key)
+        }
     
-    async def load_file(self, file_path: str, table_name: str) -> DatasetSchema:
+    async def load_file(
+        self,
+        file_path: str,
+        table_name: str,
+        columns: Optional[List[str]] = None,
+        where: Optional[str] = None,
+        as_view: bool = False,
+        namespace: Optional[str] = None,
+    ) -> DatasetSchema:
         """
-        Carga agnóstica de archivos (CSV o Excel).
-        Usa Pandas como intermediario para máxima compatibilidad.
+        Carga agnóstica de archivos (CSV, Excel, Parquet, Arrow IPC/Feather o JSONL).
+        Los formatos con lector nativo de DuckDB admiten proyección (`columns`) y filtro
+        (`where`) empujados al lector; Parquet puede adjuntarse como vista (`as_view`)
+        sin copiarse a memoria. .xlsx se ingiere en streaming por lotes.
+        Si hay caché de ingesta, un archivo idéntico se restaura desde Parquet sin re-parsear.
         """
+        schema = await self._run_db(
+            self._load_file_sync, file_path, table_name, columns, where, as_view, namespace, namespace=namespace
+        )
+        return schema
+
+    def _load_file_sync(
+        self,
+        cur: duckdb.DuckDBPyConnection,
+        file_path: str,
+        table_name: str,
+        columns: Optional[List[str]],
+        where: Optional[str],
+        as_view: bool,
+        namespace: Optional[str],
+    ) -> DatasetSchema:
         _, ext = os.path.splitext(file_path)
         ext = ext.lower()
         
         try:
-            if ext == '.csv':
-                # DuckDB nativo es más rápido para CSV
-                self.conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_csv_auto('{file_path}')")
+            if ext not in SUPPORTED_FORMATS:
+                raise ValueError(f"Formato no soportado: {ext}")
+            if as_view and ext != '.parquet':
+                raise ValueError("Solo los archivos Parquet pueden adjuntarse como vista")
+            if (columns or where) and ext in EXCEL_FORMATS:
+                raise ValueError("Proyección/filtro no disponibles para Excel")
+
+            self._drop_if_kind_changes(cur, table_name, as_view)
+
+            source_name = os.path.basename(file_path)
+            cache_key, cached = self._restore_from_cache(cur, file_path, ext, table_name, columns, where)
+            if cached is not None:
+                return self._catalog_put(cached, namespace, source_name)
+
+            # Filas insertadas según el propio CREATE (None para vistas: se cuentan una vez)
+            row_count: Optional[int] = None
+            if ext == '.csv' or ext in JSONL_FORMATS:
+                # DuckDB nativo es más rápido para CSV/JSONL
+                source = _native_source(file_path, ext)
+                row_count = _created_rows(cur.execute(
+                    f"CREATE OR REPLACE TABLE {table_name} AS {_select_from(source, columns, where)}"
+                ))
             
-            elif ext in ['.xlsx', '.xls']:
-                # Pandas para Excel -> DuckDB
+            elif ext == '.parquet':
+                # Lector nativo: proyección y filtros se resuelven con metadata de row groups
+                source = f"read_parquet('{file_path}')"
+                kind = "VIEW" if as_view else "TABLE"
+                row_count = _created_rows(cur.execute(
+                    f"CREATE OR REPLACE {kind} {table_name} AS {_select_from(source, columns, where)}"
+                ))
+            
+            elif ext in ARROW_FORMATS:
+                # Dataset Arrow memory-mapped: DuckDB empuja proyección y filtros al escaneo
+                dataset = ds.dataset(file_path, format="ipc")
+                cur.register("temp_arrow_dataset", dataset)
+                try:
+                    row_count = _created_rows(cur.execute(
+                        f"CREATE OR REPLACE TABLE {table_name} AS {_select_from('temp_arrow_dataset', columns, where)}"
+                    ))
+                finally:
+                    cur.unregister("temp_arrow_dataset")
+            
+            elif ext == '.xlsx':
+                # openpyxl read-only -> lotes Arrow -> DuckDB (sin DataFrame completo en memoria)
+                row_count = self._load_excel_streaming(cur, file_path, table_name)
+            
+            elif ext == '.xls':
+                # openpyxl no lee el formato binario antiguo: Pandas como intermediario
                 df = pd.read_excel(file_path)
-                # Normalizar nombres de columnas (quitar espacios y caracteres raros)
-                df.columns = [c.strip().replace(" ", "_").replace("-", "_").lower() for c in df.columns]
+                df.columns = [_normalize_column_name(c) for c in df.columns]
                 # Registrar el DataFrame como tabla en DuckDB
-                self.conn.register("temp_df_view", df)
-                self.conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM temp_df_view")
-                self.conn.unregister("temp_df_view")
-            
-            else:
-                raise ValueError(f"Formato no soportado: {ext}")
+                cur.register("temp_df_view", df)
+                row_count = _created_rows(cur.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM temp_df_view"))
+                cur.unregister("temp_df_view")
                 
-            return await self.get_schema(table_name)
+            schema = self._profiled_schema(cur, table_name, row_count)
+            if cache_key is not None:
+                self.ingestion_cache.store(cache_key, cur, table_name, schema)
+            return self._catalog_put(schema, namespace, source_name)
             
         except Exception as e:
+            self._catalog_discard(_table_key(table_name, namespace))
             raise RuntimeError(f"Error cargando archivo {file_path}: {str(e)}")
+        finally:
+            # Cualquier intento de carga invalida los resultados cacheados de la tabla
+            self._bump_version(table_name, namespace)
+
+    async def load_buffer(
+        self,
+        data: Union[bytes, bytearray, memoryview, BinaryIO],
+        file_name: str,
+        table_name: str,
+        columns: Optional[List[str]] = None,
+        where: Optional[str] = None,
+        namespace: Optional[str] = None,
+    ) -> DatasetSchema:
+        """
+        Carga desde memoria (bytes o file-like, p. ej. el UploadedFile de Streamlit)
+        sin escribir archivos temporales. CSV y JSONL pasan por los mismos lectores de
+        DuckDB que `load_file` (vía upload://, sin copia): los tipos inferidos coinciden.
+        Parquet y Arrow (ya tipados) se leen con buffers Arrow sin copia. `file_name`
+        solo determina el formato.
+        """
+        schema = await self._run_db(
+            self._load_buffer_sync, data, file_name, table_name, columns, where, namespace, namespace=namespace
+        )
+        return schema
+
+    def _load_buffer_sync(
+        self,
+        cur: duckdb.DuckDBPyConnection,
+        data: Union[bytes, bytearray, memoryview, BinaryIO],
+        file_name: str,
+        table_name: str,
+        columns: Optional[List[str]],
+        where: Optional[str],
+        namespace: Optional[str],
+    ) -> DatasetSchema:
+        _, ext = os.path.splitext(file_name)
+        ext = ext.lower()
+
+        try:
+            if ext not in SUPPORTED_FORMATS:
+                raise ValueError(f"Formato no soportado: {ext}")
+            if (columns or where) and ext in EXCEL_FORMATS:
+                raise ValueError("Proyección/filtro no disponibles para Excel")
+
+            buffer = _as_buffer(data)
+            self._drop_if_kind_changes(cur, table_name, as_view=False)
+
+            cache_key, cached = self._restore_from_cache(cur, buffer, ext, table_name, columns, where)
+            if cached is not None:
+                return self._catalog_put(cached, namespace, file_name)
+
+            reader = pa.BufferReader(pa.py_buffer(buffer))
+            if ext == '.xlsx':
+                row_count = self._load_excel_streaming(cur, reader, table_name)
+            elif ext == '.xls':
+                df = pd.read_excel(reader)
+                df.columns = [_normalize_column_name(c) for c in df.columns]
+                cur.register("temp_df_view", df)
+                row_count = _created_rows(cur.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM temp_df_view"))
+                cur.unregister("temp_df_view")
+            elif ext == '.csv' or ext in JSONL_FORMATS:
+                with self.uploads.mounted(buffer, ext) as path:
+                    row_count = _created_rows(cur.execute(
+                        f"CREATE OR REPLACE TABLE {table_name} AS {_select_from(_native_source(path, ext), columns, where)}"
+                    ))
+            else:
+                source = _arrow_source_from_buffer(reader, ext, columns)
+                cur.register("temp_buffer_source", source)
+                try:
+                    row_count = _created_rows(cur.execute(
+                        f"CREATE OR REPLACE TABLE {table_name} AS {_select_from('temp_buffer_source', columns, where)}"
+                    ))
+                finally:
+                    cur.unregister("temp_buffer_source")
+
+            schema = self._profiled_schema(cur, table_name, row_count)
+            if cache_key is not None:
+                self.ingestion_cache.store(cache_key, cur, table_name, schema)
+            return self._catalog_put(schema, namespace, file_name)
+
+        except Exception as e:
+            self._catalog_discard(_table_key(table_name, namespace))
+            raise RuntimeError(f"Error cargando archivo {file_name}: {str(e)}")
+        finally:
+            self._bump_version(table_name, namespace)
+
+    def _profiled_schema(
+        self, cur: duckdb.DuckDBPyConnection, table_name: str, row_count: Optional[int] = None
+    ) -> DatasetSchema:
+        """Esquema + perfil de columnas calculado en un único escaneo"""
+        schema = self._describe(cur, table_name, row_count)
+        # El perfilador abre su propio cursor, que no hereda el search_path: nombre calificado
+        current = cur.execute("SELECT current_schema()").fetchone()[0]
+        schema.profile, schema.profile_sampled = self.profiler.profile(
+            cur, f"{_quote_identifier(current)}.{table_name}", schema.columns, schema.row_count
+        )
+        return schema
+
+    def _bump_version(self, table_name: str, namespace: Optional[str] = None) -> None:
+        key = _table_key(table_name, namespace)
+        self._table_versions[key] = self._table_versions.get(key, 0) + 1
+        self._samples.pop(key, None)
+        self._drop_rollup(key)
+        # Las vistas sobre la tabla cambian con ella: caducan su esquema y sus resultados cacheados
+        for view in self._dependent_views.get(key, []):
+            self._catalog.pop(view, None)
+            self._samples.pop(view, None)
+            self._drop_rollup(view)
+            self._table_versions[view] = self._table_versions.get(view, 0) + 1
+
+    def _drop_rollup(self, key: str) -> None:
+        rollup = self.rollups.invalidate(key) if self.rollups is not None else None
+        if rollup is not None:
+            self._submit_db(lambda cur: cur.execute(f"DROP TABLE IF EXISTS {rollup.table_name}"))
+
+    def _catalog_put(
+        self, schema: DatasetSchema, namespace: Optional[str] = None, source: Optional[str] = None
+    ) -> DatasetSchema:
+        """Cataloga el esquema; con `source` queda además como dataset (persistido si aplica)"""
+        key = _table_key(schema.table_name, namespace)
+        self._catalog[key] = schema
+        if source is not None:
+            stored = StoredDataset(key, namespace, schema.table_name, source, datetime.utcnow(), schema)
+            self._datasets[key] = stored
+            if self.persistent:
+                self._meta_execute(
+                    f"INSERT OR REPLACE INTO {CATALOG_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+                    [key, namespace, schema.table_name, source, stored.loaded_at, json.dumps(schema_to_dict(schema))],
+                )
+        return schema
+
+    def _catalog_discard(self, key: str) -> None:
+        self._catalog.pop(key, None)
+        if self._datasets.pop(key, None) is not None and self.persistent:
+            self._meta_execute(f"DELETE FROM {CATALOG_TABLE} WHERE key = ?", [key])
+
+    def _meta_execute(self, sql: str, params: List[Any]) -> None:
+        # Cursor propio: se llama tanto desde el event loop como desde los workers
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql, params)
+        finally:
+            cursor.close()
+
+    def _load_persisted_catalog(self) -> None:
+        """Arranque en caliente: el catálogo se lee de la tabla de metadatos, sin DESCRIBE ni perfilado"""
+        self.conn.execute("CREATE SCHEMA IF NOT EXISTS _meta")
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+                key VARCHAR PRIMARY KEY,
+                namespace VARCHAR,
+                table_name VARCHAR,
+                source VARCHAR,
+                loaded_at TIMESTAMP,
+                schema_json VARCHAR
+            )
+        """)
+        existing = {
+            (schema_name, table.lower())
+            for schema_name, table in self.conn.execute(
+                "SELECT table_schema, table_name FROM information_schema.tables"
+            ).fetchall()
+        }
+        # Muestras y rollups son derivados en memoria del proceso anterior: se reconstruyen a demanda
+        for schema_name, table in existing:
+            if table.endswith("__sample") or "__rollup_" in table:
+                self.conn.execute(f"DROP TABLE IF EXISTS {_quote_identifier(schema_name)}.{_quote_identifier(table)}")
+        rows = self.conn.execute(
+            f"SELECT key, namespace, table_name, source, loaded_at, schema_json FROM {CATALOG_TABLE}"
+        ).fetchall()
+        for key, namespace, table_name, source, loaded_at, schema_json in rows:
+            if ((namespace or "main"), table_name.lower()) not in existing:
+                # La tabla ya no existe (borrada por fuera): se limpia el registro
+                self.conn.execute(f"DELETE FROM {CATALOG_TABLE} WHERE key = ?", [key])
+                continue
+            schema = schema_from_dict(json.loads(schema_json), table_name)
+            self._catalog[key] = schema
+            self._datasets[key] = StoredDataset(key, namespace, table_name, source, loaded_at, schema)
+
+    def invalidate_schema(self, table_name: str, namespace: Optional[str] = None) -> None:
+        """
+        Descarta el esquema catalogado y los resultados cacheados de la tabla.
+        Las cargas del adapter lo hacen solas; llamarlo tras modificar la tabla por fuera.
+        """
+        self._catalog_discard(_table_key(table_name, namespace))
+        self._bump_version(table_name, namespace)
+
+    def catalog_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Vista del catálogo para depuración: filas, columnas, versión y fecha de carga"""
+        return {
+            name: {
+                "rows": schema.row_count,
+                "columns": len(schema.columns),
+                "version": self._table_versions.get(name, 0),
+                "profiled": bool(schema.profile),
+                "profile_sampled": schema.profile_sampled,
+                "loaded_at": schema.created_at.isoformat(timespec="seconds"),
+            }
+            for name, schema in list(self._catalog.items())
+        }
+
+    def _restore_from_cache(
+        self,
+        cur: duckdb.DuckDBPyConnection,
+        source: Union[str, memoryview],
+        ext: str,
+        table_name: str,
+        columns: Optional[List[str]],
+        where: Optional[str],
+    ) -> Tuple[Optional[str], Optional[DatasetSchema]]:
+        """Devuelve (clave, esquema restaurado si hubo hit). Sin caché o formato no cacheable: (None, None)"""
+        if self.ingestion_cache is None or ext not in CACHEABLE_FORMATS:
+            return None, None
+        options = {"format": ext, "columns": columns, "where": where}
+        cache_key = self.ingestion_cache.make_key(source, options)
+        entry = self.ingestion_cache.lookup(cache_key)
+        if entry is None:
+            return cache_key, None
+        try:
+            cur.execute(
+                f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_parquet('{entry.data_path}')"
+            )
+        except duckdb.IOException:
+            # Otra sesión la evictó entre el lookup y la lectura: se ingiere de nuevo
+            self.ingestion_cache.record_lost()
+            return cache_key, None
+        return cache_key, schema_from_dict(entry.schema, table_name)
+
+    def _drop_if_kind_changes(self, cur: duckdb.DuckDBPyConnection, table_name: str, as_view: bool) -> None:
+        """CREATE OR REPLACE no puede cambiar una tabla por una vista (ni al revés)"""
+        row = cur.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_name = ? AND table_schema = current_schema()",
+            [table_name],
+        ).fetchone()
+        if row is None:
+            return
+        is_view = row[0] == "VIEW"
+        if is_view and not as_view:
+            cur.execute(f"DROP VIEW {table_name}")
+        elif not is_view and as_view:
+            cur.execute(f"DROP TABLE {table_name}")
+
+    def _load_excel_streaming(
+        self, cur: duckdb.DuckDBPyConnection, source: Union[str, BinaryIO], table_name: str
+    ) -> int:
+        """
+        Lee la hoja activa en modo read-only y la vuelca a DuckDB en lotes Arrow.
+        La memoria pico queda acotada por `excel_batch_rows`, no por el tamaño de la hoja.
+        Retorna el total de filas cargadas.
+        """
+        wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                raise ValueError("La hoja de Excel está vacía")
+            columns = _header_to_columns(header)
+
+            # Tipos Arrow vigentes de la tabla destino (se ensanchan si un lote lo exige)
+            table_types: Dict[str, pa.DataType] = {}
+            loaded = 0
+            for chunk in _chunked(rows, self.excel_batch_rows, width=len(columns)):
+                batch = _rows_to_record_batch(chunk, columns)
+                loaded += batch.num_rows
+                if not table_types:
+                    self._write_excel_batch(cur, table_name, batch, create=True)
+                    table_types = {f.name: f.type for f in batch.schema}
+                    continue
+                self._widen_columns(cur, table_name, table_types, batch)
+                self._write_excel_batch(cur, table_name, batch, create=False)
+
+            if not table_types:
+                # Hoja con cabecera pero sin filas: tabla vacía con columnas texto
+                empty = pa.RecordBatch.from_pylist([], schema=pa.schema([(c, pa.string()) for c in columns]))
+                self._write_excel_batch(cur, table_name, empty, create=True)
+            return loaded
+        finally:
+            wb.close()
+
+    def _write_excel_batch(
+        self, cur: duckdb.DuckDBPyConnection, table_name: str, batch: pa.RecordBatch, create: bool
+    ) -> None:
+        cur.register("temp_excel_batch", batch)
+        try:
+            if create:
+                cur.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM temp_excel_batch")
+            else:
+                cur.execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM temp_excel_batch")
+        finally:
+            cur.unregister("temp_excel_batch")
+
+    def _widen_columns(
+        self,
+        cur: duckdb.DuckDBPyConnection,
+        table_name: str,
+        table_types: Dict[str, pa.DataType],
+        batch: pa.RecordBatch,
+    ) -> None:
+        """Altera el tipo de las columnas cuyo lote entrante no cabe en el tipo actual."""
+        for field_ in batch.schema:
+            current = table_types[field_.name]
+            widened = _widen_arrow_type(current, field_.type)
+            if widened == current:
+                continue
+            duck_type = _ARROW_TO_DUCKDB.get(widened, "VARCHAR")
+            cur.execute(
+                f'ALTER TABLE {table_name} ALTER COLUMN {_quote_identifier(field_.name)} TYPE {duck_type}'
+            )
+            table_types[field_.name] = widened
 
-    async def get_schema(self, table_name: str) -> DatasetSchema:
+    async def get_schema(self, table_name: str, namespace: Optional[str] = None) -> DatasetSchema:
+        """Lookup en el catálogo; solo una tabla no catalogada se describe (y se cataloga)"""
+        cached = self._catalog.get(_table_key(table_name, namespace))
+        if cached is not None:
+            return cached
+        schema = await self._run_db(self._describe, table_name, namespace=namespace)
+        return self._catalog_put(schema, namespace)
+
+    def _describe(
+        self, cur: duckdb.DuckDBPyConnection, table_name: str, row_count: Optional[int] = None
+    ) -> DatasetSchema:
         # Obtener info de columnas
-        query = f"DESCRIBE {table_name}"
-        df = self.conn.execute(query).df()
+        rows = cur.execute(f"DESCRIBE {table_name}").fetchall()
         
-        columns = dict(zip(df['column_name'], df['column_type']))
-        count = self.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        columns = {row[0]: row[1] for row in rows}
+        # COUNT(*) solo si la carga no informó las filas (vistas o tablas externas)
+        count = row_count
+        if count is None:
+            count = cur.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
         
         return DatasetSchema(
             id=table_name,
@@ -58,20 +707,529 @@ class DuckDBAdapter(DataProviderPort):
             summary=f"Dataset {table_name} cargado en DuckDB"
         )
 
-    async def execute_query(self, query: SQLQuery) -> List[Dict[str, Any]]:
+    async def execute_query(
+        self,
+        query: SQLQuery,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout_s: Optional[float] = None,
+        namespace: Optional[str] = None,
+        approximate: bool = False,
+    ) -> QueryResult:
+        """
+        Ejecuta la query y lee el resultado en streaming (record batches de Arrow)
+        hasta los límites de filas/bytes. Si se corta, el resultado queda marcado como
+        truncado con el total real de filas, sin materializar el resto.
+        Con caché de resultados, una query equivalente sobre la misma versión de
+        las tablas se responde sin tocar DuckDB.
+        Si excede `timeout_s` se interrumpe y se lanza QueryTimeoutError.
+        Con `namespace`, la query solo puede leer tablas de ese schema.
+        Con `approximate`, las agregaciones sobre tablas grandes se estiman sobre una
+        muestra (ver `submit_exact` para refinarlas); si la query no es elegible, se
+        ejecuta exacta.
+        """
         if not query.is_safe:
             raise SecurityError(f"Intento de ejecución de query insegura: {query.validation_error}")
+        sql = query.raw_query.strip().rstrip(';')
+        if namespace:
+            _check_namespace(sql, namespace, self.namespace_schemas(namespace))
         
+        max_rows = self.max_result_rows if max_rows is None else max_rows
+        max_bytes = self.max_result_bytes if max_bytes is None else max_bytes
+        timeout_s = self.query_timeout_s if timeout_s is None else timeout_s
+
+        # Una query que un rollup cubre es exacta y barata: no hace falta estimarla
+        rollup = self._rollup_rewrite(sql, namespace)
+        if approximate and rollup is None:
+            result = await self._execute_approximate(sql, max_rows, max_bytes, timeout_s, namespace)
+            if result is not None:
+                return result
+
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.result_cache.make_key(
+                sql, self._table_versions, max_rows, max_bytes, scope=(namespace or "").lower()
+            )
+            cached = self.result_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                return cached
+
         try:
-            # DuckDB retorna pandas df
-            df = self.conn.execute(query.raw_query).df()
-            # Convertir Timestamp a string para evitar errores de JSON serialization luego
-            for col in df.select_dtypes(include=['datetime64[ns]']).columns:
-                df[col] = df[col].astype(str)
-                
-            return df.to_dict(orient='records')
+            if rollup is not None:
+                result = await self._run_db(
+                    self._execute_rollup_sync, rollup, sql, max_rows, max_bytes, timeout_s, namespace=namespace
+                )
+            else:
+                result = await self._run_db(
+                    self._execute_sync, sql, max_rows, max_bytes, timeout_s, namespace=namespace
+                )
+                self._observe_rollup(sql, namespace)
+        except QueryTimeoutError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Database Error: {str(e)}")
+
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result)
+        return result
+
+    def _rollup_rewrite(self, sql: str, namespace: Optional[str]) -> Optional[Tuple[str, Rollup]]:
+        if self.rollups is None:
+            return None
+        table_name = source_table(sql)
+        key = _table_key(table_name, namespace) if table_name else None
+        schema = self._catalog.get(key) if key else None
+        if schema is None:
+            return None
+        return self.rollups.rewrite(key, sql, schema.columns)
+
+    def _execute_rollup_sync(
+        self,
+        cur: duckdb.DuckDBPyConnection,
+        rollup: Tuple[str, Rollup],
+        sql: str,
+        max_rows: int,
+        max_bytes: int,
+        timeout_s: float,
+    ) -> QueryResult:
+        """
+        Ejecuta la query reescrita sobre el rollup con los nombres y tipos de columna
+        de la original (obtenidos sin escanear: DuckDB resuelve LIMIT 0 sin leer datos).
+        Ante cualquier diferencia se ejecuta la original.
+        """
+        rollup_sql, info = rollup
+        try:
+            schema = cur.execute(f"SELECT * FROM ({sql}) AS _q LIMIT 0").fetch_arrow_table().schema
+            result = self._execute_sync(cur, rollup_sql, max_rows, max_bytes, timeout_s)
+            table = result.table.rename_columns(schema.names).cast(schema)
+        except QueryTimeoutError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Rollup descartado para la query, se ejecuta sobre la tabla: {e}")
+            return self._execute_sync(cur, sql, max_rows, max_bytes, timeout_s)
+        self.rollups.record(info)
+        return dataclasses.replace(result, table=table, source_sql=sql)
+
+    def _observe_rollup(self, sql: str, namespace: Optional[str]) -> None:
+        """Registra la query para el gestor de rollups y materializa uno si la forma se repite"""
+        if self.rollups is None:
+            return
+        table_name = source_table(sql)
+        key = _table_key(table_name, namespace) if table_name else None
+        schema = self._catalog.get(key) if key else None
+        if schema is None:
+            return
+        spec = self.rollups.observe(key, sql, schema.columns, schema.row_count)
+        if spec is not None:
+            self._submit_db(
+                self._build_rollup_sync, table_name, key, spec, schema.row_count,
+                self._table_versions.get(key, 0), namespace=namespace,
+            )
+
+    def _build_rollup_sync(
+        self,
+        cur: duckdb.DuckDBPyConnection,
+        table_name: str,
+        key: str,
+        spec: RollupSpec,
+        source_rows: int,
+        version: int,
+    ) -> None:
+        # Nombre único por construcción: el rollup vigente sigue respondiendo mientras tanto
+        current = cur.execute("SELECT current_schema()").fetchone()[0]
+        rollup_table = f"{_quote_identifier(current)}.{_rollup_table(table_name, next(self._rollup_ids))}"
+        try:
+            rows = _created_rows(cur.execute(spec.create_sql(rollup_table, table_name))) or 0
+        except Exception as e:
+            self.rollups.abandon(key)
+            print(f"⚠️ No se pudo construir el rollup de {key}: {e}")
+            return
+        if self._table_versions.get(key, 0) != version:
+            # La tabla se recargó mientras tanto: el rollup ya no la representa
+            self.rollups.abandon(key)
+            cur.execute(f"DROP TABLE IF EXISTS {rollup_table}")
+            return
+        accepted, previous = self.rollups.accept(key, Rollup(rollup_table, spec, rows, source_rows))
+        discarded = previous if accepted else Rollup(rollup_table, spec, rows, source_rows)
+        if discarded is not None:
+            cur.execute(f"DROP TABLE IF EXISTS {discarded.table_name}")
+
+    async def _execute_approximate(
+        self, sql: str, max_rows: int, max_bytes: int, timeout_s: float, namespace: Optional[str]
+    ) -> Optional[QueryResult]:
+        """Estimación sobre la muestra de la tabla; None si hay que ejecutar la query exacta"""
+        plan = plan_approximate(sql)
+        if plan is None:
+            return None
+        key = _table_key(plan.table_name, namespace)
+        schema = self._catalog.get(key)
+        if schema is None or schema.row_count < self.approx_min_rows:
+            return None
+
+        sample = self._samples.get(key)
+        if sample is None:
+            # Sin muestra uniforme todavía (se está construyendo): la respuesta es la exacta
+            self._schedule_sample(plan.table_name, namespace)
+            return None
+        sample_rows, population = sample
+        sample_sql = plan.render(_sample_table(plan.table_name))
+
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.result_cache.make_key(
+                sql, self._table_versions, max_rows, max_bytes, scope=(namespace or "").lower()
+            )
+            cache_key = f"approx|{cache_key}" if cache_key is not None else None
+            cached = self.result_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                return cached
+
+        try:
+            raw = await self._run_db(
+                self._execute_sync, sample_sql, max_rows, max_bytes, timeout_s, namespace=namespace
+            )
+        except QueryTimeoutError:
+            raise
+        except Exception:
+            # La reescritura no debe cambiar el error que ve el usuario: decide la exacta
+            return None
+        table, margins, fraction = estimate(raw.table, plan, population, sample_rows)
+        result = QueryResult(
+            table, truncated=raw.truncated, total_rows=raw.total_rows, source_sql=sql,
+            approximate=True, sample_fraction=fraction, margins=margins,
+        )
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result)
+        return result
+
+    def submit_exact(
+        self,
+        query: SQLQuery,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        namespace: Optional[str] = None,
+    ) -> 'Future[QueryResult]':
+        """
+        Calcula en segundo plano el resultado exacto de una query (refinamiento de un
+        resultado aproximado). El resultado queda en la caché como el de `execute_query`.
+        """
+        if not query.is_safe:
+            raise SecurityError(f"Intento de ejecución de query insegura: {query.validation_error}")
+        sql = query.raw_query.strip().rstrip(';')
+        if namespace:
+            _check_namespace(sql, namespace, self.namespace_schemas(namespace))
+        max_rows = self.max_result_rows if max_rows is None else max_rows
+        max_bytes = self.max_result_bytes if max_bytes is None else max_bytes
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.result_cache.make_key(
+                sql, self._table_versions, max_rows, max_bytes, scope=(namespace or "").lower()
+            )
+
+        future = self._submit_db(
+            self._execute_sync, sql, max_rows, max_bytes, APPROX_REFINE_TIMEOUT_S, namespace=namespace
+        )
+        if cache_key is not None:
+            def store(done: 'Future[QueryResult]') -> None:
+                if not done.cancelled() and done.exception() is None:
+                    self.result_cache.put(cache_key, done.result())
+            future.add_done_callback(store)
+        return future
+
+    def sample_rows(self, table_name: str, namespace: Optional[str] = None) -> int:
+        """Filas de la muestra uniforme de la tabla (0 si no hay): cuentan en el presupuesto de la sesión"""
+        sample = self._samples.get(_table_key(table_name, namespace))
+        return sample[0] if sample else 0
+
+    def _schedule_sample(self, table_name: str, namespace: Optional[str] = None) -> None:
+        """
+        Construye en segundo plano la muestra uniforme de una tabla grande (si no existe).
+        Solo la pide la primera consulta en modo aproximado: el modo es opcional y la
+        muestra escanea la tabla completa y ocupa memoria de la sesión.
+        """
+        key = _table_key(table_name, namespace)
+        schema = self._catalog.get(key)
+        if schema is None or schema.row_count < self.approx_min_rows:
+            return
+        if key in self._samples or key in self._sampling:
+            return
+        self._sampling.add(key)
+        self._submit_db(
+            self._build_sample_sync, table_name, key, schema.row_count,
+            self._table_versions.get(key, 0), namespace=namespace,
+        )
+
+    def _build_sample_sync(
+        self, cur: duckdb.DuckDBPyConnection, table_name: str, key: str, population: int, version: int
+    ) -> None:
+        """
+        Muestra Bernoulli (cada fila con la misma probabilidad): a diferencia de
+        TABLESAMPLE SYSTEM, que toma bloques enteros, sus márgenes de error son válidos
+        aunque los datos estén ordenados o agrupados físicamente.
+        """
+        sample_table = _sample_table(table_name)
+        try:
+            percent = min(100.0, 100 * self.approx_sample_rows / population)
+            with self._sample_lock:
+                rows = _created_rows(cur.execute(
+                    f"CREATE OR REPLACE TABLE {sample_table} AS "
+                    f"SELECT * FROM {table_name} USING SAMPLE {percent:.6f} PERCENT (bernoulli)"
+                ))
+                # Si la tabla se recargó mientras tanto, la muestra ya no la representa
+                if self._table_versions.get(key, 0) != version:
+                    cur.execute(f"DROP TABLE IF EXISTS {sample_table}")
+                elif rows:
+                    self._samples[key] = (rows, population)
+        except Exception as e:
+            print(f"⚠️ No se pudo construir la muestra de {key}: {e}")
+        finally:
+            self._sampling.discard(key)
+
+    def _execute_sync(
+        self, cur: duckdb.DuckDBPyConnection, sql: str, max_rows: int, max_bytes: int, timeout_s: float
+    ) -> QueryResult:
+        with _deadline(cur, timeout_s, sql):
+            reader = cur.execute(sql).fetch_record_batch(RESULT_BATCH_ROWS)
+            table, truncated = _read_bounded(reader, max_rows, max_bytes)
+            if not truncated:
+                return QueryResult(table, source_sql=sql)
+            # El conteo corre aparte: DuckDB poda las columnas y no materializa filas
+            total = cur.execute(f"SELECT COUNT(*) FROM ({sql}) AS _q").fetchone()[0]
+            return QueryResult(table, truncated=True, total_rows=total, source_sql=sql)
+
+    async def fetch_page(
+        self, query: SQLQuery, offset: int, limit: int, namespace: Optional[str] = None
+    ) -> QueryResult:
+        """Recupera una página de un resultado (para resultados truncados)"""
+        if not query.is_safe:
+            raise SecurityError(f"Intento de ejecución de query insegura: {query.validation_error}")
+        sql = query.raw_query.strip().rstrip(';')
+        if namespace:
+            _check_namespace(sql, namespace, self.namespace_schemas(namespace))
+        page_sql = f"SELECT * FROM ({sql}) AS _q LIMIT {int(limit)} OFFSET {int(offset)}"
+
+        def fetch(cur: duckdb.DuckDBPyConnection) -> pa.Table:
+            with _deadline(cur, self.query_timeout_s, sql):
+                return cur.execute(page_sql).fetch_arrow_table()
+
+        try:
+            table = await self._run_db(fetch, namespace=namespace)
+            return QueryResult(table, source_sql=sql)
+        except QueryTimeoutError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Database Error: {str(e)}")
 
 class SecurityError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class QueryTimeoutError(Exception):
+    """La query excedió el tiempo máximo y fue interrumpida"""
+    def __init__(self, timeout_s: float, sql: str):
+        self.timeout_s = timeout_s
+        self.sql = sql
+        super().__init__(f"La query excedió el límite de {timeout_s:g}s y fue cancelada")
+
+@contextmanager
+def _deadline(cur: duckdb.DuckDBPyConnection, timeout_s: float, sql: str) -> Iterator[None]:
+    """Interrumpe el cursor si el bloque excede `timeout_s` (0 = sin límite)"""
+    if not timeout_s:
+        yield
+        return
+    expired = threading.Event()
+
+    def interrupt() -> None:
+        expired.set()
+        cur.interrupt()
+
+    timer = threading.Timer(timeout_s, interrupt)
+    timer.start()
+    try:
+        yield
+    except Exception as e:
+        # Durante el streaming la interrupción llega envuelta por Arrow (OSError)
+        if expired.is_set():
+            raise QueryTimeoutError(timeout_s, sql) from e
+        raise
+    finally:
+        timer.cancel()
+
+# --- Helpers de namespaces ---
+
+_NAMESPACE_RE = re.compile(r"^[a-z_][a-z0-9_]{0,62}$")
+
+def _validate_namespace(namespace: str) -> str:
+    if not _NAMESPACE_RE.match(namespace):
+        raise ValueError(f"Namespace inválido: {namespace!r}")
+    return namespace
+
+def _table_key(table_name: str, namespace: Optional[str]) -> str:
+    """Clave de versión/catálogo: `namespace.tabla` en minúsculas (o solo la tabla)"""
+    return f"{namespace}.{table_name}".lower() if namespace else table_name.lower()
+
+def _check_namespace(sql: str, namespace: str, tables: Iterable[str]) -> None:
+    """
+    Aislamiento entre namespaces: la query solo puede nombrar tablas propias (`tables`,
+    las catalogadas en la sesión) o CTEs. DuckDB resuelve un nombre que no está en el
+    search_path contra `main` y las vistas de sistema, así que no basta con el schema:
+    se rechazan vistas de sistema (duckdb_*, information_schema, pg_catalog...), tablas
+    ajenas, referencias calificadas a otros schemas, funciones de tabla (read_parquet,
+    glob...) y rutas de archivo usadas como tabla.
+    """
+    try:
+        tree = SQLSanitizer.parse(sql)
+    except sqlglot.errors.ParseError as e:
+        raise SecurityError(f"Query no analizable: {e}")
+    allowed = {t.lower() for t in tables} | {cte.alias.lower() for cte in tree.find_all(exp.CTE)}
+    for table in tree.find_all(exp.Table):
+        if not isinstance(table.this, exp.Identifier):
+            raise SecurityError("Política de Seguridad: funciones de tabla no permitidas en una sesión")
+        if table.catalog or (table.db and table.db.lower() != namespace):
+            raise SecurityError(f"Política de Seguridad: acceso a '{table.sql(dialect='duckdb')}' fuera de la sesión")
+        if any(ch in table.name for ch in "./\\"):
+            raise SecurityError("Política de Seguridad: lectura directa de archivos no permitida en una sesión")
+        name = table.name.lower()
+        if name.startswith(SYSTEM_TABLE_PREFIXES):
+            raise SecurityError("Política de Seguridad: catálogos del sistema no permitidos en una sesión")
+        if name not in allowed:
+            raise SecurityError(f"Política de Seguridad: la tabla '{table.name}' no existe en la sesión")
+
+# --- Helpers de resultados ---
+
+def _sample_table(table_name: str) -> str:
+    return f"{table_name}__sample"
+
+def _rollup_table(table_name: str, build_id: int) -> str:
+    return f"{table_name}__rollup_{build_id}"
+
+def _created_rows(result: duckdb.DuckDBPyConnection) -> Optional[int]:
+    """Filas que informa un CREATE TABLE AS / INSERT (None para vistas)"""
+    row = result.fetchone()
+    return int(row[0]) if row else None
+
+def _read_bounded(reader: pa.RecordBatchReader, max_rows: int, max_bytes: int) -> Tuple[pa.Table, bool]:
+    """Consume batches hasta agotar el lector o alcanzar el límite de filas/bytes"""
+    batches: List[pa.RecordBatch] = []
+    rows = nbytes = 0
+    truncated = False
+    try:
+        for batch in reader:
+            if rows + batch.num_rows > max_rows:
+                batch = batch.slice(0, max_rows - rows)
+                truncated = True
+            if batch.num_rows and nbytes + batch.nbytes > max_bytes:
+                # Proporción de filas del batch que cabe en el presupuesto restante
+                keep = int(batch.num_rows * (max_bytes - nbytes) / batch.nbytes)
+                batch = batch.slice(0, max(keep, 0))
+                truncated = True
+            batches.append(batch)
+            rows += batch.num_rows
+            nbytes += batch.nbytes
+            if truncated:
+                break
+    finally:
+        reader.close()
+    return pa.Table.from_batches(batches, schema=reader.schema), truncated
+
+# --- Helpers de ingesta ---
+
+def _as_buffer(data: Union[bytes, bytearray, memoryview, BinaryIO]) -> memoryview:
+    """Vista sin copia de los bytes de entrada (BytesIO/UploadedFile exponen getbuffer)"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return memoryview(data)
+    if hasattr(data, "getbuffer"):
+        return data.getbuffer()
+    # File-like genérico: una única lectura es inevitable
+    return memoryview(data.read())
+
+def _native_source(path: str, ext: str) -> str:
+    """Lector nativo de DuckDB para CSV/JSONL (archivo local o upload:// en memoria)"""
+    if ext == '.csv':
+        return f"read_csv_auto('{path}')"
+    return f"read_json_auto('{path}', format='newline_delimited')"
+
+def _arrow_source_from_buffer(reader: pa.BufferReader, ext: str, columns: Optional[List[str]]):
+    """Objeto Arrow (tabla o lector en streaming) que DuckDB puede registrar"""
+    if ext == '.parquet':
+        parquet_file = pq.ParquetFile(reader)
+        schema = parquet_file.schema_arrow
+        if columns:
+            schema = pa.schema([schema.field(c) for c in columns])
+        return pa.RecordBatchReader.from_batches(schema, parquet_file.iter_batches(columns=columns))
+    if ext in ARROW_FORMATS:
+        # Lectura IPC sobre el buffer: los arrays apuntan a los bytes originales
+        return pa.ipc.open_file(reader).read_all()
+    raise ValueError(f"Formato no soportado: {ext}")
+
+def _select_from(source: str, columns: Optional[List[str]], where: Optional[str]) -> str:
+    """SELECT con proyección y filtro opcionales sobre un lector de DuckDB"""
+    projection = ", ".join(_quote_identifier(c) for c in columns) if columns else "*"
+    sql = f"SELECT {projection} FROM {source}"
+    if where:
+        sql += f" WHERE {where}"
+    return sql
+
+def _normalize_column_name(name: Any) -> str:
+    """Normaliza nombres de columnas (quitar espacios y caracteres raros)"""
+    return str(name).strip().replace(" ", "_").replace("-", "_").lower()
+
+def _header_to_columns(header: Sequence[Any]) -> List[str]:
+    """Replica la convención de Pandas: celdas vacías -> 'Unnamed: i', duplicados -> 'col.1'."""
+    columns: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, raw in enumerate(header):
+        name = _normalize_column_name(raw if raw is not None else f"Unnamed: {i}")
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        columns.append(name)
+    return columns
+
+def _chunked(rows: Iterable[Sequence[Any]], size: int, width: int) -> Iterator[List[Sequence[Any]]]:
+    """
+    Agrupa filas en lotes, normalizando su ancho. Como pandas.read_excel, las filas
+    vacías intermedias se conservan (todo nulos) y solo se descartan las del final.
+    """
+    chunk: List[Sequence[Any]] = []
+    blank = (None,) * width
+    pending = 0  # Filas vacías vistas: se emiten solo si aparece una fila con datos
+    for row in rows:
+        if row is None or all(v is None for v in row):
+            pending += 1
+            continue
+        values = tuple(row[:width]) + (None,) * (width - len(row))
+        for normalized in itertools.chain(itertools.repeat(blank, pending), (values,)):
+            chunk.append(normalized)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        pending = 0
+    if chunk:
+        yield chunk
+
+def _rows_to_record_batch(rows: List[Sequence[Any]], columns: List[str]) -> pa.RecordBatch:
+    arrays = []
+    for idx in range(len(columns)):
+        values = [row[idx] for row in rows]
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Columna con tipos mezclados: se conserva como texto
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+def _widen_arrow_type(current: pa.DataType, incoming: pa.DataType) -> pa.DataType:
+    """Tipo mínimo que admite tanto los datos ya cargados como el lote entrante."""
+    if pa.types.is_null(incoming) or current == incoming:
+        return current
+    if pa.types.is_null(current):
+        return incoming
+    if pa.types.is_integer(current) and pa.types.is_floating(incoming):
+        return pa.float64()
+    if pa.types.is_floating(current) and pa.types.is_integer(incoming):
+        return current
+    return pa.string()
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
@@ -0,0 +1,156 @@
+# infrastructure/persistence/ingestion_cache.py
+import hashlib
+import json
+import os
+import threading
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+
+import duckdb
+
+from domain.entities.dataset import ColumnProfile, DatasetSchema
+
+_HASH_CHUNK = 1024 * 1024
+
+
+@dataclass(slots=True)
+class CacheStats:
+    """Contadores de uso de la caché de ingesta"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class CacheEntry:
+    """Tabla ya ingerida, guardada en Parquet junto a su esquema"""
+    key: str
+    data_path: str
+    schema: Dict[str, Any]
+
+
+class IngestionCache:
+    """
+    Caché persistente de ingesta direccionada por contenido.
+    La clave es el SHA-256 del archivo más las opciones del loader; el valor es
+    la tabla resultante en Parquet + su DatasetSchema. Política LRU acotada por bytes
+    (el último acceso se registra en el mtime del archivo de metadata).
+    """
+
+    def __init__(self, cache_dir: str = ".ingest_cache", max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(source: Union[str, memoryview], options: Dict[str, Any]) -> str:
+        """Hash del contenido (ruta o buffer en memoria) + opciones de carga (orden estable)"""
+        digest = hashlib.sha256()
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                while chunk := f.read(_HASH_CHUNK):
+                    digest.update(chunk)
+        else:
+            digest.update(source)
+        digest.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+                self.stats.misses += 1
+                return None
+            with open(meta_path, "r", encoding="utf-8") as f:
+                schema = json.load(f)
+            # Marca de acceso para la política LRU
+            os.utime(meta_path, None)
+            self.stats.hits += 1
+        return CacheEntry(key=key, data_path=data_path, schema=schema)
+
+    def record_lost(self) -> None:
+        """Un hit cuyo Parquet se evictó antes de leerlo: cuenta como miss"""
+        with self._lock:
+            self.stats.hits -= 1
+            self.stats.misses += 1
+
+    def store(self, key: str, conn: duckdb.DuckDBPyConnection, table_name: str, schema: DatasetSchema) -> None:
+        data_path, meta_path = self._paths(key)
+        # Nombre único: dos sesiones pueden guardar a la vez el mismo contenido (misma clave)
+        tmp_path = f"{data_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            conn.execute(f"COPY {table_name} TO '{tmp_path}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+            with self._lock:
+                os.replace(tmp_path, data_path)
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(schema_to_dict(schema), f)
+                self._evict()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def size_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.cache_dir, name)) for name in os.listdir(self.cache_dir))
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.parquet", f"{base}.json"
+
+    def _evict(self) -> None:
+        """Elimina las entradas menos usadas recientemente hasta respetar max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            data_path, meta_path = self._paths(key)
+            size = os.path.getsize(meta_path)
+            if os.path.exists(data_path):
+                size += os.path.getsize(data_path)
+            entries.append((os.path.getmtime(meta_path), size, key))
+
+        total = sum(size for _, size, _ in entries)
+        remaining = len(entries)
+        for _, size, key in sorted(entries):
+            # Siempre se conserva la entrada más reciente aunque exceda el límite
+            if total <= self.max_bytes or remaining <= 1:
+                break
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+            remaining -= 1
+            self.stats.evictions += 1
+
+
+def schema_to_dict(schema: DatasetSchema) -> Dict[str, Any]:
+    return {
+        "row_count": schema.row_count,
+        "columns": schema.columns,
+        "summary": schema.summary,
+        "created_at": schema.created_at.isoformat(),
+        "profile": {col: asdict(prof) for col, prof in schema.profile.items()},
+        "profile_sampled": schema.profile_sampled,
+    }
+
+
+def schema_from_dict(data: Dict[str, Any], table_name: str) -> DatasetSchema:
+    return DatasetSchema(
+        id=table_name,
+        table_name=table_name,
+        row_count=data["row_count"],
+        columns=data["columns"],
+        summary=data.get("summary", ""),
+        created_at=datetime.fromisoformat(data["created_at"]),
+        profile={col: ColumnProfile(**prof) for col, prof in data.get("profile", {}).items()},
+        profile_sampled=data.get("profile_sampled", False),
+    )
@@ -0,0 +1,144 @@
+# infrastructure/persistence/query_cache.py
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+from domain.value_objects.query_result import QueryResult
+from infrastructure.security.sql_sanitizer import SQLSanitizer
+
+# Funciones cuyo resultado cambia entre ejecuciones: nunca se cachean
+_VOLATILE_NODES = (
+    exp.Rand,
+    exp.CurrentDate,
+    exp.CurrentTime,
+    exp.CurrentTimestamp,
+    exp.CurrentDatetime,
+)
+
+
+@dataclass(slots=True)
+class QueryCacheStats:
+    """Métricas de la caché de resultados"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    bypassed: int = 0  # Queries no cacheables (volátiles o no parseables)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class QueryResultCache:
+    """
+    Caché LRU de resultados en memoria, acotada por bytes.
+    La clave es el AST normalizado de la query (sqlglot) más la versión de cada
+    tabla referenciada, de modo que recargar una tabla invalida sus entradas sin
+    tener que recorrer la caché.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.stats = QueryCacheStats()
+        self._entries: "OrderedDict[str, QueryResult]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def make_key(
+        self, sql: str, table_versions: Dict[str, int], *limits: int, scope: str = ""
+    ) -> Optional[str]:
+        """
+        Clave canónica; None si la query no es cacheable.
+        `scope` es el namespace donde se resuelven las tablas (sus versiones son `scope.tabla`).
+        """
+        normalized = normalize_query(sql)
+        if normalized is None:
+            self.stats.bypassed += 1
+            return None
+        canonical, tables = normalized
+        prefix = f"{scope}." if scope else ""
+        versions = ",".join(f"{prefix}{t}@{table_versions.get(prefix + t, 0)}" for t in sorted(tables))
+        return f"{canonical}|{versions}|{':'.join(str(v) for v in limits)}"
+
+    def get(self, key: str) -> Optional[QueryResult]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return result
+
+    def put(self, key: str, result: QueryResult) -> None:
+        size = result.table.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.table.nbytes
+            self._entries[key] = result
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.table.nbytes
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def normalize_query(sql: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """
+    Forma canónica de una query: espacios, mayúsculas y alias de tabla no alteran la clave.
+    Retorna (sql canónico, tablas referenciadas) o None si es volátil o no parseable.
+    """
+    try:
+        tree = SQLSanitizer.parse(sql)
+    except sqlglot.errors.ParseError:
+        return None
+    if tree is None or any(tree.find_all(*_VOLATILE_NODES)):
+        return None
+
+    tree = _canonicalize_aliases(tree)
+    tables = tuple(sorted({t.name.lower() for t in tree.find_all(exp.Table)}))
+    return tree.sql(dialect="duckdb", normalize=True), tables
+
+
+def _canonicalize_aliases(tree: exp.Expression) -> exp.Expression:
+    """Reemplaza alias de tabla por el nombre real (y los quita si hay una sola tabla)"""
+    tree = tree.copy()
+    sources = list(tree.find_all(exp.Table))
+    names = [t.name.lower() for t in sources]
+    # Con auto-joins (misma tabla dos veces) el alias es semántico: no se toca
+    if len(set(names)) != len(names) or any(tree.find_all(exp.Subquery, exp.CTE)):
+        return tree
+
+    alias_to_name = {t.alias_or_name.lower(): t.name.lower() for t in sources}
+    single_table = len(sources) == 1
+    for column in tree.find_all(exp.Column):
+        qualifier = column.table.lower()
+        if not qualifier or qualifier not in alias_to_name:
+            continue
+        if single_table:
+            column.set("table", None)
+        else:
+            column.set("table", exp.to_identifier(alias_to_name[qualifier]))
+    for table in sources:
+        table.set("alias", None)
+    return tree
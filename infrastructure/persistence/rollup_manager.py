@@ -0,0 +1,292 @@
+# infrastructure/persistence/rollup_manager.py
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+from infrastructure.security.sql_sanitizer import SQLSanitizer
+
+# Queries agregadas sobre una misma tabla antes de materializar su rollup
+ROLLUP_MIN_HITS = int(os.getenv("DUCKDB_ROLLUP_MIN_HITS", "3"))
+# Solo compensa en tablas grandes: en las chicas el escaneo ya es instantáneo
+ROLLUP_MIN_TABLE_ROWS = int(os.getenv("DUCKDB_ROLLUP_MIN_TABLE_ROWS", "1000000"))
+# Un rollup con más de esta fracción de las filas de la tabla no ahorra escaneo: se descarta
+ROLLUP_MAX_RATIO = float(os.getenv("DUCKDB_ROLLUP_MAX_RATIO", "0.1"))
+
+# Agregados re-agregables desde un pre-agregado (AVG se guarda como SUM + COUNT)
+_MEASURES = {exp.Count: "count", exp.Sum: "sum", exp.Avg: "avg", exp.Min: "min", exp.Max: "max"}
+
+Measure = Tuple[str, str]  # (función, argumento en SQL)
+
+
+@dataclass(frozen=True, slots=True)
+class QueryShape:
+    """Forma agregada de una query: qué agrupa o filtra y qué agrega"""
+    dimensions: FrozenSet[str]  # Expresiones de agrupación y columnas filtradas (SQL)
+    measures: FrozenSet[Measure]
+
+
+@dataclass(frozen=True, slots=True)
+class RollupSpec:
+    """Definición de un rollup: dimensiones (columnas d0..dn) y medidas (m0..mn)"""
+    dimensions: Tuple[str, ...]
+    measures: Tuple[Measure, ...]
+
+    def covers(self, shape: QueryShape) -> bool:
+        return shape.dimensions <= set(self.dimensions) and shape.measures <= set(self.measures)
+
+    def create_sql(self, rollup_table: str, source_table: str) -> str:
+        columns = [f"{dim} AS d{i}" for i, dim in enumerate(self.dimensions)]
+        columns.append("COUNT(*) AS _count")
+        columns += [f"{fn.upper()}({arg}) AS m{i}" for i, (fn, arg) in enumerate(self.measures)]
+        return f"CREATE OR REPLACE TABLE {rollup_table} AS SELECT {', '.join(columns)} FROM {source_table} GROUP BY ALL"
+
+
+@dataclass(frozen=True, slots=True)
+class Rollup:
+    """Rollup materializado de una tabla"""
+    table_name: str
+    spec: RollupSpec
+    rows: int
+    source_rows: int
+
+
+@dataclass(slots=True)
+class RollupStats:
+    """Métricas de los rollups"""
+    built: int = 0
+    rejected: int = 0  # Rollups descartados por cardinalidad
+    rewrites: int = 0  # Queries respondidas desde un rollup
+    rows_scanned: int = 0  # Filas de rollup leídas en esas queries
+    rows_saved: int = 0  # Filas de la tabla original que no se escanearon
+
+    @property
+    def saved_ratio(self) -> float:
+        total = self.rows_scanned + self.rows_saved
+        return self.rows_saved / total if total else 0.0
+
+
+class RollupManager:
+    """
+    Observa las queries agregadas ejecutadas y, cuando una tabla grande recibe
+    varias con dimensiones y medidas recurrentes, decide materializar un rollup
+    (pre-agregado por la unión de sus dimensiones). Las queries posteriores que
+    el rollup cubre se reescriben para re-agregar sobre él en lugar de escanear la tabla.
+    El adapter construye las tablas y las invalida al recargar la tabla de origen.
+    """
+
+    def __init__(
+        self,
+        min_hits: int = ROLLUP_MIN_HITS,
+        min_table_rows: int = ROLLUP_MIN_TABLE_ROWS,
+        max_ratio: float = ROLLUP_MAX_RATIO,
+    ):
+        self.min_hits = min_hits
+        self.min_table_rows = min_table_rows
+        self.max_ratio = max_ratio
+        self.stats = RollupStats()
+        self._rollups: Dict[str, Rollup] = {}
+        self._pending: Dict[str, Counter] = {}  # Formas observadas aún sin rollup, por tabla
+        self._building: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, sql: str, columns: Iterable[str], table_rows: int) -> Optional[RollupSpec]:
+        """
+        Registra una query ejecutada sobre la tabla `key`.
+        Retorna la definición a materializar cuando la forma se repite lo suficiente.
+        """
+        if table_rows < self.min_table_rows:
+            return None
+        shape = extract_shape(sql, columns)
+        if shape is None:
+            return None
+        with self._lock:
+            current = self._rollups.get(key)
+            if current is not None and current.spec.covers(shape):
+                return None
+            pending = self._pending.setdefault(key, Counter())
+            pending[shape] += 1
+            if sum(pending.values()) < self.min_hits or key in self._building:
+                return None
+            shapes = list(pending)
+            if current is not None:
+                # El nuevo rollup reemplaza al actual: debe seguir cubriendo lo que ya cubría
+                shapes.append(QueryShape(frozenset(current.spec.dimensions), frozenset(current.spec.measures)))
+            self._building.add(key)
+        return RollupSpec(
+            dimensions=tuple(sorted(set().union(*(s.dimensions for s in shapes)))),
+            measures=tuple(sorted(set().union(*(s.measures for s in shapes)))),
+        )
+
+    def accept(self, key: str, rollup: Rollup) -> Tuple[bool, Optional[Rollup]]:
+        """
+        Registra un rollup construido. Retorna (aceptado, rollup reemplazado): si no
+        ahorra escaneo no se acepta, y en ambos casos la tabla sobrante se debe borrar.
+        """
+        with self._lock:
+            self._building.discard(key)
+            pending = self._pending.get(key, Counter())
+            if rollup.rows > rollup.source_rows * self.max_ratio:
+                self.stats.rejected += 1
+                # Se reintenta más adelante solo con la forma más frecuente (menos dimensiones)
+                top = pending.most_common(1)
+                self._pending[key] = Counter(dict(top)) if top else Counter()
+                return False, None
+            previous = self._rollups.get(key)
+            self._rollups[key] = rollup
+            self._pending.pop(key, None)
+            self.stats.built += 1
+            return True, previous
+
+    def abandon(self, key: str) -> None:
+        """La construcción falló o la tabla cambió mientras tanto"""
+        with self._lock:
+            self._building.discard(key)
+
+    def invalidate(self, key: str) -> Optional[Rollup]:
+        """La tabla de origen cambió: el rollup y las formas observadas ya no aplican"""
+        with self._lock:
+            self._pending.pop(key, None)
+            return self._rollups.pop(key, None)
+
+    def rewrite(self, key: str, sql: str, columns: Iterable[str]) -> Optional[Tuple[str, Rollup]]:
+        """Query equivalente sobre el rollup de la tabla, o None si el rollup no la cubre"""
+        rollup = self._rollups.get(key)
+        if rollup is None:
+            return None
+        shape = extract_shape(sql, columns)
+        if shape is None or not rollup.spec.covers(shape):
+            return None
+        rewritten = _rewrite_tree(_unqualified(SQLSanitizer.parse(sql)), rollup)
+        return (rewritten, rollup) if rewritten is not None else None
+
+    def record(self, rollup: Rollup) -> None:
+        """Contabiliza una query respondida desde el rollup (escaneo ahorrado)"""
+        with self._lock:
+            self.stats.rewrites += 1
+            self.stats.rows_scanned += rollup.rows
+            self.stats.rows_saved += max(0, rollup.source_rows - rollup.rows)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Rollups vigentes para depuración"""
+        return {
+            key: {"rows": r.rows, "source_rows": r.source_rows, "dimensions": len(r.spec.dimensions)}
+            for key, r in list(self._rollups.items())
+        }
+
+
+def extract_shape(sql: str, columns: Iterable[str]) -> Optional[QueryShape]:
+    """
+    Forma agregada de la query, o None si un rollup no puede responderla.
+    Elegibles: SELECT sobre una sola tabla, sin joins, subqueries ni ventanas, con GROUP BY
+    o agregados COUNT/SUM/AVG/MIN/MAX (sin DISTINCT). `columns` son las columnas de la
+    tabla, para distinguirlas de los alias usados en el GROUP BY.
+    """
+    try:
+        tree = SQLSanitizer.parse(sql)
+    except sqlglot.errors.ParseError:
+        return None
+    if not isinstance(tree, exp.Select) or tree.args.get("joins") or tree.args.get("with"):
+        return None
+    if len(list(tree.find_all(exp.Select))) > 1 or tree.find(exp.Window):
+        return None
+    if any(isinstance(p, exp.Star) for p in tree.expressions) or source_table(sql) is None:
+        return None
+
+    tree = _unqualified(tree)
+    measures: Set[Measure] = set()
+    for node in tree.find_all(exp.AggFunc):
+        fn = _MEASURES.get(type(node))
+        if fn is None or isinstance(node.this, exp.Distinct) or len(node.args.get("expressions") or []) > 0:
+            return None
+        if fn == "count" and isinstance(node.this, exp.Star):
+            continue  # COUNT(*) sale de la columna _count
+        arg = node.this.sql(dialect="duckdb")
+        measures |= {("sum", arg), ("count", arg)} if fn == "avg" else {(fn, arg)}
+
+    group = tree.args.get("group")
+    if group is None and not tree.find(exp.AggFunc):
+        return None
+    known = {c.lower() for c in columns}
+    aliases = {p.alias.lower(): p.this for p in tree.expressions if isinstance(p, exp.Alias)}
+    dimensions: Set[str] = set()
+    for item in group.expressions if group is not None else []:
+        if isinstance(item, exp.Literal) and not item.is_string:
+            position = int(item.name) - 1
+            if not 0 <= position < len(tree.expressions):
+                return None
+            item = _unalias(tree.expressions[position])
+        elif isinstance(item, exp.Column) and item.name.lower() in aliases and item.name.lower() not in known:
+            item = aliases[item.name.lower()]
+        if item.find(exp.AggFunc):
+            return None
+        dimensions.add(item.sql(dialect="duckdb"))
+    # Las columnas filtradas también son dimensiones: el filtro se aplica sobre el rollup
+    where = tree.args.get("where")
+    if where is not None:
+        dimensions |= {c.sql(dialect="duckdb") for c in where.find_all(exp.Column)}
+    return QueryShape(frozenset(dimensions), frozenset(measures))
+
+
+def source_table(sql: str) -> Optional[str]:
+    """Nombre de la única tabla que lee la query (None si lee varias o una función de tabla)"""
+    try:
+        tables = list(SQLSanitizer.parse(sql).find_all(exp.Table))
+    except sqlglot.errors.ParseError:
+        return None
+    if len(tables) != 1 or not isinstance(tables[0].this, exp.Identifier) or tables[0].db:
+        return None
+    return tables[0].name
+
+
+def _rewrite_tree(tree: exp.Select, rollup: Rollup) -> Optional[str]:
+    """Sustituye tabla, dimensiones y agregados por sus equivalentes sobre el rollup"""
+    dims = {dim: f"d{i}" for i, dim in enumerate(rollup.spec.dimensions)}
+    measures = {m: f"m{i}" for i, m in enumerate(rollup.spec.measures)}
+
+    def substitute(node: exp.Expression) -> exp.Expression:
+        fn = _MEASURES.get(type(node))
+        if fn is not None:
+            if fn == "count" and isinstance(node.this, exp.Star):
+                return sqlglot.parse_one("CAST(COALESCE(SUM(_count), 0) AS BIGINT)", read="duckdb")
+            arg = node.this.sql(dialect="duckdb")
+            if fn == "count":
+                return sqlglot.parse_one(f"CAST(COALESCE(SUM({measures[('count', arg)]}), 0) AS BIGINT)", read="duckdb")
+            if fn == "avg":
+                total, count = measures[("sum", arg)], measures[("count", arg)]
+                return sqlglot.parse_one(f"CAST(SUM({total}) AS DOUBLE) / NULLIF(SUM({count}), 0)", read="duckdb")
+            return exp.func(fn.upper(), exp.column(measures[(fn, arg)]))
+        if isinstance(node, exp.Table):
+            return exp.to_table(rollup.table_name)
+        column = dims.get(node.sql(dialect="duckdb"))
+        if column is not None:
+            return exp.column(column)
+        return node
+
+    rewritten = tree.transform(substitute)
+    allowed = {*dims.values(), *measures.values(), "_count"}
+    aliases = {p.alias.lower() for p in rewritten.expressions if isinstance(p, exp.Alias)}
+    for column in rewritten.find_all(exp.Column):
+        name = column.name.lower()
+        if name not in allowed and name not in aliases:
+            # Quedó una columna de la tabla original que el rollup no tiene
+            return None
+    return rewritten.sql(dialect="duckdb")
+
+
+def _unqualified(tree: exp.Expression) -> exp.Expression:
+    """Copia sin calificadores de tabla en las columnas (la query lee una sola tabla)"""
+    tree = tree.copy()
+    for column in tree.find_all(exp.Column):
+        column.set("table", None)
+    for table in tree.find_all(exp.Table):
+        table.set("alias", None)
+    return tree
+
+
+def _unalias(node: exp.Expression) -> exp.Expression:
+    return node.this if isinstance(node, exp.Alias) else node
@@ -0,0 +1,334 @@
+# infrastructure/persistence/semantic_cache.py
+import difflib
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import sqlglot
+from sqlglot import exp
+
+from infrastructure.security.sql_sanitizer import SQLSanitizer
+
+SQL_CACHE_DIR = os.getenv("SQL_CACHE_DIR", ".sql_cache")
+# Similitud coseno mínima de los candidatos del índice vectorial (prefiltro: la
+# reutilización la decide la guarda léxica, ver scripts_pruebas/check_sql_cache.py)
+SQL_CACHE_THRESHOLD = float(os.getenv("SQL_CACHE_THRESHOLD", "0.75"))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "5000"))
+# Dimensión del embedding de n-gramas de caracteres (hashing trick)
+EMBEDDING_DIM = 1024
+_NGRAM_SIZES = (3, 4, 5)
+# Candidatos por búsqueda: el mejor puede descartarse por literales distintos
+_CANDIDATES = 3
+_TABLE = "question_sql"
+# Aciertos acumulados en memoria antes de escribirlos en LanceDB (cada update crea una versión)
+_HIT_FLUSH = 32
+
+# Palabras de relleno que no cambian la query ("dame", "muestra", artículos...)
+_STOPWORDS = frozenset(
+    "a al algo cada cual cuales dame de del el en es esta este favor la las lo los me mi muestra muestrame mostrar "
+    "necesito por para que quiero se son su sus un una y ver "
+    "and are by for give is list me of please show the to what which".split()
+)
+# Palabras que cambian el resultado aunque el texto sea casi idéntico: deben coincidir
+_OPERATOR_WORDS = frozenset(
+    "asc ascendente desc descendente mayor mayores menor menores mas menos top bottom primeros primeras "
+    "ultimos ultimas max maximo min minimo promedio media mediana total suma cuenta cuantos cuantas distintos "
+    "unicos porcentaje sin con excepto no highest lowest most least first last average sum count distinct "
+    "without not".split()
+)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+# Similitud (difflib) con la que dos palabras de contenido cuentan como la misma
+# (plurales, erratas): "producto" ~ "productos", pero "netas" no equivale a "brutas"
+_SPELLING_SIMILARITY = 0.8
+
+_SCHEMA = pa.schema([
+    pa.field("id", pa.string()),
+    pa.field("fingerprint", pa.string()),
+    pa.field("context", pa.string()),  # Hash del SQL previo de la conversación ("" = pregunta sin contexto)
+    pa.field("question", pa.string()),
+    pa.field("sql", pa.string()),
+    pa.field("vector", pa.list_(pa.float32(), EMBEDDING_DIM)),
+    pa.field("created_at", pa.timestamp("us")),
+    pa.field("last_hit", pa.timestamp("us")),
+    pa.field("hits", pa.int64()),
+])
+
+
+@dataclass(slots=True)
+class SemanticCacheStats:
+    """Métricas de la caché semántica pregunta→SQL"""
+    hits: int = 0
+    misses: int = 0
+    rejected: int = 0  # Similares por encima del umbral pero con otras palabras, literales u operadores
+    near_misses: int = 0  # Mejor candidato a menos de 0.05 por debajo del umbral
+    stored: int = 0
+    evictions: int = 0
+    invalidated: int = 0  # SQL reutilizado que falló al ejecutarse
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class CachedSQL:
+    """SQL reutilizable para una pregunta nueva"""
+    id: str
+    question: str  # Pregunta original que generó el SQL
+    sql: str
+    similarity: float
+
+
+class SemanticSQLCache:
+    """
+    Caché persistente pregunta→SQL en LanceDB, particionada por huella del esquema.
+    Es una caché de variantes léxicas, no de paráfrasis: reutiliza el SQL de una
+    pregunta ya resuelta sobre el mismo esquema cuando la nueva dice lo mismo con
+    otro orden, relleno, acentos, plurales o erratas ("Dame las ventas por región"
+    ~ "ventas por regoin"). El índice vectorial (embeddings locales de n-gramas de
+    caracteres, sin red) solo propone candidatos por encima del umbral; decide la
+    guarda léxica: mismos números y operadores (mayor/menor, top, promedio...), las
+    mismas palabras de contenido y los literales del SQL presentes en la pregunta
+    nueva ("ventas del norte" no reutiliza el SQL de "ventas del sur").
+    Política LRU por último acierto, acotada por número de entradas. Los aciertos se
+    acumulan en memoria y se escriben por lotes de _HIT_FLUSH (un update por acierto
+    crearía una versión de la tabla cada vez); los pendientes se pierden al cerrar.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = SQL_CACHE_DIR,
+        threshold: float = SQL_CACHE_THRESHOLD,
+        max_entries: int = SQL_CACHE_MAX_ENTRIES,
+    ):
+        self.cache_dir = cache_dir
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.stats = SemanticCacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._table = lancedb.connect(cache_dir).create_table(_TABLE, schema=_SCHEMA, exist_ok=True)
+        self._count = self._table.count_rows()
+        self._pending_hits: Dict[str, int] = {}  # id → aciertos aún no escritos
+
+    def lookup(self, question: str, fingerprint: str, context_sql: Optional[str] = None) -> Optional[CachedSQL]:
+        """
+        SQL de la pregunta cacheada más parecida o None.
+        Con `context_sql` (SQL previo de la conversación) solo se aceptan entradas
+        generadas con ese mismo contexto o sin contexto: una repregunta ("¿y por mes?")
+        no debe heredar el SQL resuelto sobre otra conversación.
+        """
+        vector = embed_question(question)
+        where = f"fingerprint = {_quote(fingerprint)} AND context IN ('', {_quote(_context_key(context_sql))})"
+        with self._lock:
+            if not self._count:
+                self.stats.misses += 1
+                return None
+            rows = (
+                self._table.search(vector)
+                .metric("cosine")
+                .where(where, prefilter=True)
+                .select(["id", "question", "sql", "_distance"])
+                .limit(_CANDIDATES)
+                .to_list()
+            )
+            best = 0.0
+            rejected = False
+            for row in rows:
+                similarity = 1.0 - row["_distance"]
+                best = max(best, similarity)
+                if similarity < self.threshold:
+                    break
+                if not literals_match(question, row["question"], row["sql"]):
+                    rejected = True
+                    continue
+                self._pending_hits[row["id"]] = self._pending_hits.get(row["id"], 0) + 1
+                if sum(self._pending_hits.values()) >= _HIT_FLUSH:
+                    self._flush_hits()
+                self.stats.hits += 1
+                return CachedSQL(row["id"], row["question"], row["sql"], similarity)
+
+            self.stats.misses += 1
+            if rejected:
+                self.stats.rejected += 1
+            elif best >= self.threshold - 0.05:
+                self.stats.near_misses += 1
+            return None
+
+    def store(self, question: str, sql: str, fingerprint: str, context_sql: Optional[str] = None) -> None:
+        """Registra el SQL que respondió correctamente a la pregunta (reemplaza la misma pregunta)"""
+        context = _context_key(context_sql)
+        entry_id = hashlib.sha1(f"{fingerprint}|{context}|{normalize_question(question)}".encode("utf-8")).hexdigest()
+        now = datetime.utcnow()
+        row = {
+            "id": entry_id,
+            "fingerprint": fingerprint,
+            "context": context,
+            "question": question,
+            "sql": sql,
+            "vector": embed_question(question),
+            "created_at": now,
+            "last_hit": now,
+            "hits": 0,
+        }
+        with self._lock:
+            self._pending_hits.pop(entry_id, None)
+            self._table.delete(f"id = {_quote(entry_id)}")
+            self._table.add([row])
+            self._count = self._table.count_rows()
+            self.stats.stored += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def forget(self, entry_id: str) -> None:
+        """Descarta una entrada cuyo SQL reutilizado falló (el esquema o los datos cambiaron)"""
+        with self._lock:
+            self._pending_hits.pop(entry_id, None)
+            self._table.delete(f"id = {_quote(entry_id)}")
+            self._count = self._table.count_rows()
+            self.stats.invalidated += 1
+
+    def flush(self) -> None:
+        """Escribe los aciertos pendientes (hits y last_hit) en LanceDB"""
+        with self._lock:
+            self._flush_hits()
+
+    def _flush_hits(self) -> None:
+        """Un update por número de aciertos distinto (no por entrada) y compactación"""
+        if not self._pending_hits:
+            return
+        by_count: Dict[int, List[str]] = {}
+        for entry_id, count in self._pending_hits.items():
+            by_count.setdefault(count, []).append(entry_id)
+        self._pending_hits.clear()
+        # last_hit = momento del volcado: el orden LRU es exacto a nivel de lote
+        now = f"CAST({_quote(datetime.utcnow().isoformat(sep=' '))} AS TIMESTAMP)"
+        for count, ids in by_count.items():
+            self._table.update(
+                where=f"id IN ({', '.join(_quote(i) for i in ids)})",
+                values_sql={"hits": f"hits + {count}", "last_hit": now},
+            )
+        self._table.optimize()
+
+    def _evict(self) -> None:
+        """LRU: borra las entradas menos usadas hasta el 90% del máximo (amortiza el borrado)"""
+        keep = int(self.max_entries * 0.9)
+        self._flush_hits()  # El orden LRU necesita los last_hit al día
+        index = self._table.search().select(["id", "last_hit"]).limit(None).to_arrow()
+        order = np.argsort(index.column("last_hit").to_numpy())
+        victims = [index.column("id")[int(i)].as_py() for i in order[: max(0, index.num_rows - keep)]]
+        if not victims:
+            return
+        self._table.delete(f"id IN ({', '.join(_quote(v) for v in victims)})")
+        self._table.optimize()
+        self._count = self._table.count_rows()
+        self.stats.evictions += len(victims)
+
+
+def normalize_question(text: str) -> str:
+    """Minúsculas, sin acentos ni puntuación, sin palabras de relleno"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    words = re.findall(r"[a-z0-9]+(?:[.,][0-9]+)?", text)
+    return " ".join(w for w in words if w not in _STOPWORDS)
+
+
+def embed_question(text: str) -> np.ndarray:
+    """
+    Embedding local: n-gramas de caracteres (3-5) de la pregunta normalizada,
+    proyectados a EMBEDDING_DIM con hashing con signo, TF logarítmico y norma L2.
+    """
+    padded = f" {normalize_question(text)} "
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for n in _NGRAM_SIZES:
+        for i in range(len(padded) - n + 1):
+            # crc32 es estable entre procesos (hash() de Python no lo es)
+            h = zlib.crc32(padded[i:i + n].encode("utf-8"))
+            vector[h % EMBEDDING_DIM] += 1.0 if h & 0x80000000 else -1.0
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def literals_match(question: str, cached_question: str, sql: str) -> bool:
+    """
+    Guarda contra falsos positivos de la similitud: mismos números y palabras operador
+    en ambas preguntas, las mismas palabras de contenido salvo diferencias de escritura
+    ("ventas netas" no reutiliza "ventas") y cada literal de texto del SQL cacheado
+    presente en la pregunta nueva.
+    """
+    if not same_question(question, cached_question):
+        return False
+    normalized = f" {normalize_question(question)} "
+    return all(f" {literal} " in normalized for literal in _sql_literals(sql))
+
+
+def same_question(question: str, other: str) -> bool:
+    """
+    Guarda léxica: mismos números y operadores, y las mismas palabras de contenido
+    emparejadas una a una (admite erratas y plurales, no sinónimos).
+    """
+    if _signature(question) != _signature(other):
+        return False
+    words, others = _content_words(question), _content_words(other)
+    for word in list(words):
+        if word in others:
+            words.remove(word)
+            others.remove(word)
+    for word in words:
+        match = next(
+            (w for w in others if difflib.SequenceMatcher(None, word, w).ratio() >= _SPELLING_SIMILARITY),
+            None,
+        )
+        if match is None:
+            return False
+        others.remove(match)
+    return not others
+
+
+def _content_words(question: str) -> List[str]:
+    """Palabras que definen la query: sin relleno, operadores ni números (se comparan aparte)"""
+    return [
+        w for w in normalize_question(question).split()
+        if w not in _OPERATOR_WORDS and not _NUMBER.fullmatch(w)
+    ]
+
+
+def _signature(question: str) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    words = normalize_question(question).split()
+    numbers = frozenset(n.replace(",", ".") for w in words for n in _NUMBER.findall(w))
+    # En orden: "de mayor a menor" no equivale a "de menor a mayor"
+    return numbers, tuple(w for w in words if w in _OPERATOR_WORDS)
+
+
+def _sql_literals(sql: str) -> List[str]:
+    """Literales de texto del SQL, normalizados como la pregunta (sin comodines de LIKE)"""
+    try:
+        tree = SQLSanitizer.parse(sql)
+    except sqlglot.errors.ParseError:
+        return ["\0"]  # SQL ilegible: nunca coincide
+    literals = []
+    for literal in tree.find_all(exp.Literal):
+        if literal.is_string:
+            text = normalize_question(literal.this.replace("%", " ").replace("_", " "))
+            if text:
+                literals.append(text)
+    return literals
+
+
+def _context_key(context_sql: Optional[str]) -> str:
+    return hashlib.sha1(context_sql.strip().encode("utf-8")).hexdigest()[:16] if context_sql else ""
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
@@ -0,0 +1,305 @@
+# infrastructure/persistence/session_manager.py
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+from domain.entities.dataset import DatasetSchema
+from domain.ports.data_port import DataProviderPort
+from domain.value_objects.query_result import QueryResult
+from domain.value_objects.sql_query import SQLQuery
+from infrastructure.persistence.duckdb_adapter import DuckDBAdapter, StoredDataset
+
+# Presupuesto de memoria por sesión (estimado sobre las tablas cargadas)
+SESSION_MEMORY_BYTES = int(os.getenv("SESSION_MEMORY_MB", "512")) * 1024 * 1024
+# Tras este tiempo sin uso, los datasets de la sesión salen de memoria
+SESSION_IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_MIN", "30")) * 60
+# Volcado a Parquet de las sesiones inactivas. Vacío = se descartan sin volcar
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", ".session_spill")
+
+# Bytes por valor en el formato de vectores de DuckDB. VARCHAR/BLOB, DECIMAL y tipos
+# anidados usan 16 (string_t): los textos de más de 12 caracteres ocupan algo más
+_TYPE_WIDTHS = {
+    "BOOLEAN": 1, "TINYINT": 1, "UTINYINT": 1,
+    "SMALLINT": 2, "USMALLINT": 2,
+    "INTEGER": 4, "UINTEGER": 4, "FLOAT": 4, "DATE": 4,
+    "BIGINT": 8, "UBIGINT": 8, "DOUBLE": 8, "TIME": 8,
+    "TIMESTAMP": 8, "TIMESTAMP WITH TIME ZONE": 8,
+}
+_DEFAULT_WIDTH = 16
+
+
+class SessionBudgetError(Exception):
+    """El dataset no cabe en el presupuesto de memoria de la sesión"""
+    pass
+
+
+@dataclass(slots=True)
+class SessionInfo:
+    """Estado de una sesión dentro del DuckDB compartido"""
+    namespace: str
+    last_access: float = field(default_factory=time.monotonic)
+    spilled: Dict[str, Tuple[str, DatasetSchema]] = field(default_factory=dict)  # tabla -> (parquet, esquema)
+    evicted: bool = False  # Se descartó sin volcado: hay que volver a cargar los datos
+    moving: bool = False  # Volcado o restauración en curso
+
+
+class SessionManager:
+    """
+    Aísla los datasets de cada sesión en un schema propio del DuckDB compartido,
+    con presupuesto de memoria por sesión. Las sesiones inactivas más allá del TTL
+    se vuelcan a Parquet y se restauran (sin re-perfilar) en el siguiente acceso.
+    """
+
+    def __init__(
+        self,
+        adapter: DuckDBAdapter,
+        memory_budget_bytes: int = SESSION_MEMORY_BYTES,
+        idle_ttl_s: float = SESSION_IDLE_TTL_S,
+        spill_dir: Optional[str] = SESSION_SPILL_DIR,
+    ):
+        self.adapter = adapter
+        self.memory_budget_bytes = memory_budget_bytes
+        self.idle_ttl_s = idle_ttl_s
+        self.spill_dir = spill_dir or None
+        self._sessions: Dict[str, SessionInfo] = {}
+        self._handles: Dict[str, 'DatasetSession'] = {}
+        self._lock = threading.Lock()
+
+    async def acquire(self, session_id: str) -> 'DatasetSession':
+        """Proveedor de datos de la sesión (se crea en el primer acceso)"""
+        await self.sweep()
+        with self._lock:
+            info = self._sessions.get(session_id)
+            created = info is None
+            if created:
+                info = self._sessions[session_id] = SessionInfo(namespace=f"s_{uuid.uuid4().hex[:16]}")
+                self._handles[session_id] = DatasetSession(self, info)
+            handle = self._handles[session_id]
+        if created:
+            await self.adapter.create_namespace(info.namespace)
+        await self._ensure_live(info)
+        return handle
+
+    async def release(self, session_id: str) -> None:
+        """Elimina la sesión: tablas, volcados y estado"""
+        with self._lock:
+            info = self._sessions.pop(session_id, None)
+            self._handles.pop(session_id, None)
+        if info is None:
+            return
+        await self.adapter.drop_namespace(info.namespace)
+        self._remove_spill(info)
+
+    async def sweep(self) -> int:
+        """Saca de memoria las sesiones inactivas más allá del TTL. Retorna cuántas"""
+        if self.adapter.persistent:
+            # Con base en archivo las tablas ya viven en disco: DuckDB libera sus páginas solo
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                info for info in self._sessions.values()
+                if not info.moving
+                and now - info.last_access > self.idle_ttl_s
+                and self.adapter.namespace_schemas(info.namespace)
+            ]
+            for info in idle:
+                info.moving = True
+        for info in idle:
+            try:
+                await self._spill(info)
+            finally:
+                info.moving = False
+        return len(idle)
+
+    def usage_bytes(self, info: SessionInfo) -> int:
+        """Tablas de la sesión más sus muestras del modo aproximado (proporcionales a sus filas)"""
+        total = 0
+        for table, schema in self.adapter.namespace_schemas(info.namespace).items():
+            size = estimate_table_bytes(schema)
+            sample_rows = self.adapter.sample_rows(table, info.namespace)
+            total += size + (size * sample_rows // schema.row_count if schema.row_count else 0)
+        return total
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Vista de las sesiones para depuración: memoria estimada, inactividad y volcados"""
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            info.namespace: {
+                "tables": sorted(self.adapter.namespace_schemas(info.namespace)),
+                "memory_mb": round(self.usage_bytes(info) / 1024 / 1024, 1),
+                "idle_s": int(now - info.last_access),
+                "spilled": sorted(info.spilled),
+                "evicted": info.evicted,
+            }
+            for info in sessions
+        }
+
+    async def _ensure_live(self, info: SessionInfo) -> None:
+        """Marca el acceso y restaura los datasets volcados de la sesión"""
+        while True:
+            with self._lock:
+                info.last_access = time.monotonic()
+                if not info.moving:
+                    if not info.spilled:
+                        return
+                    info.moving = True
+                    break
+            # Otra petición está volcando o restaurando esta sesión
+            await asyncio.sleep(0.05)
+        try:
+            for table in list(info.spilled):
+                path, schema = info.spilled[table]
+                await self.adapter.restore_table(path, schema, info.namespace)
+                del info.spilled[table]
+            self._remove_spill(info)
+        finally:
+            info.moving = False
+
+    async def _spill(self, info: SessionInfo) -> None:
+        target = os.path.join(self.spill_dir, info.namespace) if self.spill_dir else None
+        if target:
+            os.makedirs(target, exist_ok=True)
+        for table, schema in self.adapter.namespace_schemas(info.namespace).items():
+            if target:
+                path = os.path.join(target, f"{table}.parquet")
+                await self.adapter.export_table(schema.table_name, path, info.namespace)
+                info.spilled[table] = (path, schema)
+            else:
+                info.evicted = True
+            await self.adapter.drop_table(schema.table_name, info.namespace)
+
+    def _remove_spill(self, info: SessionInfo) -> None:
+        if self.spill_dir:
+            shutil.rmtree(os.path.join(self.spill_dir, info.namespace), ignore_errors=True)
+
+    async def _check_budget(self, info: SessionInfo, table_name: str) -> None:
+        usage = self.usage_bytes(info)
+        if usage <= self.memory_budget_bytes:
+            return
+        await self.adapter.drop_table(table_name, info.namespace)
+        raise SessionBudgetError(
+            f"El dataset excede el presupuesto de la sesión "
+            f"(~{usage / 1024 / 1024:.0f} MB de {self.memory_budget_bytes / 1024 / 1024:.0f} MB). "
+            "Carga menos columnas o filtra las filas."
+        )
+
+
+class DatasetSession(DataProviderPort):
+    """
+    Proveedor de datos acotado al namespace de una sesión.
+    Mismo contrato que DuckDBAdapter: el grafo y la UI lo usan sin saber que comparten instancia.
+    """
+
+    def __init__(self, manager: SessionManager, info: SessionInfo):
+        self._manager = manager
+        self._info = info
+        self._adapter = manager.adapter
+
+    @property
+    def namespace(self) -> str:
+        return self._info.namespace
+
+    @property
+    def query_timeout_s(self) -> float:
+        return self._adapter.query_timeout_s
+
+    @property
+    def usage_bytes(self) -> int:
+        """Memoria estimada de los datasets de la sesión"""
+        return self._manager.usage_bytes(self._info)
+
+    @property
+    def is_evicted(self) -> bool:
+        """True si los datos se descartaron por inactividad y hay que volver a cargarlos"""
+        return self._info.evicted and not self._adapter.namespace_schemas(self.namespace)
+
+    async def load_file(
+        self,
+        file_path: str,
+        table_name: str,
+        columns: Optional[List[str]] = None,
+        where: Optional[str] = None,
+        as_view: bool = False,
+    ) -> DatasetSchema:
+        await self._manager._ensure_live(self._info)
+        schema = await self._adapter.load_file(file_path, table_name, columns, where, as_view, namespace=self.namespace)
+        await self._loaded(table_name)
+        return schema
+
+    async def load_buffer(
+        self,
+        data: Union[bytes, bytearray, memoryview, BinaryIO],
+        file_name: str,
+        table_name: str,
+        columns: Optional[List[str]] = None,
+        where: Optional[str] = None,
+    ) -> DatasetSchema:
+        await self._manager._ensure_live(self._info)
+        schema = await self._adapter.load_buffer(data, file_name, table_name, columns, where, namespace=self.namespace)
+        await self._loaded(table_name)
+        return schema
+
+    async def attach_dataset(self, key: str, table_name: str) -> DatasetSchema:
+        """Abre en la sesión un dataset cargado previamente (vista, sin copiar datos)"""
+        await self._manager._ensure_live(self._info)
+        schema = await self._adapter.attach_dataset(key, table_name, namespace=self.namespace)
+        self._info.evicted = False
+        return schema
+
+    def list_datasets(self) -> List[StoredDataset]:
+        return self._adapter.list_datasets()
+
+    async def get_schema(self, table_name: str) -> DatasetSchema:
+        await self._manager._ensure_live(self._info)
+        return await self._adapter.get_schema(table_name, namespace=self.namespace)
+
+    async def execute_query(
+        self,
+        query: SQLQuery,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        timeout_s: Optional[float] = None,
+        approximate: bool = False,
+    ) -> QueryResult:
+        await self._manager._ensure_live(self._info)
+        return await self._adapter.execute_query(
+            query, max_rows, max_bytes, timeout_s, namespace=self.namespace, approximate=approximate
+        )
+
+    def submit_exact(self, query: SQLQuery) -> 'Future[QueryResult]':
+        """Resultado exacto en segundo plano (refina un resultado aproximado)"""
+        return self._adapter.submit_exact(query, namespace=self.namespace)
+
+    async def fetch_page(self, query: SQLQuery, offset: int, limit: int) -> QueryResult:
+        await self._manager._ensure_live(self._info)
+        return await self._adapter.fetch_page(query, offset, limit, namespace=self.namespace)
+
+    def catalog_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        prefix = f"{self.namespace}."
+        return {
+            name[len(prefix):]: entry
+            for name, entry in self._adapter.catalog_snapshot().items()
+            if name.startswith(prefix)
+        }
+
+    async def _loaded(self, table_name: str) -> None:
+        self._info.evicted = False
+        await self._manager._check_budget(self._info, table_name)
+
+
+def estimate_table_bytes(schema: DatasetSchema) -> int:
+    """Tamaño en memoria estimado a partir de filas y tipos (sin escanear la tabla)"""
+    width = sum(
+        _TYPE_WIDTHS.get(dtype.split("(")[0].strip().upper(), _DEFAULT_WIDTH)
+        for dtype in schema.columns.values()
+    )
+    return schema.row_count * width
@@ -1,4 +1,6 @@
 # infrastructure/security/sql_sanitizer.py
+from functools import lru_cache
+
 import sqlglot
 from sqlglot import exp
 from domain.value_objects.sql_query import SQLQuery
@@ -8,6 +10,17 @@ class SQLSanitizer:
     Componente de seguridad infraestructural.
     Analiza el AST (Abstract Syntax Tree) de la query para asegurar que sea inocua.
     """
+
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def parse(sql: str) -> exp.Expression:
+        """
+        AST de la query en dialecto DuckDB, memoizado por texto: validación, caché de
+        resultados, rollups y modo aproximado comparten un único parseo por query.
+        El árbol es compartido: quien necesite modificarlo debe trabajar sobre `.copy()`.
+        Lanza sqlglot.errors.ParseError si la query no es válida.
+        """
+        return sqlglot.parse_one(sql.strip().rstrip(';'), read="duckdb")
     
     @staticmethod
     def validate_query(query: SQLQuery) -> SQLQuery:
@@ -19,7 +32,7 @@ class SQLSanitizer:
         try:
             # 1. Parsear SQL (esto valida sintaxis automáticamente)
             # read="duckdb" se asegura que se entiende el dialecto específico
-            parsed = sqlglot.parse_one(sql_text, read="duckdb")
+            parsed = SQLSanitizer.parse(sql_text)
             
             # 2. Se Verifica que el nodo raíz sea SELECT
             # Esto bloquea DROP, DELETE, INSERT, UPDATE, ALTER, etc.
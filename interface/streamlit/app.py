@@ -2,8 +2,10 @@ import sys
 import os
 import asyncio
 import uuid
+from decimal import Decimal
 from pathlib import Path
-import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
@@ -15,8 +17,19 @@ project_root = current_file.parent.parent.parent
 sys.path.append(str(project_root))
 
 from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+from infrastructure.persistence.ingestion_cache import IngestionCache
+from infrastructure.persistence.query_cache import QueryResultCache
+from infrastructure.persistence.rollup_manager import RollupManager
+from infrastructure.persistence.semantic_cache import SemanticSQLCache
+from infrastructure.persistence.session_manager import SessionManager
+from infrastructure.llm.hybrid_factory import HybridLLMFactory
 from application.graph import build_analyst_graph
 from application.nodes import AgentNodes
+from application.prefetch import SUGGESTION_PREFETCH, SUGGESTION_PREFETCH_WAIT_S, SuggestionPrefetcher
+from application.schema_pruning import schema_context
+from application.sql_repair import SQL_LOCAL_REPAIR, SQLRepairer
+from infrastructure.security.sql_sanitizer import SQLSanitizer
+from domain.value_objects.sql_query import SQLQuery
 
 # --- 2. CONFIGURACIÓN UI ---
 st.set_page_config(
@@ -86,38 +99,109 @@ st.markdown("""
 
 # --- 3. SINGLETONS ---
 @st.cache_resource
-def get_infra(): return DuckDBAdapter(db_path=":memory:")
+def get_infra():
+    cache = IngestionCache(
+        cache_dir=os.getenv("INGEST_CACHE_DIR", ".ingest_cache"),
+        max_bytes=int(os.getenv("INGEST_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+    )
+    result_cache = QueryResultCache(max_bytes=int(os.getenv("QUERY_CACHE_MAX_MB", "256")) * 1024 * 1024)
+    # DUCKDB_PATH con un archivo .duckdb: los datasets sobreviven a reinicios y redeploys
+    db_path = os.getenv("DUCKDB_PATH") or ":memory:"
+    return DuckDBAdapter(db_path=db_path, ingestion_cache=cache, result_cache=result_cache, rollups=RollupManager())
 
 @st.cache_resource
-def get_agent(_db): return build_analyst_graph(_db)
+def get_sessions(): return SessionManager(get_infra())
 
 @st.cache_resource
-def get_nodes(_db): return AgentNodes(_db)
+def get_sql_cache(): return SemanticSQLCache()
+
+@st.cache_resource
+def get_sql_repairer(): return SQLRepairer() if SQL_LOCAL_REPAIR else None
+
+def get_loop():
+    """Event loop persistente de la sesión: los clientes LLM y sus conexiones se reutilizan entre preguntas."""
+    loop = st.session_state.get("event_loop")
+    if loop is None or loop.is_closed():
+        loop = st.session_state["event_loop"] = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+def get_session():
+    """Datos de la sesión de navegador actual: namespace propio en el DuckDB compartido."""
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    loop = get_loop()
+    return loop.run_until_complete(get_sessions().acquire(session_id))
+
+def get_agent(session):
+    if "agent" not in st.session_state: st.session_state["agent"] = build_analyst_graph(session, get_sql_cache(), sql_repairer=get_sql_repairer())
+    return st.session_state["agent"]
+
+def get_nodes(session):
+    if "nodes" not in st.session_state: st.session_state["nodes"] = AgentNodes(session, get_sql_cache(), get_sql_repairer())
+    return st.session_state["nodes"]
+
+def get_prefetcher(session):
+    if "prefetcher" not in st.session_state: st.session_state["prefetcher"] = SuggestionPrefetcher(get_agent(session))
+    return st.session_state["prefetcher"]
+
+def activate_dataset(session, schema, loop):
+    """Deja el dataset listo para el chat: esquema en la sesión y sugerencias."""
+    st.session_state["current_schema"] = schema.get_context_for_llm()
+    st.session_state["schema_fingerprint"] = schema.fingerprint()
+    st.session_state["dataset_schema"] = schema
+    nodes = get_nodes(session)
+    # El warm-up de los clientes LLM corre en paralelo a las sugerencias: la primera pregunta ya no lo paga
+    suggestions, _ = loop.run_until_complete(asyncio.gather(
+        # Tablas anchas: las sugerencias se basan en las columnas informativas, no en todas
+        nodes.generate_suggestions(schema_context(schema)),
+        HybridLLMFactory.warm_up(),
+    ))
+    st.session_state["suggestions"] = suggestions
+    if SUGGESTION_PREFETCH:
+        # Las sugerencias se responden en segundo plano: al pulsarlas, la respuesta ya está
+        get_prefetcher(session).start(suggestions.get("questions", []), {
+            "schema_info": st.session_state["current_schema"],
+            "schema_fingerprint": st.session_state["schema_fingerprint"],
+            "dataset_schema": schema,
+        })
 
 # --- 4. LÓGICA VISUAL ---
+PAGE_SIZE = 1000
+
+def is_numeric(table, col):
+    """Tipo numérico según el esquema Arrow."""
+    dtype = table.schema.field(col).type
+    return pa.types.is_integer(dtype) or pa.types.is_floating(dtype) or pa.types.is_decimal(dtype)
+
+def to_csv_bytes(table):
+    """Exporta la tabla Arrow a CSV sin pasar por pandas."""
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(table, sink)
+    return sink.getvalue().to_pybytes()
 
 def render_chart(df, config, key_suffix=""):
-    """Genera gráficos Plotly."""
+    """Genera gráficos Plotly (Plotly consume la tabla Arrow directamente)."""
     try:
         chart_type = config.get("chart_type")
         title = config.get("title", "Visualización")
-        cols = df.columns.tolist()
+        cols = df.column_names
         x_col, y_col = config.get("x_column"), config.get("y_column")
         
         if x_col not in cols: x_col = cols[0]
         if y_col not in cols and len(cols) > 1: y_col = cols[1]
+        color_col = config.get("color_column") if config.get("color_column") in cols else None
 
         common = dict(template="plotly_dark", height=450)
 
         if chart_type == "bar": fig = px.bar(df, x=x_col, y=y_col, title=title, color=x_col, **common)
-        elif chart_type == "line": fig = px.line(df, x=x_col, y=y_col, title=title, markers=True, **common)
-        elif chart_type == "scatter": fig = px.scatter(df, x=x_col, y=y_col, title=title, size=y_col if pd.api.types.is_numeric_dtype(df[y_col]) else None, **common)
+        elif chart_type == "line": fig = px.line(df, x=x_col, y=y_col, color=color_col, title=title, markers=True, **common)
+        elif chart_type == "scatter": fig = px.scatter(df, x=x_col, y=y_col, title=title, size=y_col if is_numeric(df, y_col) else None, **common)
         elif chart_type == "pie": fig = px.pie(df, names=x_col, values=y_col, title=title, template="plotly_dark")
         elif chart_type == "histogram": 
             fig = px.histogram(df, x=x_col, title=title, **common)
             fig.update_layout(bargap=0.1)
         elif chart_type == "box":
-            fig = px.box(df, y=x_col, title=title, **common) if pd.api.types.is_numeric_dtype(df[x_col]) else px.box(df, x=x_col, y=y_col, title=title, **common)
+            fig = px.box(df, y=x_col, title=title, **common) if is_numeric(df, x_col) else px.box(df, x=x_col, y=y_col, title=title, **common)
         else: return
 
         st.plotly_chart(fig, use_container_width=True, key=f"chart_{uuid.uuid4()}_{key_suffix}")
@@ -125,30 +209,55 @@ def render_chart(df, config, key_suffix=""):
     except Exception as e:
         st.warning(f"⚠️ Error gráfico: {str(e)}")
 
+def render_pages(result, key_suffix):
+    """Navegación por páginas de un resultado truncado (se consulta bajo demanda)."""
+    with st.expander("📄 Explorar resultado completo"):
+        pages = max(1, -(-(result.total_rows or result.num_rows) // PAGE_SIZE))
+        page = st.number_input("Página", min_value=1, max_value=pages, value=1, key=f"page_{key_suffix}")
+        if st.button("Cargar página", key=f"load_page_{key_suffix}"):
+            query = SQLSanitizer.validate_query(SQLQuery(result.source_sql))
+            loop = get_loop()
+            page_data = loop.run_until_complete(get_session().fetch_page(query, (page - 1) * PAGE_SIZE, PAGE_SIZE))
+            st.dataframe(page_data.table, use_container_width=True)
+
 def render_message(msg, index):
     """Renderiza un mensaje del chat."""
     role, content = msg["role"], msg.get("content", "")
-    viz_config, raw_data = msg.get("viz_config", {}), msg.get("data", [])
+    viz_config, raw_data = msg.get("viz_config", {}), msg.get("data")
 
     with st.chat_message(role):
         if content: st.markdown(content)
+        if msg.get("prefetched"): st.caption("🔮 Respuesta precalculada al cargar el dataset.")
         
-        if raw_data and isinstance(raw_data, list) and len(raw_data) > 0:
-            df_viz = pd.DataFrame(raw_data)
+        if raw_data:
+            df_viz = raw_data.table
+            
+            # Resultado estimado sobre una muestra: aviso mientras llega el exacto
+            if raw_data.approximate:
+                st.caption(f"≈ {raw_data.approx_note()}")
+                if "exact" in msg: st.caption("⏳ Calculando resultado exacto...")
+            elif msg.get("refined"):
+                st.caption("✅ Datos actualizados con el resultado exacto.")
+
+            # Resultado parcial: aviso + acceso paginado al resto
+            if raw_data.truncated:
+                st.caption(f"⚠️ {raw_data.partial_note()}")
+                render_pages(raw_data, index)
             
             # A. KPIs
             if len(df_viz) == 1:
                 st.markdown("---")
-                cols = st.columns(min(len(df_viz.columns), 4))
-                for idx, col in enumerate(df_viz.columns[:4]):
-                    val = df_viz.iloc[0][col]
-                    d_val = f"{val:,.2f}" if isinstance(val, (int, float)) else str(val)
+                cols = st.columns(min(len(df_viz.column_names), 4))
+                for idx, col in enumerate(df_viz.column_names[:4]):
+                    val = df_viz.column(col)[0].as_py()
+                    # SUM sobre enteros llega como decimal128 desde DuckDB
+                    d_val = f"{val:,.2f}" if isinstance(val, (int, float, Decimal)) else str(val)
                     cols[idx].metric(col.replace("_", " ").title(), d_val)
             
             # B. Acciones (Descargar y Anclar)
             if len(df_viz) > 0:
                 c1, c2 = st.columns([1, 1])
-                csv = df_viz.to_csv(index=False).encode('utf-8')
+                csv = to_csv_bytes(df_viz)
                 c1.download_button("⬇️ CSV", csv, f"data_{index}.csv", "text/csv", key=f"dl_{index}")
                 
                 # BOTÓN DE PINNING
@@ -172,6 +281,36 @@ def render_message(msg, index):
                     st.divider()
                     render_chart(df_viz, viz_config, key_suffix=f"msg_{index}")
 
+def serve_prefetched(question):
+    """Muestra la respuesta precalculada de una sugerencia; False si hay que correr el grafo."""
+    if "prefetcher" not in st.session_state: return False
+    with st.spinner("🔮 Terminando la respuesta precalculada..."):
+        answer = st.session_state["prefetcher"].get(
+            question, st.session_state.get("schema_fingerprint", ""), timeout=SUGGESTION_PREFETCH_WAIT_S
+        )
+    if answer is None: return False
+    st.session_state["last_sql_memory"] = answer.sql
+    for msg in (
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": answer.content, "viz_config": answer.viz_config, "data": answer.data, "prefetched": True},
+    ):
+        st.session_state.chat_history.append(msg)
+        render_message(msg, len(st.session_state.chat_history)-1)
+    return True
+
+@st.fragment(run_every=2)
+def refine_results():
+    """Sustituye los resultados aproximados del chat por los exactos a medida que terminan."""
+    refined = False
+    for msg in st.session_state.get("chat_history", []):
+        future = msg.get("exact")
+        if future is None or not future.done(): continue
+        del msg["exact"]
+        if future.exception() is None:
+            msg["data"], msg["refined"] = future.result(), True
+            refined = True
+    if refined: st.rerun()
+
 def render_dashboard():
     """Renderiza la pestaña de Dashboard."""
     st.header("📌 Executive Dashboard")
@@ -198,8 +337,7 @@ def render_dashboard():
         with c1:
             item = charts[i]
             with st.container(border=True):
-                df = pd.DataFrame(item["data"])
-                render_chart(df, item["config"], key_suffix=f"dash_{item['id']}")
+                render_chart(item["data"].table, item["config"], key_suffix=f"dash_{item['id']}")
                 if st.button("❌ Quitar", key=f"del_{item['id']}"):
                     st.session_state["pinned_charts"].pop(i)
                     st.rerun()
@@ -209,43 +347,83 @@ def render_dashboard():
             with c2:
                 item = charts[i+1]
                 with st.container(border=True):
-                    df = pd.DataFrame(item["data"])
-                    render_chart(df, item["config"], key_suffix=f"dash_{item['id']}")
+                    render_chart(item["data"].table, item["config"], key_suffix=f"dash_{item['id']}")
                     if st.button("❌ Quitar", key=f"del_{item['id']}"):
                         st.session_state["pinned_charts"].pop(i+1)
                         st.rerun()
 
 # --- 5. MAIN ---
 def main():
+    session = get_session()
+    if session.is_evicted and "current_schema" in st.session_state:
+        # Los datos de la sesión se descartaron por inactividad
+        del st.session_state["current_schema"]
+        st.session_state.pop("dataset_schema", None)
+        get_prefetcher(session).cancel()
+        st.warning("⌛ Tu dataset expiró por inactividad. Vuelve a ingestarlo.")
+
     # --- SIDEBAR ---
     with st.sidebar:
         st.title("🤖 AI Analyst")
-        uploaded_file = st.file_uploader("Data Source", type=["csv", "xlsx"])
+        uploaded_file = st.file_uploader(
+            "Data Source", type=["csv", "xlsx", "parquet", "feather", "arrow", "jsonl", "ndjson"]
+        )
         
         if uploaded_file:
-            ext = os.path.splitext(uploaded_file.name)[1]
-            temp_path = f"temp_upload{ext}"
-            with open(temp_path, "wb") as f: f.write(uploaded_file.getbuffer())
-            
             db = get_infra()
             if st.button("🚀 Ingestar", type="primary", use_container_width=True):
                 with st.spinner("Procesando..."):
                     try:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        schema = loop.run_until_complete(db.load_file(temp_path, "dataset_usuario"))
-                        st.session_state["current_schema"] = schema.get_context_for_llm()
-                        
-                        nodes = get_nodes(db)
-                        suggestions = loop.run_until_complete(nodes.generate_suggestions(schema.get_context_for_llm()))
-                        st.session_state["suggestions"] = suggestions
-                        
+                        loop = get_loop()
+                        # Lo precalculado del dataset anterior no debe correr sobre el nuevo
+                        get_prefetcher(session).cancel()
+                        # Ingesta directa desde el buffer del upload (sin archivo temporal)
+                        schema = loop.run_until_complete(
+                            session.load_buffer(uploaded_file, uploaded_file.name, "dataset_usuario")
+                        )
+                        activate_dataset(session, schema, loop)
                         st.success("✅ Indexado")
                     except Exception as e: st.error(f"Error: {e}")
-            if os.path.exists(temp_path): os.remove(temp_path)
+
+            stats = db.ingestion_cache.stats
+            st.caption(f"🗄️ Caché de ingesta: {stats.hits} hits / {stats.misses} misses")
+            q_stats = db.result_cache.stats
+            st.caption(f"⚡ Caché de resultados: {q_stats.hit_rate:.0%} hit rate ({q_stats.hits}/{q_stats.hits + q_stats.misses})")
+            r_stats = db.rollups.stats
+            sql_stats = get_sql_cache().stats
+            st.caption(f"🧠 Caché de SQL: {sql_stats.hit_rate:.0%} hit rate ({sql_stats.hits}/{sql_stats.hits + sql_stats.misses}), {sql_stats.rejected} descartes por literales")
+            if SQL_LOCAL_REPAIR:
+                fix_stats = get_sql_repairer().stats
+                st.caption(f"🩹 Reparación local de SQL: {fix_stats.llm_calls_saved} llamadas al LLM ahorradas ({fix_stats.repaired}/{fix_stats.attempts} reparadas)")
+            p_stats = get_prefetcher(session).stats
+            if SUGGESTION_PREFETCH: st.caption(f"🔮 Sugerencias precalculadas: {p_stats.completed}/{p_stats.started} listas, {p_stats.served} servidas al instante")
+            st.caption(f"🧊 Rollups: {r_stats.rewrites} queries resueltas, {r_stats.rows_saved:,} filas sin escanear ({r_stats.saved_ratio:.0%})")
+            budget_mb = get_sessions().memory_budget_bytes / 1024 / 1024
+            st.caption(f"🧮 Memoria de la sesión: ~{session.usage_bytes / 1024 / 1024:.0f} / {budget_mb:.0f} MB")
+            with st.expander("🗂️ Catálogo de esquemas"):
+                st.json(session.catalog_snapshot())
+
+        # Biblioteca de datasets: solo con base persistente (sobreviven a los reinicios)
+        if get_infra().persistent and session.list_datasets():
+            st.divider()
+            labels = {d.key: d.label() for d in session.list_datasets()}
+            choice = st.selectbox("📚 Datasets guardados", list(labels), format_func=labels.get)
+            if st.button("📂 Abrir dataset", use_container_width=True):
+                with st.spinner("Abriendo..."):
+                    try:
+                        loop = get_loop()
+                        get_prefetcher(session).cancel()
+                        schema = loop.run_until_complete(session.attach_dataset(choice, "dataset_usuario"))
+                        activate_dataset(session, schema, loop)
+                        st.success("✅ Dataset abierto")
+                    except Exception as e: st.error(f"Error: {e}")
 
         if "current_schema" in st.session_state:
             st.divider()
+            st.toggle(
+                "⚡ Modo aproximado", key="approximate_mode",
+                help="En tablas muy grandes responde al instante sobre una muestra y luego refina con el resultado exacto.",
+            )
             if st.button("🗑️ Reset Chat", use_container_width=True):
                 st.session_state["chat_history"] = []
                 st.session_state["last_sql_memory"] = None
@@ -254,8 +432,9 @@ def main():
         if "suggestions" in st.session_state:
             st.divider()
             st.caption(st.session_state["suggestions"].get("summary", ""))
+            prefetcher = get_prefetcher(session)
             for q in st.session_state["suggestions"].get("questions", []):
-                if st.button(f"👉 {q}"):
+                if st.button(f"{'⚡' if prefetcher.is_ready(q) else '👉'} {q}"):
                     st.session_state["triggered_question"] = q
                     st.rerun()
 
@@ -274,38 +453,54 @@ def main():
         if user_input:
             if "current_schema" not in st.session_state:
                 st.warning("⚠️ Sube un archivo primero.")
-            else:
+            # Sugerencia ya respondida en segundo plano: se muestra sin esperar al grafo
+            elif not serve_prefetched(user_input):
                 user_msg = {"role": "user", "content": user_input}
                 st.session_state.chat_history.append(user_msg)
                 render_message(user_msg, len(st.session_state.chat_history)-1)
 
                 with st.chat_message("assistant"):
                     result = None
-                    with st.status("🧠 Analizando...", expanded=True) as status:
+                    # El análisis se escribe bajo el estado a medida que llegan los tokens
+                    status_box, answer_box = st.container(), st.empty()
+                    with status_box, st.status("🧠 Analizando...", expanded=True) as status:
                         lc_messages = []
                         for m in st.session_state.chat_history:
                             if m["role"] == "user": lc_messages.append(HumanMessage(content=m["content"]))
                             else: lc_messages.append(AIMessage(content=m.get("content", "")))
 
-                        db = get_infra()
-                        agent = get_agent(db)
+                        agent = get_agent(session)
                         state = {
                             "messages": lc_messages, 
                             "schema_info": st.session_state["current_schema"],
-                            "last_successful_sql": st.session_state.get("last_sql_memory")
+                            "schema_fingerprint": st.session_state.get("schema_fingerprint", ""),
+                            "dataset_schema": st.session_state.get("dataset_schema"),
+                            "last_successful_sql": st.session_state.get("last_sql_memory"),
+                            "approximate": st.session_state.get("approximate_mode", False),
                         }
-                        
-                        final_res = {"role": "assistant", "content": "", "viz_config": {}, "data": []}
+                    
+                        final_res = {"role": "assistant", "content": "", "viz_config": {}, "data": None}
 
                         async def run():
-                            async for event in agent.astream(state):
+                            streamed = ""
+                            async for mode, event in agent.astream(state, stream_mode=["updates", "custom"]):
+                                if mode == "custom":
+                                    streamed += event.get("analysis_delta", "")
+                                    answer_box.markdown(streamed + "▌")
+                                    continue
                                 for node, update in event.items():
                                     if "sql_query" in update: 
-                                        status.write("🔧 SQL generado...")
+                                        if update.get("sql_repaired"): status.write(f"🩹 SQL reparado sin LLM: {update['sql_repaired']}")
+                                        else: status.write("🧠 SQL reutilizado de una pregunta similar..." if update.get("sql_cache_hit") else "🔧 SQL generado...")
                                         status.code(update["sql_query"], language="sql")
-                                    if "error" in update and update["error"]: status.warning("⚠️ Corrigiendo...")
+                                    if update.get("error_type") == "timeout": status.warning("⏱️ Query demasiado costosa, buscando una alternativa...")
+                                    elif "error" in update and update["error"]: status.warning("⚠️ Corrigiendo...")
                                     if "execution_result" in update:
                                         status.write("✅ Datos obtenidos")
+                                        if update["execution_result"].truncated:
+                                            status.write(f"⚠️ {update['execution_result'].partial_note()}")
+                                        if update["execution_result"].approximate:
+                                            status.write(f"≈ {update['execution_result'].approx_note()}")
                                         final_res["data"] = update["execution_result"]
                                         if "last_successful_sql" in update:
                                             st.session_state["last_sql_memory"] = update["last_successful_sql"]
@@ -316,18 +511,24 @@ def main():
                             return final_res
 
                         try:
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
+                            loop = get_loop()
                             result = loop.run_until_complete(run())
                             status.update(label="✅ Listo", state="complete", expanded=False)
                         except Exception as e:
                             status.update(label="❌ Error", state="error")
                             st.error(f"Error: {e}")
 
+                    answer_box.empty()
                     if result:
+                        if result["data"] is not None and result["data"].approximate:
+                            # El exacto se calcula en segundo plano y reemplaza la estimación al terminar
+                            query = SQLSanitizer.validate_query(SQLQuery(result["data"].source_sql))
+                            result["exact"] = session.submit_exact(query)
                         st.session_state.chat_history.append(result)
                         render_message(result, len(st.session_state.chat_history)-1)
 
+        if any("exact" in m for m in st.session_state.chat_history): refine_results()
+
     # --- TAB 2: DASHBOARD ---
     with tab_dash:
         render_dashboard()
@@ -0,0 +1,87 @@
+# scripts_pruebas/bench_concurrency.py
+"""
+Benchmark de concurrencia: latencia del event loop y throughput de queries
+con ejecución bloqueante (conexión compartida en el loop) contra el executor
+con cursores por tarea de DuckDBAdapter.
+
+Uso: python scripts_pruebas/bench_concurrency.py [filas] [queries concurrentes]
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from domain.value_objects.sql_query import SQLQuery
+from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+
+HEAVY_QUERY = """
+    SELECT region, COUNT(DISTINCT cliente) AS clientes, SUM(monto) AS total
+    FROM ventas GROUP BY region ORDER BY total DESC
+"""
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Retraso máximo observado por un ticker en el event loop (ms)"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst * 1000
+
+
+async def measure(label: str, work) -> None:
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(loop_lag(stop))
+    await asyncio.sleep(0.02)  # El ticker arranca antes que la carga
+    start = time.perf_counter()
+    await work()
+    elapsed = (time.perf_counter() - start) * 1000
+    stop.set()
+    lag = await ticker
+    print(f"  {label:<40} {elapsed:>9.1f} ms   lag máx. del loop {lag:>8.1f} ms")
+
+
+async def main(rows: int, concurrency: int):
+    print(f"--- ⚙️ Benchmark de concurrencia ({rows:,} filas, {concurrency} queries) ---")
+    db = DuckDBAdapter()
+    db.conn.execute(f"""
+        CREATE TABLE ventas AS
+        SELECT
+            'region_' || (range % 50) AS region,
+            range % 200003 AS cliente,
+            (random() * 1000)::DOUBLE AS monto
+        FROM range({rows})
+    """)
+    query = SQLQuery(HEAVY_QUERY).mark_as_safe()
+
+    # 1. Línea base: la conexión compartida ejecuta en el hilo del event loop
+    async def blocking_single():
+        db.conn.execute(HEAVY_QUERY).fetch_arrow_table()
+
+    async def blocking_many():
+        for _ in range(concurrency):
+            db.conn.execute(HEAVY_QUERY).fetch_arrow_table()
+
+    await measure("Bloqueante, 1 query", blocking_single)
+    await measure(f"Bloqueante, {concurrency} queries en serie", blocking_many)
+
+    # 2. Executor + cursor por tarea (sin caché de resultados: siempre ejecuta)
+    async def pooled_single():
+        await db.execute_query(query)
+
+    async def pooled_many():
+        await asyncio.gather(*(db.execute_query(query) for _ in range(concurrency)))
+
+    await measure("Executor, 1 query", pooled_single)
+    await measure(f"Executor, {concurrency} queries concurrentes", pooled_many)
+    db.close()
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    asyncio.run(main(rows, concurrency))
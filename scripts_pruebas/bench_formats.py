@@ -0,0 +1,89 @@
+# scripts_pruebas/bench_formats.py
+"""
+Benchmark de ingesta: formatos nativos (Parquet, Arrow IPC, JSONL) contra
+el round-trip a CSV que usaban los pipelines (Parquet -> CSV -> load_file).
+
+Uso: python scripts_pruebas/bench_formats.py [filas]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import duckdb
+
+from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+
+
+def build_dataset(base_dir: str, rows: int) -> dict:
+    """Genera el mismo dataset sintético en todos los formatos"""
+    conn = duckdb.connect()
+    conn.execute(f"""
+        CREATE TABLE ventas AS
+        SELECT
+            range AS id,
+            'region_' || (range % 12) AS region,
+            (random() * 1000)::DOUBLE AS monto,
+            (range % 500)::INTEGER AS cantidad,
+            TIMESTAMP '2024-01-01' + INTERVAL (range % 365) DAY AS fecha
+        FROM range({rows})
+    """)
+    paths = {
+        "parquet": os.path.join(base_dir, "ventas.parquet"),
+        "arrow": os.path.join(base_dir, "ventas.arrow"),
+        "jsonl": os.path.join(base_dir, "ventas.jsonl"),
+    }
+    conn.execute(f"COPY ventas TO '{paths['parquet']}' (FORMAT PARQUET)")
+    conn.execute(f"COPY ventas TO '{paths['jsonl']}' (FORMAT JSON)")
+    import pyarrow.feather as feather
+    feather.write_feather(conn.execute("SELECT * FROM ventas").fetch_arrow_table(), paths["arrow"], compression="uncompressed")
+    return paths
+
+
+async def timed(label: str, coro) -> float:
+    start = time.perf_counter()
+    schema = await coro
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<42} {elapsed * 1000:>9.1f} ms   ({schema.row_count:,} filas, {len(schema.columns)} cols)")
+    return elapsed
+
+
+async def main(rows: int):
+    print(f"--- 📦 Benchmark de ingesta ({rows:,} filas) ---")
+    with tempfile.TemporaryDirectory() as base_dir:
+        paths = build_dataset(base_dir, rows)
+        db = DuckDBAdapter()
+
+        # 1. Línea base: el pipeline convertía Parquet a CSV antes de cargar
+        async def csv_round_trip():
+            csv_path = os.path.join(base_dir, "ventas.csv")
+            db.conn.execute(f"COPY (SELECT * FROM read_parquet('{paths['parquet']}')) TO '{csv_path}' (HEADER)")
+            return await db.load_file(csv_path, "t_csv")
+
+        await timed("CSV round-trip (Parquet -> CSV -> tabla)", csv_round_trip())
+
+        # 2. Lectores nativos
+        await timed("Parquet -> tabla", db.load_file(paths["parquet"], "t_parquet"))
+        await timed("Parquet -> vista (sin copia)", db.load_file(paths["parquet"], "v_parquet", as_view=True))
+        await timed("Arrow IPC -> tabla", db.load_file(paths["arrow"], "t_arrow"))
+        await timed("JSONL -> tabla", db.load_file(paths["jsonl"], "t_jsonl"))
+
+        # 3. Proyección + filtro empujados al lector
+        projection = ["region", "monto"]
+        predicate = "cantidad < 50"
+        await timed("Parquet proyección+filtro", db.load_file(paths["parquet"], "t_pq_push", projection, predicate))
+        await timed("Arrow IPC proyección+filtro", db.load_file(paths["arrow"], "t_ar_push", projection, predicate))
+        await timed("JSONL proyección+filtro", db.load_file(paths["jsonl"], "t_js_push", projection, predicate))
+
+        # 4. Tipos preservados (el CSV los re-infiere)
+        print("\n--- 🔎 Tipos ---")
+        print(f"  CSV:     {(await db.get_schema('t_csv')).columns}")
+        print(f"  Parquet: {(await db.get_schema('t_parquet')).columns}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
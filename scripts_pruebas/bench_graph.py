@@ -0,0 +1,386 @@
+# scripts_pruebas/bench_graph.py
+"""
+Benchmark extremo a extremo de `build_analyst_graph` sin red ni API keys.
+
+El LLM es un ScriptedChatModel (vía HybridLLMFactory.override) con latencia
+configurable y respuestas guionizadas por nodo: SQL, análisis en streaming y JSON
+de gráfico. Los escenarios incluyen SQL con errores (columna inexistente, columna
+mal escrita que se repara sin LLM, SQL inseguro) para medir el coste de los reintentos.
+
+Cada tamaño de dataset sintético (por defecto 10k, 1M y 10M filas) corre en un
+proceso aparte para aislar su RSS pico. Reporta por dataset: ingesta, latencia
+extremo a extremo y por nodo (p50/p95/p99), primer token del análisis, llamadas al
+LLM por nodo, reintentos, SQL reparados localmente y RSS pico. Con --output guarda el JSON y con --baseline
+lo compara contra una corrida anterior (sale con error si alguna latencia p95
+empeora más que --tolerance).
+
+Uso: python scripts_pruebas/bench_graph.py [--rows 10000 1000000 10000000]
+         [--iterations 5] [--latency-ms 200] [--token-delay-ms 0] [--serial]
+         [--output bench.json] [--baseline bench_anterior.json] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import duckdb
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from application.graph import build_analyst_graph
+from application.sql_repair import SQLRepairer
+from infrastructure.llm.hybrid_factory import HybridLLMFactory
+from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+from scripted_chat import ScriptedChatModel
+
+DEFAULT_ROWS = (10_000, 1_000_000, 10_000_000)
+TABLE = "dataset_usuario"
+FAILED_MARK = "La query anterior falló"  # Mensaje de reintento de generate_sql
+
+
+@dataclass(frozen=True, slots=True)
+class Scenario:
+    """Pregunta y SQL que "genera" el LLM en cada intento (el último es el correcto)"""
+    name: str
+    question: str
+    sql: Tuple[str, ...]
+
+
+SCENARIOS = (
+    Scenario("agregado", "¿Ventas totales por región?", (
+        f"SELECT region, SUM(ventas) AS total FROM {TABLE} GROUP BY region ORDER BY total DESC",
+    )),
+    Scenario("serie_mensual", "Evolución mensual de las ventas", (
+        f"SELECT date_trunc('month', fecha) AS mes, SUM(ventas) AS total FROM {TABLE} GROUP BY mes ORDER BY mes",
+    )),
+    Scenario("top_productos", "Los 10 productos con más unidades vendidas", (
+        f"SELECT producto, SUM(unidades) AS unidades FROM {TABLE} GROUP BY producto ORDER BY unidades DESC LIMIT 10",
+    )),
+    # 500 categorías: las reglas no deciden el gráfico y lo pide al LLM (respuesta JSON)
+    Scenario("muchas_categorias", "Ventas de cada producto", (
+        f"SELECT producto, SUM(ventas) AS total FROM {TABLE} GROUP BY producto",
+    )),
+    Scenario("kpi", "Ticket promedio y ventas máximas", (
+        f"SELECT AVG(ventas) AS ticket_promedio, MAX(ventas) AS venta_maxima FROM {TABLE}",
+    )),
+    Scenario("columna_inexistente", "Ventas por canal", (
+        f"SELECT canal_venta, SUM(ventas) AS total FROM {TABLE} GROUP BY canal_venta",
+        f"SELECT canal, SUM(ventas) AS total FROM {TABLE} GROUP BY canal ORDER BY total DESC",
+    )),
+    # Error mecánico: la reparación local lo corrige sin pedir el segundo SQL al LLM
+    Scenario("columna_mal_escrita", "Ventas por región de mayor a menor", (
+        f"SELECT regoin, SUM(ventas) AS total FROM {TABLE} GROUP BY regoin ORDER BY total DESC",
+        f"SELECT region, SUM(ventas) AS total FROM {TABLE} GROUP BY region ORDER BY total DESC",
+    )),
+    Scenario("sql_inseguro", "Borra las ventas de prueba y dame el total", (
+        f"DELETE FROM {TABLE} WHERE ventas < 0",
+        f"SELECT SUM(ventas) AS total FROM {TABLE}",
+    )),
+)
+ANALYSIS = (
+    "La región Norte concentra la mayor parte de las ventas, seguida de Sur y Centro; "
+    "las diferencias entre regiones son menores al 5%."
+)
+VIZ = '{"chart_type": "bar", "x_column": "%s", "y_column": "%s", "title": "Benchmark"}'
+
+
+class NodeTimer(AsyncCallbackHandler):
+    """Duración de cada nodo y llamadas al LLM por nodo (callbacks de LangGraph)"""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.llm_calls: Dict[str, int] = defaultdict(int)
+        self._open: Dict[Any, Tuple[str, float]] = {}
+
+    async def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # Solo el runnable del nodo (no sus aristas condicionales ni el grafo)
+        if node and kwargs.get("name") == node:
+            self._open[run_id] = (node, time.perf_counter())
+
+    async def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._close(run_id)
+
+    async def on_chain_error(self, error, *, run_id, **kwargs):
+        self._close(run_id)
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self.llm_calls[(metadata or {}).get("langgraph_node", "?")] += 1
+
+    def _close(self, run_id):
+        opened = self._open.pop(run_id, None)
+        if opened is not None:
+            self.durations[opened[0]].append(time.perf_counter() - opened[1])
+
+
+def scripted_response(messages) -> str:
+    """Respuesta del nodo que llama, deducida de su prompt"""
+    prompt = messages[0].content
+    if "query SQL" in prompt:
+        last = messages[-1].content
+        scenario = next((s for s in SCENARIOS if s.question in last), SCENARIOS[0])
+        attempt = 1 if FAILED_MARK in last else 0
+        return scenario.sql[min(attempt, len(scenario.sql) - 1)]
+    if "chart_type" in prompt:
+        columns = _data_columns(prompt)
+        return VIZ % (columns[0], columns[-1]) if columns else '{"chart_type": "none"}'
+    return ANALYSIS
+
+
+def _data_columns(prompt: str) -> List[str]:
+    """Columnas de la muestra de datos del prompt de visualización"""
+    start = prompt.find("[{")
+    end = prompt.find("}", start)
+    if start < 0 or end < 0:
+        return []
+    return [part.split(":")[0].strip(" '\"") for part in prompt[start + 2:end].split(", '")]
+
+
+def write_dataset(path: str, rows: int) -> None:
+    """Ventas sintéticas en Parquet, generadas por DuckDB (10M filas en segundos)"""
+    con = duckdb.connect()
+    con.execute("SET enable_progress_bar = false")
+    con.execute(f"""
+        COPY (
+            SELECT
+                DATE '2024-01-01' + CAST(i % 730 AS INTEGER) AS fecha,
+                ['Norte', 'Sur', 'Este', 'Oeste', 'Centro'][1 + i % 5] AS region,
+                ['Online', 'Tienda', 'Mayorista'][1 + (i * 7) % 3] AS canal,
+                'P' || lpad(CAST(i % 500 AS VARCHAR), 3, '0') AS producto,
+                round(5 + (hash(i) % 100000) / 100.0, 2) AS ventas,
+                CAST(1 + hash(i * 31) % 20 AS INTEGER) AS unidades
+            FROM range({int(rows)}) t(i)
+        ) TO '{path}' (FORMAT parquet)
+    """)
+    con.close()
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99 (rango más cercano) y media, en milisegundos"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "n": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_dataset(rows: int, iterations: int, latency_ms: float, token_delay_ms: float, parallel: bool) -> Dict[str, Any]:
+    """Un tamaño de dataset completo; corre en su propio proceso (RSS pico aislado)"""
+    # Los nodos imprimen su progreso: en el benchmark solo ensucia la salida
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(_run_dataset(rows, iterations, latency_ms, token_delay_ms, parallel))
+
+
+async def _run_dataset(rows: int, iterations: int, latency_ms: float, token_delay_ms: float, parallel: bool):
+    HybridLLMFactory.override(ScriptedChatModel(
+        provider="bench",
+        latencies=[latency_ms / 1000],
+        responder=scripted_response,
+        token_delay_s=token_delay_ms / 1000,
+    ))
+    db = DuckDBAdapter()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ventas.parquet")
+        write_dataset(path, rows)
+        start = time.perf_counter()
+        schema = await db.load_file(path, TABLE)
+        load_s = time.perf_counter() - start
+    rss_after_load = peak_rss_mb()
+
+    repairer = SQLRepairer()
+    agent = build_analyst_graph(db, parallel_outputs=parallel, sql_repairer=repairer)
+    timer = NodeTimer()
+    end_to_end: List[float] = []
+    first_token: List[float] = []
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    for scenario in SCENARIOS:
+        latencies, retries, failures = [], 0, 0
+        # La primera corrida calienta cachés (planes de DuckDB, esquema podado) y no se mide
+        for i in range(iterations + 1):
+            measured = i > 0
+            state = {
+                "messages": [HumanMessage(content=scenario.question)],
+                "schema_info": schema.get_context_for_llm(),
+                "schema_fingerprint": schema.fingerprint(),
+                "dataset_schema": schema,
+                "last_successful_sql": None,
+            }
+            config = {"callbacks": [timer]} if measured else {}
+            final: Dict[str, Any] = {}
+            ttft = None
+            start = time.perf_counter()
+            async for mode, event in agent.astream(state, config, stream_mode=["updates", "custom"]):
+                if mode == "custom":
+                    ttft = ttft or time.perf_counter() - start
+                    continue
+                for update in event.values():
+                    final.update(update or {})
+            elapsed = time.perf_counter() - start
+            if not measured:
+                continue
+            latencies.append(elapsed)
+            end_to_end.append(elapsed)
+            if ttft is not None:
+                first_token.append(ttft)
+            retries += max(0, final.get("retry_count", 1) - 1)
+            failures += 1 if final.get("error") else 0
+        scenarios[scenario.name] = {
+            "latency": percentiles(latencies),
+            "retries": retries,
+            "retries_per_question": round(retries / iterations, 2),
+            "failed_questions": failures,
+        }
+
+    HybridLLMFactory.override(None)
+    db.close()
+    return {
+        "rows": rows,
+        "load_s": round(load_s, 3),
+        "end_to_end": percentiles(end_to_end),
+        "analysis_first_token": percentiles(first_token),
+        "nodes": {node: percentiles(values) for node, values in sorted(timer.durations.items())},
+        "llm_calls": dict(sorted(timer.llm_calls.items())),
+        "retries": sum(s["retries"] for s in scenarios.values()),
+        "sql_repair": {
+            "attempts": repairer.stats.attempts,
+            "repaired": repairer.stats.repaired,
+            "llm_calls_saved": repairer.stats.llm_calls_saved,
+        },
+        "scenarios": scenarios,
+        "peak_rss_mb": {"after_load": rss_after_load, "total": peak_rss_mb()},
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Latencias p95 que empeoran más que `tolerance` respecto de la corrida base"""
+    regressions = []
+    previous = {d["rows"]: d for d in baseline.get("datasets", [])}
+    for dataset in report["datasets"]:
+        before = previous.get(dataset["rows"])
+        if before is None:
+            continue
+        pairs = [("end_to_end", dataset["end_to_end"], before.get("end_to_end", {}))]
+        pairs += [(f"node:{n}", v, before.get("nodes", {}).get(n, {})) for n, v in dataset["nodes"].items()]
+        for label, now, old in pairs:
+            if old.get("p95_ms") and now.get("p95_ms", 0) > old["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{dataset['rows']:,} filas {label}: p95 {old['p95_ms']:.1f} → {now['p95_ms']:.1f} ms"
+                )
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_dataset(dataset: Dict[str, Any]) -> None:
+    e2e = dataset["end_to_end"]
+    print(
+        f"\n📦 {dataset['rows']:,} filas  (ingesta {dataset['load_s']:.2f} s, "
+        f"RSS pico {dataset['peak_rss_mb']['total']:.0f} MB, reintentos {dataset['retries']}, "
+        f"SQL reparados sin LLM {dataset['sql_repair']['llm_calls_saved']})"
+    )
+    print(f"  {'extremo a extremo':<22} p50 {e2e['p50_ms']:8.1f}  p95 {e2e['p95_ms']:8.1f}  p99 {e2e['p99_ms']:8.1f} ms")
+    if dataset["analysis_first_token"]:
+        ttft = dataset["analysis_first_token"]
+        print(f"  {'primer token análisis':<22} p50 {ttft['p50_ms']:8.1f}  p95 {ttft['p95_ms']:8.1f}  p99 {ttft['p99_ms']:8.1f} ms")
+    for node, stats in dataset["nodes"].items():
+        calls = dataset["llm_calls"].get(node, 0)
+        print(
+            f"  {node:<22} p50 {stats['p50_ms']:8.1f}  p95 {stats['p95_ms']:8.1f}  p99 {stats['p99_ms']:8.1f} ms"
+            f"  (n={stats['n']}, LLM {calls})"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del grafo con LLM guionizado")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(DEFAULT_ROWS))
+    parser.add_argument("--iterations", type=int, default=5, help="Corridas medidas por escenario")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latencia por llamada al LLM")
+    parser.add_argument("--token-delay-ms", type=float, default=0, help="Retardo entre tokens del streaming")
+    parser.add_argument("--serial", action="store_true", help="Análisis y gráfico en serie (flujo anterior)")
+    parser.add_argument("--output", help="Archivo JSON con el reporte")
+    parser.add_argument("--baseline", help="Reporte JSON anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento p95 tolerado (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    print(
+        f"--- 🏁 Benchmark del grafo ({len(SCENARIOS)} escenarios x {args.iterations} corridas, "
+        f"LLM {args.latency_ms:g} ms/llamada, {'serie' if args.serial else 'fan-out'}) ---"
+    )
+    report: Dict[str, Any] = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "iterations": args.iterations,
+            "llm_latency_ms": args.latency_ms,
+            "token_delay_ms": args.token_delay_ms,
+            "parallel_outputs": not args.serial,
+            "scenarios": [s.name for s in SCENARIOS],
+        },
+        "datasets": [],
+    }
+    # spawn: cada proceso arranca limpio y su ru_maxrss es solo suyo
+    context = multiprocessing.get_context("spawn")
+    for rows in args.rows:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            dataset = pool.submit(
+                run_dataset, rows, args.iterations, args.latency_ms, args.token_delay_ms, not args.serial
+            ).result()
+        report["datasets"].append(dataset)
+        _print_dataset(dataset)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Reporte guardado en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ Regresiones (p95 > +{args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✅ Sin regresiones respecto de {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# scripts_pruebas/bench_graph_fanout.py
+"""
+Latencia extremo a extremo del grafo con análisis y gráfico en serie (flujo anterior)
+contra el fan-out en paralelo tras execute_query.
+
+El LLM es un servidor local que imita la API de Groq con un retardo fijo por
+llamada (SQL, análisis en streaming y configuración del gráfico), sin red ni API keys.
+
+Uso: python scripts_pruebas/bench_graph_fanout.py [preguntas] [retardo ms]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+
+from application.graph import build_analyst_graph
+from infrastructure.llm.hybrid_factory import GROQ_MODEL, HybridLLMFactory
+from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+
+SQL = "SELECT region, SUM(ventas) AS total FROM dataset_usuario GROUP BY region ORDER BY total DESC"
+ANALYSIS = "Las ventas se concentran en la región Norte, seguida de Sur y Este."
+VIZ = '{"chart_type": "bar", "x_column": "region", "y_column": "total", "title": "Ventas por región"}'
+
+
+class StubGroqHandler(BaseHTTPRequestHandler):
+    """Chat completions con retardo fijo; respuesta elegida por el prompt del nodo"""
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    delay_s = 0.0
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))))
+        time.sleep(self.delay_s)
+        prompt = request["messages"][0]["content"]
+        if request.get("stream"):
+            self._stream(ANALYSIS)
+        else:
+            self._reply(VIZ if "chart_type" in prompt else SQL)
+
+    def _reply(self, content: str):
+        self._send("application/json", json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": GROQ_MODEL,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode())
+
+    def _stream(self, content: str):
+        events = []
+        for i, word in enumerate(content.split(" ")):
+            delta = {"role": "assistant", "content": word if i == 0 else f" {word}"}
+            events.append({"choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        events.append({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        body = "".join(
+            f"data: {json.dumps({'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': GROQ_MODEL, **e})}\n\n"
+            for e in events
+        ) + "data: [DONE]\n\n"
+        self._send("text/event-stream", body.encode())
+
+    def _send(self, content_type: str, body: bytes):
+        self.send_response(200)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def run_questions(parallel: bool, questions: int, csv_path: str) -> float:
+    db = DuckDBAdapter()
+    schema = await db.load_file(csv_path, "dataset_usuario")
+    agent = build_analyst_graph(db, parallel_outputs=parallel)
+    await HybridLLMFactory.warm_up()
+    start = time.perf_counter()
+    for _ in range(questions):
+        state = {
+            "messages": [HumanMessage(content="¿Ventas por región?")],
+            "schema_info": schema.get_context_for_llm(),
+            "last_successful_sql": None,
+        }
+        final = await agent.ainvoke(state)
+        assert final["viz_config"].get("chart_type") == "bar" and final["messages"][-1].content == ANALYSIS
+    return (time.perf_counter() - start) / questions
+
+
+def main(questions: int, delay_ms: float):
+    StubGroqHandler.delay_s = delay_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GROQ_API_KEY"] = "stub"
+    os.environ["GROQ_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.pop("GOOGLE_API_KEY", None)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+        f.write("region,ventas\n" + "".join(f"{r},{i}\n" for i, r in enumerate(["Norte", "Sur", "Este"] * 1000)))
+
+    print(f"--- 🔀 Fan-out análisis/gráfico ({questions} preguntas, {delay_ms:g} ms por llamada al LLM) ---")
+    timings = {}
+    for label, parallel in (("En serie", False), ("En paralelo", True)):
+        timings[parallel] = asyncio.run(run_questions(parallel, questions, f.name))
+        print(f"  {label:<12} {timings[parallel] * 1000:>8.1f} ms/pregunta")
+    saved = timings[False] - timings[True]
+    print(f"✅ Ahorro: {saved * 1000:.1f} ms/pregunta ({saved / timings[False]:.0%})")
+    os.unlink(f.name)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 300
+    main(questions, delay_ms)
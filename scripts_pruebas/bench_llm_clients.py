@@ -0,0 +1,107 @@
+# scripts_pruebas/bench_llm_clients.py
+"""
+Benchmark del registro de clientes LLM: overhead por pregunta construyendo los
+clientes en cada llamada (comportamiento anterior de HybridLLMFactory) contra
+el registro con pools de conexiones reutilizados y warm-up.
+
+Usa un servidor HTTP local que imita la API de Groq, sin red ni API keys reales.
+El handshake TLS se simula con una espera al aceptar cada conexión nueva.
+
+Uso: python scripts_pruebas/bench_llm_clients.py [preguntas] [handshake ms]
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+
+from infrastructure.llm.hybrid_factory import GROQ_MODEL, HybridLLMFactory
+
+# Llamadas al LLM por pregunta y sus temperaturas (SQL, análisis, viz)
+QUESTION_CALLS = (0, 0.2, 0)
+
+
+class StubGroqHandler(BaseHTTPRequestHandler):
+    """Responde como /openai/v1/chat/completions con keep-alive"""
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo en un solo envío: sin esto, Nagle + ACK diferido suman ~40 ms por respuesta
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    handshake_s = 0.0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+        time.sleep(self.handshake_s)
+
+    def do_GET(self):
+        self._reply({"object": "list", "data": [{"id": GROQ_MODEL, "object": "model", "created": 0, "owned_by": "stub"}]})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self._reply({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": GROQ_MODEL,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "SELECT 1"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def per_call_clients(questions: int) -> float:
+    """Comportamiento anterior: clientes (y conexiones) nuevos en cada llamada"""
+    start = time.perf_counter()
+    for _ in range(questions):
+        for temperature in QUESTION_CALLS:
+            llm = HybridLLMFactory.build_model("groq", GROQ_MODEL, temperature)
+            await llm.ainvoke([HumanMessage(content="¿ventas por mes?")])
+    return (time.perf_counter() - start) / questions
+
+
+async def pooled_clients(questions: int) -> float:
+    """Registro: mismos clientes y conexiones abiertas en el warm-up"""
+    await HybridLLMFactory.warm_up(set(QUESTION_CALLS))
+    start = time.perf_counter()
+    for _ in range(questions):
+        for temperature in QUESTION_CALLS:
+            await HybridLLMFactory.get_model(temperature).ainvoke([HumanMessage(content="¿ventas por mes?")])
+    return (time.perf_counter() - start) / questions
+
+
+def main(questions: int, handshake_ms: float):
+    StubGroqHandler.handshake_s = handshake_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GROQ_API_KEY"] = "stub"
+    os.environ["GROQ_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.pop("GOOGLE_API_KEY", None)
+
+    print(f"--- 🔌 Benchmark de clientes LLM ({questions} preguntas, {len(QUESTION_CALLS)} llamadas c/u, handshake {handshake_ms:g} ms) ---")
+    for label, bench in (("Clientes por llamada", per_call_clients), ("Registro + warm-up", pooled_clients)):
+        StubGroqHandler.connections = 0
+        per_question = asyncio.run(bench(questions))
+        print(f"  {label:<24} {per_question * 1000:>8.1f} ms/pregunta   conexiones abiertas: {StubGroqHandler.connections}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    handshake_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    main(questions, handshake_ms)
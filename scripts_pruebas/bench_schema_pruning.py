@@ -0,0 +1,100 @@
+# scripts_pruebas/bench_schema_pruning.py
+"""
+Poda de columnas en tablas anchas: tamaño del prompt de SQL con el esquema completo
+contra el esquema podado (BM25 sobre nombres y valores perfilados), tiempo de la
+poda y recall de las columnas que cada pregunta necesita.
+
+Genera una encuesta sintética de 600 columnas y la ingiere con DuckDBAdapter
+(con su perfil de columnas). Tokens estimados a 4 caracteres por token.
+
+Uso: python scripts_pruebas/bench_schema_pruning.py [columnas] [filas]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from application.prompts import SQL_GENERATION_SYSTEM
+from application.schema_pruning import schema_context
+from infrastructure.persistence.duckdb_adapter import DuckDBAdapter
+
+# Columnas con significado conocido (el resto son preguntas genéricas de la encuesta)
+NAMED = {
+    "region": ["Norte", "Sur", "Este", "Oeste", "Centro"],
+    "genero": ["Femenino", "Masculino", "Otro"],
+    "nivel_educativo": ["Primaria", "Secundaria", "Universitaria", "Posgrado"],
+    "medio_transporte": ["Bus", "Metro", "Auto", "Bicicleta", "Caminando"],
+    "edad": None,
+    "ingreso_mensual": None,
+    "satisfaccion_general": None,
+    "recomendaria_nps": None,
+    "gasto_salud_anual": None,
+    "horas_trabajo_semana": None,
+}
+TOPICS = [
+    "vivienda", "salud", "empleo", "educacion", "transporte", "seguridad", "ocio", "alimentacion",
+    "tecnologia", "medioambiente", "finanzas", "cultura", "deporte", "turismo", "energia",
+]
+# (pregunta, columnas que el SQL necesita)
+QUESTIONS = [
+    ("¿Cuál es la satisfacción general promedio por región?", {"region", "satisfaccion_general"}),
+    ("Ingreso mensual promedio según nivel educativo", {"ingreso_mensual", "nivel_educativo"}),
+    ("Distribución de edades de quienes usan Metro", {"edad", "medio_transporte"}),
+    ("¿Cuántas mujeres respondieron en el Norte?", {"genero", "region"}),
+    ("NPS promedio por género", {"recomendaria_nps", "genero"}),
+    ("Gasto anual en salud según horas de trabajo por semana", {"gasto_salud_anual", "horas_trabajo_semana"}),
+]
+
+
+def synthetic_survey(columns: int, rows: int) -> pa.Table:
+    rng = random.Random(7)
+    data = {"id_respuesta": list(range(rows))}
+    for name, values in NAMED.items():
+        data[name] = [rng.choice(values) for _ in range(rows)] if values else [rng.randint(0, 100) for _ in range(rows)]
+    i = 0
+    while len(data) < columns:
+        i += 1
+        topic = TOPICS[i % len(TOPICS)]
+        if i % 3:
+            data[f"p{i:03d}_{topic}_escala"] = [rng.randint(1, 5) for _ in range(rows)]
+        else:
+            data[f"p{i:03d}_{topic}_opcion"] = [rng.choice(["Sí", "No", "NS/NC"]) for _ in range(rows)]
+    return pa.table(data)
+
+
+async def main(columns: int, rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "encuesta.parquet")
+        pq.write_table(synthetic_survey(columns, rows), path)
+        schema = await DuckDBAdapter().load_file(path, "dataset_usuario")
+
+    full_prompt = SQL_GENERATION_SYSTEM.format(schema=schema.get_context_for_llm(), last_sql="Ninguna")
+    print(f"--- ✂️ Poda de esquema ({len(schema.columns)} columnas, {rows:,} filas) ---")
+    print(f"  Prompt completo: {len(full_prompt):,} caracteres (~{len(full_prompt) // 4:,} tokens)")
+    found = needed = 0
+    for question, required in QUESTIONS:
+        start = time.perf_counter()
+        context = schema_context(schema, question)
+        elapsed = (time.perf_counter() - start) * 1000
+        prompt = SQL_GENERATION_SYSTEM.format(schema=context, last_sql="Ninguna")
+        present = {col for col in required if f"{col} (" in context}
+        found, needed = found + len(present), needed + len(required)
+        print(
+            f"  {question[:52]:<52} ~{len(prompt) // 4:>6,} tokens "
+            f"(-{1 - len(prompt) / len(full_prompt):.0%})  {elapsed:5.1f} ms  columnas {len(present)}/{len(required)}"
+        )
+    print(f"✅ Recall de columnas necesarias: {found}/{needed}")
+
+
+if __name__ == "__main__":
+    columns = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    asyncio.run(main(columns, rows))
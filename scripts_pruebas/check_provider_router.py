@@ -0,0 +1,118 @@
+# scripts_pruebas/check_provider_router.py
+"""
+Comprobación del enrutamiento de proveedores LLM con proveedores locales de latencias
+guionizadas (ScriptedChatModel), sin red ni API keys. Compara contra la cadena
+anterior (`with_fallbacks`) en cuatro escenarios y termina con error si alguno falla:
+
+1. Gemini degradado (cada llamada agota su timeout): el circuito se abre.
+2. Groq más rápido que Gemini: el router converge al más rápido.
+3. Cola larga de latencia en el primario: el hedge tras el p95 la recorta.
+4. Gemini se recupera: tras el cooldown, una llamada de prueba cierra el circuito.
+
+Uso: python scripts_pruebas/check_provider_router.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+
+from infrastructure.llm.provider_router import ProviderRouter, RoutedChatModel
+from scripted_chat import ScriptedChatModel
+
+CALLS = 20
+TIMEOUT_S = 1.0  # Escala reducida del request_timeout de Gemini (10 s)
+MESSAGES = [HumanMessage(content="¿ventas por mes?")]
+
+
+def providers(gemini_latencies, groq_latencies, gemini_failures=(False,)):
+    answer = lambda _: "SELECT 1"
+    return (
+        ScriptedChatModel(provider="gemini", latencies=list(gemini_latencies), failures=list(gemini_failures), responder=answer),
+        ScriptedChatModel(provider="groq", latencies=list(groq_latencies), responder=answer),
+    )
+
+
+async def timed(model, calls=CALLS):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await model.ainvoke(MESSAGES)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def p(latencies, q):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(label, before, after):
+    print(
+        f"  {label:<38} media {statistics.mean(before) * 1000:7.1f} → {statistics.mean(after) * 1000:7.1f} ms   "
+        f"p95 {p(before, 0.95) * 1000:7.1f} → {p(after, 0.95) * 1000:7.1f} ms"
+    )
+
+
+async def degraded() -> bool:
+    gemini, groq = providers([TIMEOUT_S], [0.05], gemini_failures=[True])
+    before = await timed(gemini.with_fallbacks([groq]))
+    gemini, groq = providers([TIMEOUT_S], [0.05], gemini_failures=[True])
+    router = ProviderRouter(failure_threshold=3, cooldown_s=60)
+    after = await timed(RoutedChatModel(candidates=[("gemini", gemini), ("groq", groq)], router=router))
+    report("1. Gemini degradado (timeout)", before, after)
+    return gemini.calls == 3 and router.snapshot()["gemini"]["circuit"] == "open"
+
+
+async def fastest() -> bool:
+    gemini, groq = providers([0.3], [0.08])
+    before = await timed(gemini.with_fallbacks([groq]))
+    gemini, groq = providers([0.3], [0.08])
+    router = ProviderRouter()
+    after = await timed(RoutedChatModel(candidates=[("gemini", gemini), ("groq", groq)], router=router))
+    report("2. Groq más rápido", before, after)
+    return groq.calls >= CALLS - 2
+
+
+async def hedged() -> bool:
+    tail = [0.05] * 9 + [1.5]  # 10% de llamadas lentas en el primario
+    gemini, groq = providers(tail, [0.1])
+    router = ProviderRouter(hedging=False)
+    before = await timed(RoutedChatModel(candidates=[("gemini", gemini), ("groq", groq)], router=router), 40)
+    gemini, groq = providers(tail, [0.1])
+    router = ProviderRouter(hedging=True, hedge_min_s=0.1, hedge_default_s=0.3)
+    # Gemini sigue de primario (mediana menor): Groq solo recibe los hedges
+    after = await timed(RoutedChatModel(candidates=[("gemini", gemini), ("groq", groq)], router=router), 40)
+    report("3. Cola larga + hedge tras p95", before, after)
+    print(f"     hedges {router.stats.hedges}, ganados {router.stats.hedge_wins}")
+    return p(after, 0.95) < p(before, 0.95) / 2 and router.stats.hedge_wins > 0
+
+
+async def recovery() -> bool:
+    gemini, groq = providers([0.02], [0.05], gemini_failures=[True, True, True, False])
+    router = ProviderRouter(failure_threshold=3, cooldown_s=0.3)
+    model = RoutedChatModel(candidates=[("gemini", gemini), ("groq", groq)], router=router)
+    await timed(model, 3)
+    opened = router.snapshot()["gemini"]["circuit"] == "open"
+    await asyncio.sleep(0.35)
+    await timed(model, 1)
+    closed = router.snapshot()["gemini"]["circuit"] == "closed"
+    print(f"  4. Recuperación                         abierto tras 3 fallos: {opened}, cerrado tras cooldown: {closed}")
+    return opened and closed
+
+
+async def main() -> int:
+    print(f"--- 🛰️ Router de proveedores LLM ({CALLS} llamadas por escenario, antes → después) ---")
+    results = [await degraded(), await fastest(), await hedged(), await recovery()]
+    failed = [i + 1 for i, ok in enumerate(results) if not ok]
+    print("✅ Todos los escenarios OK" if not failed else f"❌ Escenarios fallidos: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
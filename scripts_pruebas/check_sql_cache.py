@@ -0,0 +1,94 @@
+# scripts_pruebas/check_sql_cache.py
+"""
+Comprobación de la guarda léxica de la caché semántica pregunta→SQL.
+
+La caché reutiliza un SQL solo para variantes léxicas de una pregunta ya resuelta
+(orden, relleno, acentos, plurales, erratas); las paráfrasis con otras palabras van
+al LLM. Sobre pares etiquetados (misma query / query distinta) comprueba que:
+
+1. La guarda (`same_question`) no acepta ningún par distinto: un falso positivo
+   reutiliza un SQL incorrecto ("ventas netas" frente a "ventas brutas").
+2. La guarda acepta todas las variantes léxicas.
+3. Las variantes superan SQL_CACHE_THRESHOLD: el umbral es solo el prefiltro del
+   índice vectorial y no debe descartar candidatos que la guarda aceptaría.
+
+Uso: python scripts_pruebas/check_sql_cache.py
+"""
+import os
+import sys
+
+import numpy as np
+
+# Raíz del repo en el path: `python scripts_pruebas/<script>.py` funciona desde cualquier directorio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from infrastructure.persistence.semantic_cache import SQL_CACHE_THRESHOLD, embed_question, same_question
+
+# (pregunta, pregunta, ¿se responden con el mismo SQL?)
+PAIRS = [
+    # Variantes léxicas: deben reutilizar
+    ("¿Cuáles son las ventas totales por región?", "ventas totales por region", True),
+    ("Muéstrame las ventas totales por región", "Dame las ventas totales por región", True),
+    ("Top 5 productos más vendidos", "top 5 productos mas vendidos", True),
+    ("¿Cuántos clientes hay por país?", "cuantos clientes hay por pais", True),
+    ("Promedio de precio por categoría", "¿Cuál es el promedio de precio por categoría?", True),
+    ("ventas mensuales de 2023", "Ventas mensuales en 2023", True),
+    ("Evolución de ingresos por mes", "evolucion de los ingresos por mes", True),
+    ("Grafica las ventas por región", "Grafica ventas por region", True),
+    ("Número de pedidos por estado", "numero de pedidos por cada estado", True),
+    ("Total de ingresos por vendedor", "total ingresos por vendedor", True),
+    ("Show total sales by region", "total sales by region", True),
+    ("Ventas por categoría de producto", "ventas por categoria de productos", True),
+    ("Ventas netas por región", "ventas netas por regoin", True),
+    # Casi iguales pero con otra query: no deben reutilizar
+    ("Top 5 productos más vendidos", "Top 10 productos más vendidos", False),
+    ("Top 5 productos más vendidos", "Top 5 productos menos vendidos", False),
+    ("Promedio de precio por categoría", "Total de precio por categoría", False),
+    ("ventas mensuales de 2023", "ventas mensuales de 2024", False),
+    ("Ventas totales por región", "Ventas totales por mes", False),
+    ("Ventas totales por región", "Clientes totales por región", False),
+    ("Cuántos clientes hay por país", "Cuántos pedidos hay por país", False),
+    ("Ingresos por vendedor", "Ingresos por vendedor sin devoluciones", False),
+    ("Productos con precio mayor a 100", "Productos con precio menor a 100", False),
+    ("Número de pedidos por estado", "Número de pedidos por ciudad", False),
+    ("Ventas por categoría de producto", "Margen por categoría de producto", False),
+    ("ventas por region ordenadas de mayor a menor", "ventas por region ordenadas de menor a mayor", False),
+    # Un calificativo de más o distinto cambia la métrica aunque la similitud sea alta
+    ("ventas totales por region", "ventas netas totales por region", False),
+    ("Ventas totales por región", "Ventas brutas totales por región", False),
+    ("Ventas netas por región", "Ventas brutas por región", False),
+    ("ventas por mes", "ventas acumuladas por mes", False),
+    ("Ingresos por vendedor", "Ingresos netos por vendedor", False),
+    ("Clientes por país", "Clientes activos por país", False),
+]
+
+
+
+def main() -> int:
+    print(f"--- 🎯 Guarda de la caché semántica ({len(PAIRS)} pares, prefiltro {SQL_CACHE_THRESHOLD:g}) ---")
+    false_pos, missed, filtered = [], [], []
+    for a, b, same in PAIRS:
+        similarity = float(np.dot(embed_question(a), embed_question(b)))
+        accepted = same_question(a, b)
+        if accepted and not same:
+            false_pos.append((a, b))
+        elif same and not accepted:
+            missed.append((a, b))
+        elif same and similarity < SQL_CACHE_THRESHOLD:
+            filtered.append((a, b, similarity))
+    for a, b in false_pos:
+        print(f"  ❌ Falso positivo: {a!r} ~ {b!r}")
+    for a, b in missed:
+        print(f"  ❌ Variante rechazada por la guarda: {a!r} ~ {b!r}")
+    for a, b, similarity in filtered:
+        print(f"  ❌ Variante bajo el prefiltro ({similarity:.2f}): {a!r} ~ {b!r}")
+    positives = [(a, b) for a, b, same in PAIRS if same]
+    lowest = min(float(np.dot(embed_question(a), embed_question(b))) for a, b in positives)
+    print(f"  Similitud mínima entre variantes: {lowest:.2f}")
+    failed = bool(false_pos or missed or filtered)
+    print("✅ Guarda y prefiltro OK" if not failed else "❌ La guarda o el prefiltro fallan")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# scripts_pruebas/scripted_chat.py
+import asyncio
+import itertools
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+class ScriptedProviderError(RuntimeError):
+    """Fallo simulado de un proveedor LLM"""
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Modelo de chat local y determinista para benchmarks y pruebas sin red.
+    `latencies` y `failures` se recorren en ciclo (una entrada por llamada); la
+    respuesta la decide `responder` a partir de los mensajes. En streaming, la
+    latencia es el tiempo hasta el primer token y el resto llega cada `token_delay_s`.
+    """
+    provider: str = "scripted"
+    latencies: List[float] = [0.0]
+    failures: List[bool] = [False]
+    responder: Optional[Callable[[List[BaseMessage]], str]] = None
+    token_delay_s: float = 0.0
+
+    _calls: int = PrivateAttr(default=0)
+    _latency_cycle: Any = PrivateAttr(default=None)
+    _failure_cycle: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._latency_cycle = itertools.cycle(self.latencies)
+        self._failure_cycle = itertools.cycle(self.failures)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _next_call(self, messages: List[BaseMessage]):
+        """(latencia, falla, texto) de la próxima llamada según el guion"""
+        self._calls += 1
+        text = self.responder(messages) if self.responder else ""
+        return next(self._latency_cycle), next(self._failure_cycle), text
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        latency, fails, text = self._next_call(messages)
+        time.sleep(latency)
+        if fails:
+            raise ScriptedProviderError(f"{self.provider}: fallo simulado")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        latency, fails, text = self._next_call(messages)
+        await asyncio.sleep(latency)
+        if fails:
+            raise ScriptedProviderError(f"{self.provider}: fallo simulado")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        latency, fails, text = self._next_call(messages)
+        time.sleep(latency)
+        if fails:
+            raise ScriptedProviderError(f"{self.provider}: fallo simulado")
+        for i, token in enumerate(_tokens(text)):
+            if i:
+                time.sleep(self.token_delay_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        latency, fails, text = self._next_call(messages)
+        await asyncio.sleep(latency)
+        if fails:
+            raise ScriptedProviderError(f"{self.provider}: fallo simulado")
+        for i, token in enumerate(_tokens(text)):
+            if i:
+                await asyncio.sleep(self.token_delay_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def _tokens(text: str) -> List[str]:
+    """Palabras con su espacio: concatenadas reproducen el texto exacto"""
+    words = text.split(" ")
+    return [w if i == 0 else f" {w}" for i, w in enumerate(words)] if text else []
@@ -20,7 +20,7 @@ async def main():
         f.write("mes,ventas,costos\nEnero,1000,800\nFebrero,1200,850\nMarzo,1100,900")
     
     print("📂 Cargando dataset...")
-    schema = await db.load_csv("ventas_2026.csv", "tabla_ventas")
+    schema = await db.load_file("ventas_2026.csv", "tabla_ventas")
     schema_str = schema.get_context_for_llm()
     print(f"📝 Contexto: {schema_str}")
 
@@ -14,7 +14,7 @@ async def main():
         f.write("producto,ventas,fecha\nManzana,100,2026-01-01\nPera,50,2026-01-02")
     
     print("📂 Cargando datos...")
-    schema = await db.load_csv("test_data.csv", "ventas")
+    schema = await db.load_file("test_data.csv", "ventas")
     print(f"✅ Esquema detectado: {schema.columns}")
     
     # 2. Test Seguridad (Query Maliciosa)